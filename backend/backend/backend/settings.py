@@ -151,6 +151,56 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Gazetteer file used by `manage.py geocode_events` (GeoNames dump or CSV with name, latitude, longitude)
+GEOCODER_GAZETTEER = os.getenv('GEOCODER_GAZETTEER', '')
+
+# Recommender artifacts (see `manage.py build_recommender`)
+RECOMMENDER_MODELS_PATH = os.getenv('RECOMMENDER_MODELS_PATH', os.path.join(BASE_DIR, 'recommender_models'))
+# How often (seconds) each worker checks for a newly published recommender version; -1 disables hot reload
+RECOMMENDER_RELOAD_SECONDS = int(os.getenv('RECOMMENDER_RELOAD_SECONDS', 30))
+# Load and warm the recommender in the server's master process before workers fork (e.g. gunicorn --preload)
+RECOMMENDER_PRELOAD = os.getenv('RECOMMENDER_PRELOAD', '').lower() in ('1', 'true', 'yes')
+# Serve recommender arrays from POSIX shared memory (one copy per host) instead of memory-mapped files
+RECOMMENDER_SHARED_MEMORY = os.getenv('RECOMMENDER_SHARED_MEMORY', '').lower() in ('1', 'true', 'yes')
+# Content engine: 'neighbours' (top-K neighbour index), 'embeddings' (needs build_recommender --embedding-dim)
+# or 'ann' (approximate search over the embeddings; also needs --ann-lists)
+RECOMMENDER_ENGINE = os.getenv('RECOMMENDER_ENGINE', 'neighbours')
+# 'ann' engine: IVF lists searched per request (higher = better recall, slower) and candidates kept from them
+RECOMMENDER_ANN_NPROBE = int(os.getenv('RECOMMENDER_ANN_NPROBE', 8))
+RECOMMENDER_ANN_CANDIDATES = int(os.getenv('RECOMMENDER_ANN_CANDIDATES', 200))
+# Share of the collaborative (SVD) score in the blended recommendation score
+RECOMMENDER_CF_WEIGHT = float(os.getenv('RECOMMENDER_CF_WEIGHT', 0.3))
+# Memory budget (MB) for each chunk of user scores in the batch precompute job
+RECOMMENDER_BATCH_MB = int(os.getenv('RECOMMENDER_BATCH_MB', 256))
+# Age (seconds) after which the recommendation eligibility masks are rebuilt, picking up other workers' changes
+RECOMMENDER_ELIGIBILITY_REFRESH_SECONDS = int(os.getenv('RECOMMENDER_ELIGIBILITY_REFRESH_SECONDS', 30))
+
+# Trending events: activity loses half its weight every TRENDING_HALF_LIFE_HOURS
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 72))
+TRENDING_CACHE_SECONDS = int(os.getenv('TRENDING_CACHE_SECONDS', 300))
+# Detail views are buffered in the cache and written to trending scores at most this often
+TRENDING_VIEW_FLUSH_SECONDS = int(os.getenv('TRENDING_VIEW_FLUSH_SECONDS', 60))
+# Event facet counts (GET /api/events/facets/) are invalidated on event changes and expire after this many seconds
+FACETS_CACHE_SECONDS = int(os.getenv('FACETS_CACHE_SECONDS', 300))
+
+# Caches
+# LocMemCache evicts least-recently-used entries once MAX_ENTRIES is reached. It is
+# per-process; point these at a shared backend (e.g. Redis) when running several
+# workers so invalidations reach every worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recommendations': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recommendations',
+        'TIMEOUT': int(os.getenv('RECOMMENDATIONS_CACHE_TTL', 600)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RECOMMENDATIONS_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
 # CORS settings for development
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Load the recommender once in the master process so forked workers share it
+from django.conf import settings  # noqa: E402
+
+if getattr(settings, 'RECOMMENDER_PRELOAD', False):
+    from events.recommender.loader import RecommendationModelLoader  # noqa: E402
+    RecommendationModelLoader.preload()
@@ -0,0 +1,120 @@
+import hashlib
+import logging
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from rest_framework.exceptions import ValidationError
+
+from .filters import EventFilter
+from .models import Event
+from .search import search_queryset
+
+# --- Event facets ---
+# Counts per category, status and source for the discover sidebar, over the
+# events matching the list's filters (the same query parameters as
+# GET /api/events/). All three come from one grouped query over
+# (category, status, source). Each facet is counted without its own selection,
+# so picking a category still shows how many events the other categories have.
+#
+# Counts are cached and invalidated whenever events change (facets_changed()),
+# which never counts anything itself so writes stay cheap; the next
+# GET /api/events/facets/ recomputes them:
+#   - the unfiltered counts, which most page views ask for, are dropped;
+#   - filtered counts are keyed on a generation number that every change bumps,
+#     so they are all invalidated at once without enumerating them.
+# Both also expire after FACETS_CACHE_SECONDS, for processes with their own cache.
+
+FACET_FIELDS = ('category', 'status', 'source')
+# Query parameters that change the counts; anything else (pagination, ordering, ...) is ignored
+FILTER_PARAMS = tuple(EventFilter.base_filters) + ('search',)
+DEFAULT_CACHE_SECONDS = 300
+ALL_KEY = 'events:facets:all'
+GENERATION_KEY = 'events:facets:generation'
+
+logger = logging.getLogger(__name__)
+
+
+def _timeout():
+    return getattr(settings, 'FACETS_CACHE_SECONDS', DEFAULT_CACHE_SECONDS)
+
+
+def facet_counts(queryset, selected=None):
+    """
+    {'total': n, 'category': [{'value': ..., 'count': ...}], 'status': [...],
+    'source': [...]} for queryset, where selected maps facet fields to the
+    value the caller filters on (applied here rather than to queryset).
+    """
+    selected = selected or {}
+    rows = (
+        queryset.order_by().values(*FACET_FIELDS).annotate(count=Count('id'))
+        .values_list(*FACET_FIELDS, 'count')
+    )
+    counts = {field: {} for field in FACET_FIELDS}
+    total = 0
+    for row in rows:
+        values, n = row[:-1], row[-1]
+        matches = [selected.get(field) in (None, value) for field, value in zip(FACET_FIELDS, values)]
+        if all(matches):
+            total += n
+        for i, field in enumerate(FACET_FIELDS):
+            # Every selection but this facet's own
+            if values[i] and all(matches[:i] + matches[i + 1:]):
+                counts[field][values[i]] = counts[field].get(values[i], 0) + n
+    facets = {'total': total}
+    for field in FACET_FIELDS:
+        ordered = sorted(counts[field].items(), key=lambda item: (-item[1], str(item[0]).lower()))
+        facets[field] = [{'value': value, 'count': n} for value, n in ordered]
+    return facets
+
+
+def compute_facets(params=None, request=None):
+    """Facet counts for the events matching params (a QueryDict or dict of the events list's parameters)."""
+    params = params or {}
+    filter_data = {key: params.get(key) for key in FILTER_PARAMS if key not in FACET_FIELDS and params.get(key)}
+    selected = {field: params.get(field) for field in FACET_FIELDS if params.get(field)}
+    queryset = Event.objects.all()
+    if filter_data:
+        filterset = EventFilter(filter_data, queryset=queryset, request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        queryset = filterset.qs
+    if params.get('search'):
+        queryset = search_queryset(queryset, params['search'])
+    return facet_counts(queryset, selected)
+
+
+def get_event_facets(params=None, request=None):
+    """Cached compute_facets()."""
+    params = params or {}
+    relevant = sorted((key, params.get(key)) for key in FILTER_PARAMS if params.get(key))
+    if not relevant:
+        facets = cache.get(ALL_KEY)
+        if facets is None:
+            facets = compute_facets()
+            cache.set(ALL_KEY, facets, _timeout())
+        return facets
+    generation = cache.get(GENERATION_KEY, 0)
+    digest = hashlib.sha1(urlencode(relevant).encode('utf-8')).hexdigest()
+    key = f'events:facets:{generation}:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(dict(relevant), request)
+        cache.set(key, facets, _timeout())
+    return facets
+
+
+def facets_changed(refresh=True):
+    """
+    Invalidate cached filtered counts after events change; with refresh, also
+    the unfiltered counts (category/status/source may have changed; ticket
+    sales only move the price and availability filters).
+    """
+    try:
+        if cache.add(GENERATION_KEY, 1, None) is False:
+            cache.incr(GENERATION_KEY)
+        if refresh:
+            cache.delete(ALL_KEY)
+    except Exception:
+        logger.exception('Could not invalidate event facet counts')
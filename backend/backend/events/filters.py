@@ -0,0 +1,151 @@
+import datetime
+import math
+
+import django_filters
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from django.utils import timezone
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from .geocoding import EARTH_RADIUS_KM, bounding_box
+from .models import Event
+
+# --- Events list filters ---
+# Date filters and ordering go through the typed event_date column (indexed
+# together with id) rather than the free-form date string, so they run as index
+# range scans, and price/availability filters read the ticketTypes summary
+# columns (min_price, max_price, is_sold_out). ?near= narrows events to the bounding box of the search circle on
+# the (latitude, longitude) index before computing exact distances.
+
+# Weekdays counted as the weekend by ?this_weekend= (Friday to Sunday)
+WEEKEND_START = 4
+WEEKEND_END = 6
+# Public ordering names that sort on another column
+ORDERING_COLUMNS = {'date': 'event_date', 'price': 'min_price'}
+# ?near= radius when ?radius_km= is not given, and the largest accepted
+DEFAULT_RADIUS_KM = 25.0
+MAX_RADIUS_KM = 500.0
+
+
+def weekend_range(today=None):
+    """(first, last) day of the current weekend, or the next one from Monday to Thursday."""
+    today = today or timezone.localdate()
+    start = today + datetime.timedelta(days=max(WEEKEND_START - today.weekday(), 0))
+    end = today + datetime.timedelta(days=WEEKEND_END - today.weekday())
+    return start, end
+
+
+def parse_point(value):
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({'near': 'Expected "latitude,longitude".'})
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError({'near': 'Coordinates out of range.'})
+    return latitude, longitude
+
+
+def haversine_km(latitude, longitude):
+    """Great-circle distance (km) from a point to each event's coordinates, as a database expression."""
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    a = (
+        Power(Sin((Radians(F('latitude')) - lat) / 2), 2)
+        + math.cos(lat) * Cos(Radians(F('latitude'))) * Power(Sin((Radians(F('longitude')) - lng) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a))
+
+
+def filter_near(queryset, latitude, longitude, radius_km):
+    """
+    Events within radius_km of a point, annotated with distance_km. The
+    bounding box around the circle is answered from the (latitude, longitude)
+    index; the exact distance is only computed for the events inside it.
+    """
+    min_lat, max_lat, lng_ranges = bounding_box(latitude, longitude, radius_km)
+    box = Q(latitude__range=(min_lat, max_lat))
+    if lng_ranges:
+        in_lng = Q()
+        for min_lng, max_lng in lng_ranges:
+            in_lng |= Q(longitude__range=(min_lng, max_lng))
+        box &= in_lng
+    else:
+        box &= Q(longitude__isnull=False)
+    return queryset.filter(box).annotate(
+        distance_km=ExpressionWrapper(haversine_km(latitude, longitude), output_field=FloatField()),
+    ).filter(distance_km__lte=radius_km)
+
+
+class EventFilter(django_filters.FilterSet):
+    date_from = django_filters.DateFilter(field_name='event_date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='event_date', lookup_expr='lte')
+    this_weekend = django_filters.BooleanFilter(method='filter_this_weekend')
+    # ?near=lat,lng[&radius_km=]: events within the radius, nearest first unless ?ordering= is given
+    near = django_filters.CharFilter(method='filter_near')
+    radius_km = django_filters.NumberFilter(method='filter_radius')
+    # Price and availability, from the ticketTypes summary columns
+    free = django_filters.BooleanFilter(method='filter_free')
+    price_min = django_filters.NumberFilter(field_name='max_price', lookup_expr='gte',
+                                            help_text='Events with a ticket type at or above this price')
+    price_max = django_filters.NumberFilter(field_name='min_price', lookup_expr='lte',
+                                            help_text='Events with a ticket type at or below this price')
+    hide_sold_out = django_filters.BooleanFilter(method='filter_hide_sold_out')
+
+    class Meta:
+        model = Event
+        fields = ['status', 'category', 'location', 'source']
+
+    def filter_this_weekend(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(event_date__range=weekend_range())
+
+    def filter_free(self, queryset, name, value):
+        if value is None:
+            return queryset
+        # Free: has a ticket type that costs nothing
+        return queryset.filter(min_price=0) if value else queryset.exclude(min_price=0)
+
+    def filter_hide_sold_out(self, queryset, name, value):
+        return queryset.filter(is_sold_out=False) if value else queryset
+
+    def filter_near(self, queryset, name, value):
+        latitude, longitude = parse_point(value)
+        radius = self.form.cleaned_data.get('radius_km')
+        radius = DEFAULT_RADIUS_KM if radius is None else float(radius)
+        if not 0 < radius <= MAX_RADIUS_KM:
+            raise ValidationError({'radius_km': f'Must be between 0 and {MAX_RADIUS_KM:g}.'})
+        queryset = filter_near(queryset, latitude, longitude, radius)
+        if not self.request or not self.request.query_params.get('ordering'):
+            queryset = queryset.order_by('distance_km', 'id')
+        return queryset
+
+    def filter_radius(self, queryset, name, value):
+        # Read by filter_near
+        return queryset
+
+
+class EventOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that sorts ?ordering=date on the typed event_date column,
+    and keeps the distance order of a ?near= search unless asked otherwise.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if 'distance_km' in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return queryset
+        return super().filter_queryset(request, queryset, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        mapped = []
+        for term in ordering:
+            name = term.lstrip('-')
+            # distance_km only exists on ?near= searches
+            if name == 'distance_km' and name not in queryset.query.annotations:
+                continue
+            prefix = '-' if term.startswith('-') else ''
+            mapped.append(prefix + ORDERING_COLUMNS.get(name, name))
+        return mapped
@@ -0,0 +1,141 @@
+import csv
+import math
+import re
+import unicodedata
+
+# --- Offline geocoding ---
+# Events only carry free-text location/address. `manage.py geocode_events` fills
+# their latitude/longitude by looking place names up in a local gazetteer file,
+# so no request ever waits on (or leaks addresses to) a geocoding service.
+#
+# Two gazetteer formats are read:
+#   - GeoNames dumps (cities500.txt, cities15000.txt, ...; tab-separated, no header)
+#   - CSV with a header row containing name, latitude and longitude, and optionally
+#     population and alternate_names (separated by ';' or ',')
+# A name shared by several places resolves to the most populous one.
+
+# GeoNames column positions
+GEONAMES_NAME = 1
+GEONAMES_ASCII_NAME = 2
+GEONAMES_ALTERNATE_NAMES = 3
+GEONAMES_LATITUDE = 4
+GEONAMES_LONGITUDE = 5
+GEONAMES_POPULATION = 14
+MIN_ALTERNATE_NAME = 3
+# Longest run of words tried as a place name inside a longer text
+MAX_NAME_WORDS = 4
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def normalize_place(text):
+    """Lowercase ASCII words separated by single spaces."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+class Gazetteer:
+    """Place name -> (latitude, longitude), keeping the most populous place per name."""
+
+    def __init__(self):
+        self.places = {}
+
+    def __len__(self):
+        return len(self.places)
+
+    def add(self, names, latitude, longitude, population=0):
+        for name in names:
+            key = normalize_place(name)
+            if key and (key not in self.places or population > self.places[key][2]):
+                self.places[key] = (latitude, longitude, population)
+
+    @classmethod
+    def load(cls, path):
+        gazetteer = cls()
+        with open(path, encoding='utf-8', newline='') as f:
+            first = f.readline()
+            f.seek(0)
+            if '\t' in first:
+                gazetteer._read_geonames(f)
+            else:
+                gazetteer._read_csv(f)
+        return gazetteer
+
+    def _read_geonames(self, f):
+        for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+            if len(row) <= GEONAMES_POPULATION:
+                continue
+            try:
+                latitude, longitude = float(row[GEONAMES_LATITUDE]), float(row[GEONAMES_LONGITUDE])
+                population = int(row[GEONAMES_POPULATION] or 0)
+            except ValueError:
+                continue
+            # Alternate names include codes ("AA", "ADD") that would match stray words
+            alternates = [name for name in row[GEONAMES_ALTERNATE_NAMES].split(',') if len(name) > MIN_ALTERNATE_NAME]
+            names = [row[GEONAMES_NAME], row[GEONAMES_ASCII_NAME]] + alternates
+            self.add(names, latitude, longitude, population)
+
+    def _read_csv(self, f):
+        reader = csv.DictReader(f)
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        if not {'name', 'latitude', 'longitude'} <= set(fields):
+            raise ValueError('Gazetteer CSV needs name, latitude and longitude columns')
+        for row in reader:
+            try:
+                latitude, longitude = float(row[fields['latitude']]), float(row[fields['longitude']])
+                population = int(row.get(fields.get('population'), 0) or 0)
+            except (TypeError, ValueError):
+                continue
+            names = [row[fields['name']]]
+            if 'alternate_names' in fields:
+                names += re.split(r'[;,]', row[fields['alternate_names']] or '')
+            self.add(names, latitude, longitude, population)
+
+    def lookup(self, text):
+        """
+        Coordinates of the first place found in text: a comma-separated part
+        matching a name as a whole (most specific part first), else the longest
+        run of words that does. None when nothing matches.
+        """
+        parts = [normalize_place(part) for part in (text or '').split(',')]
+        for part in parts:
+            if part in self.places:
+                return self.places[part][:2]
+        for part in parts:
+            words = part.split()
+            for size in range(min(MAX_NAME_WORDS, len(words)), 0, -1):
+                for start in range(len(words) - size + 1):
+                    place = self.places.get(' '.join(words[start:start + size]))
+                    if place:
+                        return place[:2]
+        return None
+
+    def geocode(self, location, address=None):
+        """Coordinates for an event, from its address if that names a known place, else its location."""
+        return self.lookup(address) or self.lookup(location)
+
+
+# --- Distances ---
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min lat, max lat, [(min lng, max lng), ...]) around a point: one longitude
+    range, two when the box crosses the antimeridian, or none (every longitude)
+    when it reaches a pole.
+    """
+    delta_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), []
+    # The circle is widest poleward of its centre, where it touches a meridian: asin(sin(r) / cos(latitude))
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return min_lat, max_lat, []
+    delta_lng = math.degrees(math.asin(ratio))
+    min_lng, max_lng = longitude - delta_lng, longitude + delta_lng
+    if min_lng < -180:
+        return min_lat, max_lat, [(min_lng + 360, 180.0), (-180.0, max_lng)]
+    if max_lng > 180:
+        return min_lat, max_lat, [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    return min_lat, max_lat, [(min_lng, max_lng)]
+
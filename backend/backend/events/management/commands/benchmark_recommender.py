@@ -0,0 +1,69 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.recommender.benchmark import DEFAULT_SAVED_COUNTS, DEFAULT_SIZES, ENGINES, parse_size, run_benchmark
+from events.recommender.embeddings import DEFAULT_EMBEDDING_DIM
+from events.recommender.neighbours import DEFAULT_NEIGHBOURS
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Benchmark recommender latency, peak memory and load time on synthetic catalogues '
+            '(no database or external services needed). Prints JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                            help='Comma-separated catalogue sizes, e.g. 10k,100k,1M.')
+        parser.add_argument('--engines', default=','.join(ENGINES),
+                            help=f"Comma-separated engines to run ({', '.join(ENGINES)}).")
+        parser.add_argument('--saved', default=','.join(str(c) for c in DEFAULT_SAVED_COUNTS),
+                            help='Comma-separated saved-event counts per simulated user.')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Timed queries per saved-event count.')
+        parser.add_argument('--neighbours', type=int, default=DEFAULT_NEIGHBOURS,
+                            help='Neighbours kept per event.')
+        parser.add_argument('--embedding-dim', type=int, default=DEFAULT_EMBEDDING_DIM,
+                            help='Dimension of the synthetic embeddings for the embeddings-* engines.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--train', action='store_true',
+                            help='Train TF-IDF on generated text instead of writing random neighbour lists (slow at scale).')
+        parser.add_argument('--force', action='store_true',
+                            help="Run engines even above their default size limit (e.g. dense at 100k).")
+        parser.add_argument('--workdir', help='Directory for the generated artifacts (default: a temporary one).')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+
+    def handle(self, *args, **options):
+        engines = [e for e in options['engines'].split(',') if e]
+        unknown = set(engines) - set(ENGINES)
+        if unknown:
+            raise CommandError(f"Unknown engine(s): {', '.join(sorted(unknown))}")
+        report = run_benchmark(
+            sizes=[parse_size(s) for s in options['sizes'].split(',') if s],
+            engines=engines,
+            saved_counts=[int(c) for c in options['saved'].split(',') if c],
+            queries=options['queries'],
+            k=options['neighbours'],
+            seed=options['seed'],
+            train=options['train'],
+            workdir=options['workdir'],
+            force=options['force'],
+            embedding_dim=options['embedding_dim'],
+            log=lambda message: self.stderr.write(message),
+        )
+        report['commit'] = current_commit()
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
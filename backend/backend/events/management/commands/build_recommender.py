@@ -0,0 +1,87 @@
+import shutil
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event
+from events.recommender.artifacts import new_version_name, prune_versions, publish_version, staging_path
+from events.recommender.batch import load_interactions
+from events.recommender.builder import DEFAULT_MAX_FEATURES, build_artifact, event_document
+from events.recommender.collaborative import fit_interaction_factors
+from events.recommender.embeddings import EMBEDDING_DTYPES
+from events.recommender.loader import RecommendationModelLoader, get_models_path
+from events.recommender.neighbours import DEFAULT_NEIGHBOURS
+
+
+def iter_event_documents(chunk_size=2000):
+    """Stream (event_id, text) for every event without loading the table into memory."""
+    rows = Event.objects.order_by('id').values_list('id', 'title', 'description', 'category')
+    for event_id, title, description, category in rows.iterator(chunk_size=chunk_size):
+        yield event_id, event_document(title, description, category)
+
+
+class Command(BaseCommand):
+    help = 'Train the content recommender from the Event table and publish a new artifact version.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbours', type=int, default=DEFAULT_NEIGHBOURS,
+                            help='Number of neighbours kept per event.')
+        parser.add_argument('--max-features', type=int, default=DEFAULT_MAX_FEATURES,
+                            help='TF-IDF vocabulary size.')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched per database round trip while streaming events.')
+        parser.add_argument('--max-block-mb', type=int, default=256,
+                            help='Memory budget for each similarity block.')
+        parser.add_argument('--dense', action='store_true',
+                            help='Also write the dense N x N similarity matrix (small catalogues only).')
+        parser.add_argument('--embedding-dim', type=int, default=0,
+                            help='Also store LSA event embeddings of this size (0 = none; needed by RECOMMENDER_ENGINE=embeddings).')
+        parser.add_argument('--embedding-dtype', choices=EMBEDDING_DTYPES, default='int8',
+                            help='Storage type of the embeddings; int8 keeps a float32 scale per row.')
+        parser.add_argument('--ann-lists', type=int, default=0,
+                            help='Also build an IVF index with this many lists over the embeddings '
+                                 '(0 = none; about sqrt(events) is a good start; needed by RECOMMENDER_ENGINE=ann).')
+        parser.add_argument('--svd-factors', type=int, default=32,
+                            help='Collaborative factors fitted from tickets and saves (0 keeps the current ones).')
+        parser.add_argument('--keep', type=int, default=3,
+                            help='Number of published versions to keep on disk.')
+
+    def handle(self, *args, **options):
+        if options['ann_lists'] and not options['embedding_dim']:
+            raise CommandError('--ann-lists needs --embedding-dim.')
+        if not Event.objects.exists():
+            raise CommandError('No events to train on; the current artifact was left in place.')
+        models_path = get_models_path()
+        version = new_version_name()
+        staged = staging_path(models_path, version)
+        started = time.monotonic()
+        # Changes recorded from here on may be missing from what the build reads; publishing carries them over
+        snapshot_at = datetime.now(timezone.utc)
+        svd = fit_interaction_factors(*load_interactions(), n_factors=options['svd_factors']) if options['svd_factors'] else None
+        try:
+            manifest = build_artifact(
+                iter_event_documents(options['chunk_size']),
+                staged,
+                version=version,
+                k=options['neighbours'],
+                max_features=options['max_features'],
+                max_block_mb=options['max_block_mb'],
+                dense=options['dense'],
+                previous=RecommendationModelLoader.get_models(),
+                svd=svd,
+                embedding_dim=options['embedding_dim'],
+                embedding_dtype=options['embedding_dtype'],
+                ann_lists=options['ann_lists'],
+            )
+            publish_version(models_path, version, delta_since=snapshot_at)
+        except BaseException:
+            shutil.rmtree(staged, ignore_errors=True)
+            raise
+
+        removed = prune_versions(models_path, keep=options['keep'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Published recommender version {version}: {manifest['n_events']} events, "
+            f"k={options['neighbours']}, {time.monotonic() - started:.1f}s."
+            + (f" Pruned {len(removed)} old version(s)." if removed else '')
+        ))
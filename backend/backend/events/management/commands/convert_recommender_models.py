@@ -0,0 +1,144 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from events.recommender.artifacts import ArtifactWriter, new_version_name, publish_version, staging_path
+from events.recommender.loader import get_models_path
+from events.recommender.neighbours import DEFAULT_NEIGHBOURS, build_neighbour_index, iter_dense_blocks
+from users.models import ClerkUser
+
+
+def _load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _event_index_pairs(event_indices_map):
+    # The legacy map is either a pandas Series (event_id -> row) or a plain dict.
+    if hasattr(event_indices_map, 'index') and hasattr(event_indices_map, 'values'):
+        ids, rows = event_indices_map.index.values, event_indices_map.values
+    else:
+        ids, rows = list(event_indices_map.keys()), list(event_indices_map.values())
+    return np.asarray(ids, dtype=np.int64), np.asarray(rows, dtype=np.int64)
+
+
+def _serving_user_ids(raw_ids):
+    """
+    The legacy trainset's raw user ids as the str(user.id) keys serving looks
+    users up by. Raw ids may be primary keys (possibly read back as floats or
+    strings) or Clerk ids. Returns the keys, with None for users not found.
+    """
+    by_clerk_id = dict(ClerkUser.objects.values_list('clerk_id', 'id'))
+    known = set(by_clerk_id.values())
+    keys = []
+    for raw in raw_ids:
+        user_id = by_clerk_id.get(str(raw))
+        if user_id is None:
+            try:
+                number = float(raw)
+            except (TypeError, ValueError):
+                number = None
+            if number is not None and number.is_integer() and int(number) in known:
+                user_id = int(number)
+        keys.append(str(user_id) if user_id is not None else None)
+    return keys
+
+
+class Command(BaseCommand):
+    help = 'Convert the legacy recommender pickles into the memory-mapped .npy artifact format.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None, help='Directory containing the legacy .pkl files.')
+        parser.add_argument('--output', default=None,
+                            help='Write the artifact to this directory instead of publishing it as a new version.')
+        parser.add_argument('--dtype', default='float32', choices=['float32', 'float64'],
+                            help='dtype used to store the similarity matrix.')
+        parser.add_argument('--neighbours', type=int, default=DEFAULT_NEIGHBOURS,
+                            help='Number of neighbours kept per event in the sparse index.')
+        parser.add_argument('--keep-dense', action='store_true',
+                            help='Also keep the dense N x N similarity matrix (only sensible for small catalogues).')
+        parser.add_argument('--skip-unknown-users', action='store_true',
+                            help='Drop SVD users that match no ClerkUser instead of failing.')
+
+    def handle(self, *args, **options):
+        source = options['source'] or get_models_path()
+        output = options['output']
+
+        indices_path = os.path.join(source, 'event_indices_map.pkl')
+        if not os.path.exists(indices_path):
+            raise CommandError(f'{indices_path} not found; nothing to convert.')
+        ids, rows = _event_index_pairs(_load_pickle(indices_path))
+
+        similarity = None
+        sim_path = os.path.join(source, 'cosine_sim_matrix.pkl')
+        if os.path.exists(sim_path):
+            similarity = _load_pickle(sim_path)
+            if hasattr(similarity, 'toarray'):
+                similarity = similarity.toarray()
+            similarity = np.asarray(similarity)
+        else:
+            self.stdout.write(self.style.WARNING(f'{sim_path} not found; artifact will have no similarity matrix.'))
+
+        n_events = similarity.shape[0] if similarity is not None else int(rows.max()) + 1
+        event_ids = np.full(n_events, -1, dtype=np.int64)
+        event_ids[rows] = ids
+
+        # Write into a scratch directory first so a failed conversion never clobbers a live artifact.
+        version = new_version_name()
+        tmp_output = output.rstrip(os.sep) + '.tmp' if output else staging_path(get_models_path(), version)
+        shutil.rmtree(tmp_output, ignore_errors=True)
+        writer = ArtifactWriter(tmp_output, version=version)
+        writer.set('source', 'legacy-pickles')
+        writer.add_event_ids(event_ids)
+        if similarity is not None:
+            indptr, indices, scores = build_neighbour_index(iter_dense_blocks(similarity), k=options['neighbours'])
+            writer.add_neighbours(indptr, indices, scores, k=options['neighbours'])
+            if options['keep_dense']:
+                writer.add_array('similarity', similarity, dtype=options['dtype'])
+
+        vectorizer_path = os.path.join(source, 'tfidf_vectorizer.pkl')
+        if os.path.exists(vectorizer_path):
+            writer.add_vectorizer(_load_pickle(vectorizer_path))
+
+        svd_path = os.path.join(source, 'svd_model.pkl')
+        if os.path.exists(svd_path):
+            try:
+                svd = _load_pickle(svd_path)
+            except ModuleNotFoundError as e:
+                # svd_model.pkl is a scikit-surprise object; it is only needed for this one-off conversion.
+                self.stdout.write(self.style.WARNING(f'Skipping svd_model.pkl ({e}); install scikit-surprise to convert it.'))
+            else:
+                trainset = svd.trainset
+                raw_ids = [trainset.to_raw_uid(u) for u in range(trainset.n_users)]
+                user_ids = _serving_user_ids(raw_ids)
+                keep = np.asarray([u is not None for u in user_ids], dtype=bool)
+                if not keep.all():
+                    unknown = [raw for raw, u in zip(raw_ids, user_ids) if u is None]
+                    message = (f'{len(unknown)} of {len(raw_ids)} SVD users match no ClerkUser id or clerk_id '
+                               f'(e.g. {unknown[:5]})')
+                    if not options['skip_unknown_users']:
+                        shutil.rmtree(tmp_output, ignore_errors=True)
+                        raise CommandError(f'{message}; pass --skip-unknown-users to drop them.')
+                    self.stdout.write(self.style.WARNING(f'{message}; dropping them.'))
+                writer.add_svd(
+                    user_ids=[u for u in user_ids if u is not None],
+                    item_ids=[int(trainset.to_raw_iid(i)) for i in range(trainset.n_items)],
+                    user_factors=np.asarray(svd.pu)[keep],
+                    item_factors=svd.qi,
+                    user_bias=np.asarray(svd.bu)[keep],
+                    item_bias=svd.bi,
+                    global_mean=trainset.global_mean,
+                )
+        manifest = writer.close()
+
+        if output:
+            shutil.rmtree(output, ignore_errors=True)
+            os.replace(tmp_output, output)
+        else:
+            output = publish_version(get_models_path(), version)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote recommender artifact {manifest['version']} ({manifest['n_events']} events) to {output}."
+        ))
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events.management.commands.benchmark_recommender import current_commit
+from events.management.commands.build_recommender import iter_event_documents
+from events.recommender.engine import DEFAULT_RECOMMENDATIONS
+from events.recommender.evaluation import (CONFIG_DEFAULTS, DEFAULT_CONFIGS, DEFAULT_TEST_FRACTION,
+                                           load_timed_interactions, parse_config, run_evaluation, synthetic_dataset)
+
+
+class Command(BaseCommand):
+    help = ('Evaluate recommender configurations offline on a time split of past tickets and saves: '
+            'precision@k, recall@k, coverage, latency and memory per configuration. Prints JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--config', action='append', dest='configs',
+                            help=('A configuration to evaluate, e.g. "engine=ann,dim=64,dtype=int8,nprobe=4" '
+                                  f"(keys: {', '.join(CONFIG_DEFAULTS)}; engines also include popular). "
+                                  'Repeat for several; defaults to a standard set.'))
+        parser.add_argument('--k', type=int, default=DEFAULT_RECOMMENDATIONS,
+                            help='Length of each recommendation list.')
+        parser.add_argument('--test-fraction', type=float, default=DEFAULT_TEST_FRACTION,
+                            help='Share of the most recent interactions held out.')
+        parser.add_argument('--split-date',
+                            help='Hold out interactions after this date (YYYY-MM-DD) instead of --test-fraction.')
+        parser.add_argument('--max-users', type=int,
+                            help='Evaluate a random sample of at most this many held-out users.')
+        parser.add_argument('--synthetic', metavar='EVENTS,USERS',
+                            help='Use a generated dataset (e.g. 5000,1000) instead of the database.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workdir', help='Directory for the trained artifacts (default: a temporary one).')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            configs = [parse_config(c) for c in options['configs'] or DEFAULT_CONFIGS]
+        except ValueError as e:
+            raise CommandError(str(e))
+        split_at = None
+        if options['split_date']:
+            try:
+                split_at = timezone.make_aware(datetime.strptime(options['split_date'], '%Y-%m-%d')).timestamp()
+            except ValueError:
+                raise CommandError('--split-date must be YYYY-MM-DD')
+
+        if options['synthetic']:
+            try:
+                n_events, n_users = (int(n) for n in options['synthetic'].split(','))
+            except ValueError:
+                raise CommandError('--synthetic must be EVENTS,USERS, e.g. 5000,1000')
+            documents, interactions = synthetic_dataset(n_events, n_users, seed=options['seed'])
+        else:
+            documents = list(iter_event_documents())
+            interactions = load_timed_interactions()
+        if not documents or not len(interactions[0]):
+            raise CommandError('Nothing to evaluate: need events and past tickets or saved events.')
+
+        report = run_evaluation(
+            documents, interactions, configs,
+            k=options['k'],
+            test_fraction=options['test_fraction'],
+            split_at=split_at,
+            max_users=options['max_users'],
+            seed=options['seed'],
+            workdir=options['workdir'],
+            log=lambda message: self.stderr.write(message),
+        )
+        if not report['split']['evaluated_users']:
+            self.stderr.write(self.style.WARNING('No user has interactions on both sides of the split.'))
+        report['dataset'] = 'synthetic' if options['synthetic'] else 'database'
+        report['commit'] = current_commit()
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from events.geocoding import Gazetteer
+from events.models import Event
+
+
+class Command(BaseCommand):
+    help = ('Fill event latitude/longitude from their location and address using a local gazetteer file '
+            '(a GeoNames dump such as cities500.txt, or a CSV with name, latitude and longitude columns).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gazetteer', default=settings.GEOCODER_GAZETTEER,
+                            help='Gazetteer file (defaults to the GEOCODER_GAZETTEER setting).')
+        parser.add_argument('--all', action='store_true',
+                            help='Geocode every event again, not only those without coordinates.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['gazetteer']:
+            raise CommandError('No gazetteer: pass --gazetteer or set GEOCODER_GAZETTEER.')
+        try:
+            gazetteer = Gazetteer.load(options['gazetteer'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read the gazetteer: {e}')
+        self.stdout.write(f'Loaded {len(gazetteer)} place names')
+
+        events = Event.objects.only('id', 'location', 'address', 'latitude', 'longitude').order_by('id')
+        if not options['all']:
+            events = events.filter(latitude__isnull=True)
+        batch_size = options['batch_size']
+        batch, found, missed = [], 0, 0
+        for event in events.iterator(chunk_size=batch_size):
+            point = gazetteer.geocode(event.location, event.address)
+            if point is None:
+                missed += 1
+                continue
+            event.latitude, event.longitude = point
+            batch.append(event)
+            found += 1
+            if len(batch) >= batch_size:
+                Event.objects.bulk_update(batch, ['latitude', 'longitude'])
+                batch = []
+        if batch:
+            Event.objects.bulk_update(batch, ['latitude', 'longitude'])
+        self.stdout.write(self.style.SUCCESS(f'Geocoded {found} events; {missed} locations not found'))
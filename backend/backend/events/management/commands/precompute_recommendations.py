@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from events.recommender.batch import DEFAULT_BATCH_MB, precompute_recommendations
+from events.recommender.cache import PROCESS_LOCAL_MESSAGE, is_process_local
+from events.recommender.collaborative import DEFAULT_CF_WEIGHT
+from events.recommender.engine import DEFAULT_RECOMMENDATIONS
+from events.recommender.loader import RecommendationModelLoader, recommender_engine
+
+
+class Command(BaseCommand):
+    help = 'Batch-score users with the current recommender and warm the per-user recommendation cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+',
+                            help='User ids to score (default: every user with a ticket or saved event).')
+        parser.add_argument('--count', type=int, default=DEFAULT_RECOMMENDATIONS,
+                            help='Recommendations kept per user.')
+        parser.add_argument('--max-block-mb', type=int,
+                            default=getattr(settings, 'RECOMMENDER_BATCH_MB', DEFAULT_BATCH_MB),
+                            help='Memory budget for each chunk of user scores.')
+
+    def handle(self, *args, **options):
+        if is_process_local():
+            # The results would be discarded when this command exits
+            raise CommandError(PROCESS_LOCAL_MESSAGE)
+        models = RecommendationModelLoader.get_models()
+        if models is None:
+            raise CommandError('No recommender artifact is published; run build_recommender first.')
+        started = time.monotonic()
+        results = precompute_recommendations(
+            models, options['users'],
+            n=options['count'],
+            cf_weight=getattr(settings, 'RECOMMENDER_CF_WEIGHT', DEFAULT_CF_WEIGHT),
+            max_block_mb=options['max_block_mb'],
+            engine=recommender_engine(),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached recommendations for {len(results)} user(s) from version {models.version} "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from events.models import Event
+from events.recommender.trending import TRENDING_WEIGHTS, decay_rate, flush_views, log_weight, warm_trending_cache
+from saved.models import SavedEvent
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = ('Recompute every event\'s trending score from ticket purchases and saves, then warm the cached '
+            'top-N lists. Views are only counted incrementally: those not yet flushed from the cache are '
+            'added back, earlier ones are dropped by a rebuild.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+                            help='Only count activity from the last N days (older activity has decayed away).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        event_ids, logs = [], []
+        for queryset, kind in (
+            (Ticket.objects.filter(purchase_time__gte=since).values_list('event_id', 'purchase_time'), 'ticket'),
+            (SavedEvent.objects.filter(event__isnull=False, created_at__gte=since).values_list('event_id', 'created_at'), 'save'),
+        ):
+            base = log_weight(TRENDING_WEIGHTS[kind], since)
+            for event_id, when in queryset.iterator(chunk_size=5000):
+                event_ids.append(event_id)
+                logs.append(base + decay_rate() * (when - since).total_seconds() / 3600)
+
+        scores = {}
+        if event_ids:
+            event_ids, logs = np.asarray(event_ids, dtype=np.int64), np.asarray(logs)
+            unique, inverse = np.unique(event_ids, return_inverse=True)
+            # log-sum-exp per event, shifted by the per-event maximum for stability
+            peak = np.full(len(unique), -np.inf)
+            np.maximum.at(peak, inverse, logs)
+            sums = np.bincount(inverse, weights=np.exp(logs - peak[inverse]), minlength=len(unique))
+            scores = dict(zip(unique.tolist(), (peak + np.log(sums)).tolist()))
+
+        batch_size = options['batch_size']
+        ids = list(scores)
+        with transaction.atomic():
+            Event.objects.exclude(trending_score__isnull=True).update(trending_score=None)
+            for start in range(0, len(ids), batch_size):
+                events = list(Event.objects.filter(id__in=ids[start:start + batch_size]).only('id'))
+                for event in events:
+                    event.trending_score = scores[event.id]
+                Event.objects.bulk_update(events, ['trending_score'])
+        views = flush_views()
+
+        lists = warm_trending_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt trending scores for {len(scores)} event(s), added {views} buffered view(s) '
+            f'and cached {lists} top-N list(s).'
+        ))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tickets_sold', models.PositiveIntegerField(default=0, help_text='Number of tickets sold for this event')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('category', models.CharField(default='other', max_length=100)),
+                ('date', models.CharField(blank=True, max_length=50, null=True)),
+                ('time', models.CharField(blank=True, max_length=50, null=True)),
+                ('location', models.CharField(max_length=255)),
+                ('address', models.CharField(blank=True, max_length=255, null=True)),
+                ('ticketTypes', models.JSONField(blank=True, null=True)),
+                ('image', models.URLField(blank=True, null=True)),
+                ('status', models.CharField(default='Upcoming', max_length=50)),
+                ('attendees', models.IntegerField(default=0)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('comments', models.JSONField(blank=True, default=list, help_text='List of comments', null=True)),
+                ('rating', models.FloatField(default=0.0, help_text='Overall event rating')),
+                ('organizer_name', models.CharField(blank=True, help_text='Organizer display name', max_length=256, null=True)),
+                ('organizer_image', models.URLField(blank=True, help_text='Organizer profile image URL', null=True)),
+                ('source', models.CharField(default='manual', help_text='Source of the event (manual, imported, etc.)', max_length=50)),
+                ('organizer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events_organized', to='users.clerkuser')),
+            ],
+        ),
+    ]
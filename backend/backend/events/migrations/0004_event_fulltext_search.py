@@ -0,0 +1,65 @@
+import logging
+
+from django.db import OperationalError, migrations
+
+# Full-text index for events/search.py: FULLTEXT on MySQL, an FTS5 table kept in
+# sync by triggers on SQLite. Other backends keep using icontains search.
+# The schema is frozen here as it was when this migration was written.
+
+MYSQL_INDEX = 'event_fulltext_idx'
+SEARCH_COLUMNS = ('title', 'description', 'location', 'organizer_name')
+FTS_TABLE = 'events_event_fts'
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_schema_statements():
+    columns = ', '.join(SEARCH_COLUMNS)
+    new = ', '.join(f'new.{c}' for c in SEARCH_COLUMNS)
+    old = ', '.join(f'old.{c}' for c in SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, content='events_event', content_rowid='id', "
+        f"tokenize='porter unicode61')",
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON events_event BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON events_event BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON events_event BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE events_event ADD FULLTEXT INDEX {MYSQL_INDEX} ({', '.join(SEARCH_COLUMNS)})")
+    elif vendor == 'sqlite':
+        try:
+            for statement in sqlite_schema_statements():
+                schema_editor.execute(statement)
+        except OperationalError as e:
+            # SQLite built without FTS5: search falls back to icontains
+            logger.warning('Could not create the events full-text index: %s', e)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE events_event DROP INDEX {MYSQL_INDEX}")
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_event_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:12
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Frozen copies of events.models.parse_event_date/parse_event_time as of this migration
+
+DATE_FORMATS = ('%Y-%m-%d', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M%p', '%I %p')
+
+
+def parse_event_date(value, start_time=None):
+    if value:
+        value = value.strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, fmt).date()
+            except ValueError:
+                pass
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except ValueError:
+            pass
+    if isinstance(start_time, datetime.datetime):
+        return timezone.localtime(start_time).date() if timezone.is_aware(start_time) else start_time.date()
+    return None
+
+
+def parse_event_time(value, start_time=None):
+    if value:
+        value = value.strip().upper()
+        for fmt in TIME_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, fmt).time()
+            except ValueError:
+                pass
+    if isinstance(start_time, datetime.datetime):
+        return (timezone.localtime(start_time) if timezone.is_aware(start_time) else start_time).time()
+    return None
+
+
+def backfill_typed_dates(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    batch = []
+    for event in Event.objects.only('id', 'date', 'time', 'start_time').iterator(chunk_size=2000):
+        event.event_date = parse_event_date(event.date, event.start_time)
+        event.event_time = parse_event_time(event.time, event.start_time)
+        batch.append(event)
+        if len(batch) >= 2000:
+            Event.objects.bulk_update(batch, ['event_date', 'event_time'])
+            batch = []
+    if batch:
+        Event.objects.bulk_update(batch, ['event_date', 'event_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_fulltext_search'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_date_id_idx',
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='event_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='event_time',
+            field=models.TimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_typed_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_date', 'id'], name='event_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:14
+
+from django.db import migrations, models
+
+# Frozen copy of events.models.ticket_summary as of this migration, and the step that
+# restores the SQLite search triggers (0004's DDL) dropped when events_event is rebuilt
+
+SEARCH_COLUMNS = ('title', 'description', 'location', 'organizer_name')
+FTS_TABLE = 'events_event_fts'
+
+
+def ticket_summary(ticket_types):
+    prices, available = [], 0
+    for tt in ticket_types if isinstance(ticket_types, list) else []:
+        if not isinstance(tt, dict):
+            continue
+        try:
+            prices.append(float(tt.get('price', 0) or 0))
+        except (TypeError, ValueError):
+            pass
+        try:
+            available += max(int(tt.get('quantity', 0) or 0), 0)
+        except (TypeError, ValueError):
+            pass
+    return {
+        'min_price': min(prices) if prices else None,
+        'max_price': max(prices) if prices else None,
+        'total_available': available,
+        'is_sold_out': bool(prices) and available == 0,
+    }
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if FTS_TABLE not in connection.introspection.table_names(cursor):
+            return
+    columns = ', '.join(SEARCH_COLUMNS)
+    new = ', '.join(f'new.{c}' for c in SEARCH_COLUMNS)
+    old = ', '.join(f'old.{c}' for c in SEARCH_COLUMNS)
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON events_event BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new}); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON events_event BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old}); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON events_event BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new}); END"
+    )
+    schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def backfill_ticket_summary(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    batch = []
+    for event in Event.objects.only('id', 'ticketTypes').iterator(chunk_size=2000):
+        for field, value in ticket_summary(event.ticketTypes).items():
+            setattr(event, field, value)
+        batch.append(event)
+        if len(batch) >= 2000:
+            Event.objects.bulk_update(batch, ['min_price', 'max_price', 'total_available', 'is_sold_out'])
+            batch = []
+    if batch:
+        Event.objects.bulk_update(batch, ['min_price', 'max_price', 'total_available', 'is_sold_out'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_event_coordinates'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='is_sold_out',
+            field=models.BooleanField(default=False, editable=False, help_text='Has ticket types and none left'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='max_price',
+            field=models.FloatField(blank=True, editable=False, help_text='Most expensive ticket type price', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='min_price',
+            field=models.FloatField(blank=True, editable=False, help_text='Cheapest ticket type price', null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='total_available',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Tickets left across all types'),
+        ),
+        migrations.RunPython(backfill_ticket_summary, migrations.RunPython.noop),
+        # Adding the NOT NULL columns rebuilt events_event on SQLite, dropping the full-text triggers
+        migrations.RunPython(restore_sqlite_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['min_price', 'id'], name='event_min_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['max_price'], name='event_max_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['is_sold_out', 'min_price'], name='event_sold_out_price_idx'),
+        ),
+    ]
@@ -1,7 +1,120 @@
+import datetime
+
 from django.db import models
+from django.utils import timezone
 from users.models import ClerkUser
 
 
+# Large columns left out of list payloads (and deferred in list querysets)
+LIST_EXCLUDED_FIELDS = ('comments', 'description')
+# List responses carry only the start of the description (cards show two lines of it)
+DESCRIPTION_EXCERPT_CHARS = 200
+
+# Formats the frontend and imports use for the free-form date/time strings
+DATE_FORMATS = ('%Y-%m-%d', '%B %d, %Y', '%b %d, %Y', '%d %B %Y', '%d %b %Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M%p', '%I %p')
+
+
+def parse_event_date(value, start_time=None):
+    """The date in the Event.date string (ISO timestamps included), else the local date of start_time."""
+    if value:
+        value = value.strip()
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, fmt).date()
+            except ValueError:
+                pass
+        try:
+            return datetime.date.fromisoformat(value[:10])
+        except ValueError:
+            pass
+    if isinstance(start_time, datetime.datetime):
+        return timezone.localtime(start_time).date() if timezone.is_aware(start_time) else start_time.date()
+    return None
+
+
+def parse_event_time(value, start_time=None):
+    """The time in the Event.time string, else the local time of start_time."""
+    if value:
+        value = value.strip().upper()
+        for fmt in TIME_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, fmt).time()
+            except ValueError:
+                pass
+    if isinstance(start_time, datetime.datetime):
+        return (timezone.localtime(start_time) if timezone.is_aware(start_time) else start_time).time()
+    return None
+
+
+def ticket_summary(ticket_types):
+    """Price range and availability of a ticketTypes list, as the values of Event's summary columns."""
+    prices, available = [], 0
+    for tt in ticket_types if isinstance(ticket_types, list) else []:
+        if not isinstance(tt, dict):
+            continue
+        try:
+            prices.append(float(tt.get('price', 0) or 0))
+        except (TypeError, ValueError):
+            pass
+        try:
+            available += max(int(tt.get('quantity', 0) or 0), 0)
+        except (TypeError, ValueError):
+            pass
+    return {
+        'min_price': min(prices) if prices else None,
+        'max_price': max(prices) if prices else None,
+        'total_available': available,
+        'is_sold_out': bool(prices) and available == 0,
+    }
+
+
+# Columns save() derives from others: (source fields, derived fields), for save(update_fields=...)
+DERIVED_FIELDS = (
+    ({'date', 'time', 'start_time'}, {'event_date', 'event_time'}),
+    ({'ticketTypes'}, {'min_price', 'max_price', 'total_available', 'is_sold_out'}),
+)
+
+
+class EventQuerySet(models.QuerySet):
+
+    def with_serializer_data(self):
+        """
+        Load what EventSerializer reads from other tables (the organizer and the
+        ticket count) with the events themselves, so serialising a page costs the
+        same number of queries whatever its size.
+        """
+        from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+        from tickets.models import Ticket
+        # Correlated subquery rather than JOIN + GROUP BY: counted only for the rows returned
+        tickets_sold = (
+            Ticket.objects.filter(event=OuterRef('pk')).order_by().values('event')
+            .annotate(count=Count('id')).values('count')
+        )
+        return self.select_related('organizer').annotate(
+            tickets_sold_count=Coalesce(Subquery(tickets_sold, output_field=IntegerField()), Value(0)),
+        )
+
+    def for_list(self, fields=None):
+        """
+        Skip the large comments/description columns unless fields (a sparse
+        fieldset) asks for them, so list pages don't pull them from the database.
+        A deferred description is replaced by its first DESCRIPTION_EXCERPT_CHARS
+        characters, cut in the query, for EventListSerializer.
+        """
+        from django.db.models.functions import Substr
+        deferred = [name for name in LIST_EXCLUDED_FIELDS if not fields or name not in fields]
+        queryset = self.defer(*deferred)
+        if 'description' in deferred:
+            queryset = queryset.annotate(description_excerpt=Substr('description', 1, DESCRIPTION_EXCERPT_CHARS))
+        return queryset
+
+    def upcoming(self, today=None):
+        """Events on or after today (local date), by the indexed event_date column."""
+        return self.filter(event_date__gte=today or timezone.localdate())
+
+
 class Event(models.Model):
     tickets_sold = models.PositiveIntegerField(default=0, help_text='Number of tickets sold for this event')
     title = models.CharField(max_length=200)
@@ -9,8 +122,15 @@ class Event(models.Model):
     category = models.CharField(max_length=100, default='other')
     date = models.CharField(max_length=50, blank=True, null=True)  # for compatibility with frontend
     time = models.CharField(max_length=50, blank=True, null=True)
+    # Typed copies of date/time (falling back to start_time), kept in sync by save(); filter and sort on
+    # these (event_date through the event_date_id_idx index)
+    event_date = models.DateField(blank=True, null=True, editable=False)
+    event_time = models.TimeField(blank=True, null=True, editable=False)
     location = models.CharField(max_length=255)
     address = models.CharField(max_length=255, blank=True, null=True)
+    # Filled from location/address by `manage.py geocode_events` (or set directly); used by ?near=
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
     ticketTypes = models.JSONField(blank=True, null=True)  # stores list of ticket types
     image = models.URLField(blank=True, null=True)
     status = models.CharField(max_length=50, default='Upcoming')
@@ -25,6 +145,49 @@ class Event(models.Model):
     organizer_name = models.CharField(max_length=256, blank=True, null=True, help_text='Organizer display name')
     organizer_image = models.URLField(blank=True, null=True, help_text='Organizer profile image URL')
     source = models.CharField(max_length=50, default='manual', help_text='Source of the event (manual, imported, etc.)')
+    # Log of the exponentially decayed activity score (see events/recommender/trending.py); null = no activity yet
+    trending_score = models.FloatField(blank=True, null=True, help_text='Log-space time-decayed popularity from tickets, saves and views')
+    # Summary of ticketTypes kept in sync by save(), so price and availability can be filtered in SQL
+    min_price = models.FloatField(blank=True, null=True, editable=False, help_text='Cheapest ticket type price')
+    max_price = models.FloatField(blank=True, null=True, editable=False, help_text='Most expensive ticket type price')
+    total_available = models.PositiveIntegerField(default=0, editable=False, help_text='Tickets left across all types')
+    is_sold_out = models.BooleanField(default=False, editable=False, help_text='Has ticket types and none left')
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-trending_score'], name='event_trending_idx'),
+            models.Index(fields=['category', '-trending_score'], name='event_category_trending_idx'),
+            models.Index(fields=['location', '-trending_score'], name='event_location_trending_idx'),
+            # Keyset pagination of the events list (events/pagination.py)
+            models.Index(fields=['start_time', 'id'], name='event_start_time_id_idx'),
+            models.Index(fields=['event_date', 'id'], name='event_date_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='event_created_at_id_idx'),
+            models.Index(fields=['attendees', 'id'], name='event_attendees_id_idx'),
+            models.Index(fields=['title', 'id'], name='event_title_id_idx'),
+            models.Index(fields=['status', 'id'], name='event_status_id_idx'),
+            # Price and availability filters, and keyset pagination by price
+            models.Index(fields=['min_price', 'id'], name='event_min_price_id_idx'),
+            models.Index(fields=['max_price'], name='event_max_price_idx'),
+            models.Index(fields=['is_sold_out', 'min_price'], name='event_sold_out_price_idx'),
+            # Bounding-box prefilter of ?near= searches (events/filters.py)
+            models.Index(fields=['latitude', 'longitude'], name='event_lat_lng_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.event_date = parse_event_date(self.date, self.start_time)
+        self.event_time = parse_event_time(self.time, self.start_time)
+        for field, value in ticket_summary(self.ticketTypes).items():
+            setattr(self, field, value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            for sources, derived in DERIVED_FIELDS:
+                if sources & update_fields:
+                    update_fields |= derived
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
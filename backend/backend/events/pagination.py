@@ -0,0 +1,151 @@
+import base64
+import json
+from datetime import date, datetime
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# --- Keyset pagination ---
+# The discover feed's infinite scroll pages through the whole table; with page
+# numbers every page costs a COUNT(*) and an OFFSET scan over all the rows before
+# it. Here a page is instead "the next page_size rows after (value, id)" of the
+# last row seen, for the active ordering field with the primary key as a tie
+# breaker, which the composite (field, id) indexes on Event answer directly at
+# any depth. There is no count and no page numbers, only next/previous links.
+# Relevance (?search=) and distance (?near=) orderings are computed per query;
+# they page the same way on (score, id), just without an index behind them.
+
+
+class EventCursorPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # Orderings with a (field, id) index; anything else falls back to the default
+    ordering_fields = ('start_time', 'event_date', 'created_at', 'attendees', 'title', 'status', 'min_price')
+    # Annotations set by the search and ?near= filters, kept as the ordering when present
+    annotation_fields = ('search_rank', 'distance_km')
+    default_ordering = '-start_time'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.name = name = self.ordering.lstrip('-')
+        # None for an annotation: a float that is never NULL on the rows it filters to
+        self.field = None if name in queryset.query.annotations else queryset.model._meta.get_field(name)
+        descending = self.ordering.startswith('-')
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        # Walking backwards (the previous link) is the same query in the opposite direction
+        backwards = descending != reverse
+        prefix = '-' if backwards else ''
+        queryset = queryset.order_by(prefix + name, prefix + 'id')
+        if cursor:
+            queryset = queryset.filter(self.after(name, cursor['value'], cursor['id'], backwards, queryset.db))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = cursor is not None if not reverse else has_more
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def get_ordering(self, queryset):
+        # OrderingFilter has already applied ?ordering= (or the view's default) to the queryset
+        ordering = queryset.query.order_by
+        first = ordering[0] if ordering else None
+        if not isinstance(first, str):
+            return self.default_ordering
+        name = first.lstrip('-')
+        if name in self.ordering_fields or (name in self.annotation_fields and name in queryset.query.annotations):
+            return first
+        return self.default_ordering
+
+    def after(self, name, value, pk, backwards, using):
+        """Rows after (value, pk) in the walking direction, with NULLs where the database sorts them."""
+        op = 'lt' if backwards else 'gt'
+        nulls_after = connections[using].features.nulls_order_largest != backwards
+        if value is None:
+            condition = Q(**{f'{name}__isnull': True, f'id__{op}': pk})
+            if not nulls_after:
+                condition |= Q(**{f'{name}__isnull': False})
+            return condition
+        condition = Q(**{f'{name}__{op}': value}) | Q(**{name: value, f'id__{op}': pk})
+        if self.field is not None and self.field.null and nulls_after:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    # --- Cursors ---
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            value = data['v']
+            if value is not None:
+                value = self.field.to_python(value) if self.field is not None else float(value)
+            return {'value': value, 'id': int(data['id']), 'reverse': bool(data.get('r'))}
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        value = getattr(row, self.field.attname if self.field is not None else self.name)
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        data = {'v': value, 'id': row.pk}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
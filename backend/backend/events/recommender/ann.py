@@ -0,0 +1,136 @@
+import threading
+
+import numpy as np
+
+from .embeddings import SCORE_BLOCK_ROWS, normalise_rows
+
+# --- Approximate nearest neighbour index (IVF) ---
+# The event embeddings are clustered with spherical k-means into n_lists cells;
+# each event is stored in the inverted list of its nearest centroid. A query
+# scores the centroids, then only the events in its nprobe best lists, so the
+# cost is O(n_lists + nprobe * N / n_lists) instead of O(N). nprobe is the
+# recall/latency knob: nprobe = n_lists is exact search.
+#
+# Arrays (centroids, list offsets, list members) live in the artifact and are
+# memory-mapped. Events added or deleted after the build are kept in a small
+# in-memory overlay (add() / remove()), synced from the delta segment.
+
+DEFAULT_NPROBE = 8
+DEFAULT_CANDIDATES = 200
+KMEANS_SAMPLE = 50_000
+
+
+def default_n_lists(n_events):
+    return max(1, int(np.sqrt(n_events)))
+
+
+def assign(embeddings, centroids, block_rows=SCORE_BLOCK_ROWS):
+    """Nearest centroid (by cosine) of every embedding row, one block at a time."""
+    lists = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), block_rows):
+        block = embeddings.rows(np.arange(start, min(start + block_rows, len(embeddings))))
+        lists[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def train_centroids(embeddings, n_lists, iterations=10, seed=0):
+    """Spherical k-means on a sample of the embeddings."""
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    sample = embeddings.rows(np.sort(rng.choice(n, size=min(n, KMEANS_SAMPLE), replace=False)))
+    n_lists = min(n_lists, len(sample))
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = ~np.bincount(labels, minlength=n_lists).astype(bool)
+        # Re-seed empty cells with random sample points so every list stays useful
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalise_rows(sums)
+    return centroids.astype(np.float32)
+
+
+def build_ivf(embeddings, n_lists=None, iterations=10, seed=0):
+    """Returns (centroids, list_indptr, list_rows) for an Embeddings view."""
+    centroids = train_centroids(embeddings, n_lists or default_n_lists(len(embeddings)), iterations, seed)
+    labels = assign(embeddings, centroids)
+    order = np.argsort(labels, kind='stable')
+    indptr = np.zeros(len(centroids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=len(centroids)), out=indptr[1:])
+    return centroids, indptr, order.astype(np.int32)
+
+
+class IVFIndex:
+
+    def __init__(self, centroids, indptr, rows, embeddings):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.indptr = indptr
+        self.rows = rows
+        self.embeddings = embeddings
+        self.added = {}              # list -> [(row, float32 vector)] added after the build
+        self.removed = set()
+        self._synced = None
+        self._lock = threading.Lock()
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def add(self, row, vector):
+        """Insert (or move) a row, e.g. an event created or edited after the build."""
+        self.remove(row)
+        self.removed.discard(row)
+        cell = int(np.argmax(self.centroids @ vector))
+        self.added.setdefault(cell, []).append((int(row), np.asarray(vector, dtype=np.float32)))
+
+    def remove(self, row):
+        """Hide a row from every search, e.g. a deleted event."""
+        row = int(row)
+        for cell, members in self.added.items():
+            self.added[cell] = [m for m in members if m[0] != row]
+        self.removed.add(row)
+
+    def sync(self, delta):
+        """Mirror the delta segment's added and deleted events into the overlay (once per change)."""
+        if delta is None:
+            return
+        if delta.changes == self._synced:
+            return
+        with self._lock:
+            changes = delta.changes
+            extra_rows, extra_vectors = delta.extra_embeddings(self.embeddings)
+            self.added = {}
+            self.removed = set()
+            for row, vector in zip(extra_rows, extra_vectors):
+                self.add(row, vector)
+            for row in delta.removed:
+                self.remove(row)
+            self._synced = changes
+
+    def search(self, query, n=DEFAULT_CANDIDATES, nprobe=DEFAULT_NPROBE):
+        """(rows, scores) of the best n rows among the nprobe nearest lists."""
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(max(nprobe, 1), self.n_lists)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            cells = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            cells = np.arange(self.n_lists)
+
+        members = [np.asarray(self.rows[self.indptr[c]:self.indptr[c + 1]], dtype=np.int64) for c in cells]
+        rows = np.concatenate(members) if members else np.empty(0, dtype=np.int64)
+        scores = self.embeddings.rows(rows) @ query if len(rows) else np.empty(0, dtype=np.float32)
+
+        extra = [m for c in cells for m in self.added.get(int(c), ())]
+        if extra:
+            rows = np.concatenate([rows, np.asarray([m[0] for m in extra], dtype=np.int64)])
+            scores = np.concatenate([scores, np.vstack([m[1] for m in extra]) @ query])
+        if self.removed:
+            keep = ~np.isin(rows, np.fromiter(self.removed, dtype=np.int64, count=len(self.removed)))
+            rows, scores = rows[keep], scores[keep]
+
+        if len(scores) > n:
+            top = np.argpartition(-scores, n - 1)[:n]
+            rows, scores = rows[top], scores[top]
+        return rows, scores.astype(np.float32)
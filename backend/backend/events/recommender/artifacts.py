@@ -0,0 +1,528 @@
+import json
+import os
+import shutil
+import uuid
+from collections.abc import Mapping
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .ann import IVFIndex
+from .delta import DeltaSegment, carry_delta
+from .embeddings import Embeddings, quantise
+from .neighbours import NeighbourIndex, merge_scored
+
+# --- Recommender artifact format ---
+# An artifact is a directory of raw .npy arrays plus a manifest.json. Arrays are
+# opened with np.load(mmap_mode='r') so every worker shares one copy through the
+# OS page cache instead of unpickling its own. The manifest is written last, so a
+# directory without one is treated as incomplete.
+#
+# Artifacts are versioned: each build is staged under versions/.staging-<version>,
+# renamed into versions/<version> once complete, and only then published by
+# atomically replacing the CURRENT pointer file with the new version name.
+
+FORMAT_VERSION = 1
+MANIFEST_FILENAME = 'manifest.json'
+VERSIONS_DIRNAME = 'versions'
+CURRENT_POINTER = 'CURRENT'
+STAGING_PREFIX = '.staging-'
+
+# Only the TfidfVectorizer params that affect transform() are persisted.
+VECTORIZER_PARAMS = (
+    'analyzer', 'binary', 'lowercase', 'ngram_range', 'norm', 'smooth_idf',
+    'stop_words', 'strip_accents', 'sublinear_tf', 'token_pattern', 'use_idf',
+)
+
+
+class EventIdMap:
+    """
+    Array-backed mapping between event ids and model row indices.
+    Lookups use np.searchsorted over a sorted copy of the ids, so no Python dict
+    is ever built and the whole map can stay memory-mapped.
+    """
+
+    def __init__(self, packed):
+        # packed rows: 0 = event id per row, 1 = ids sorted, 2 = row of each sorted id
+        self.packed = packed
+        self.event_ids = packed[0]
+        self._sorted_ids = packed[1]
+        self._sorted_rows = packed[2]
+
+    @staticmethod
+    def pack(event_ids):
+        event_ids = np.asarray(event_ids, dtype=np.int64)
+        order = np.argsort(event_ids, kind='stable')
+        return np.stack([event_ids, event_ids[order], order.astype(np.int64)])
+
+    def __len__(self):
+        return len(self.event_ids)
+
+    def __contains__(self, event_id):
+        return self.index_of(event_id) is not None
+
+    def indices_for(self, event_ids):
+        """Return the row index for each id, or -1 where the id is unknown."""
+        event_ids = np.asarray(event_ids, dtype=np.int64).ravel()
+        if not len(self) or not len(event_ids):
+            return np.full(len(event_ids), -1, dtype=np.int64)
+        pos = np.searchsorted(self._sorted_ids, event_ids)
+        pos = np.minimum(pos, len(self) - 1)
+        found = self._sorted_ids[pos] == event_ids
+        return np.where(found, self._sorted_rows[pos], -1)
+
+    def index_of(self, event_id):
+        try:
+            idx = int(self.indices_for([int(event_id)])[0])
+        except (TypeError, ValueError):
+            return None
+        return idx if idx >= 0 else None
+
+    def ids_for(self, indices):
+        return self.event_ids[np.asarray(indices, dtype=np.int64)]
+
+
+class TermIndex(Mapping):
+    """
+    Read-only term -> TF-IDF column mapping over a sorted array of terms, used as
+    the vectorizer's vocabulary so no per-process dict of the vocabulary is built.
+    """
+
+    def __init__(self, terms, columns):
+        self.terms = terms
+        self.columns = columns
+
+    @staticmethod
+    def pack(terms):
+        terms = np.asarray(terms, dtype=str)
+        order = np.argsort(terms, kind='stable')
+        return terms[order], order.astype(np.int32)
+
+    def __getitem__(self, term):
+        pos = int(np.searchsorted(self.terms, term))
+        if pos < len(self.terms) and self.terms[pos] == term:
+            return int(self.columns[pos])
+        raise KeyError(term)
+
+    def __iter__(self):
+        return (str(t) for t in self.terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+
+class ArtifactWriter:
+    """Writes arrays into an artifact directory; call close() to write the manifest."""
+
+    def __init__(self, path, version=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        now = datetime.now(timezone.utc)
+        self.manifest = {
+            'format_version': FORMAT_VERSION,
+            'version': version or new_version_name(),
+            'created_at': now.isoformat(),
+            'arrays': {},
+            'files': [],
+        }
+
+    def create_array(self, name, shape, dtype):
+        """Create an on-disk array to be filled in chunks (e.g. a large similarity matrix)."""
+        filename = f'{name}.npy'
+        array = np.lib.format.open_memmap(os.path.join(self.path, filename), mode='w+', dtype=dtype, shape=tuple(shape))
+        self.manifest['arrays'][name] = {
+            'file': filename,
+            'dtype': str(array.dtype),
+            'shape': list(array.shape),
+        }
+        return array
+
+    def add_array(self, name, array, dtype=None):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        filename = f'{name}.npy'
+        np.save(os.path.join(self.path, filename), array, allow_pickle=False)
+        self.manifest['arrays'][name] = {
+            'file': filename,
+            'dtype': str(array.dtype),
+            'shape': list(array.shape),
+        }
+        return array
+
+    def add_json(self, name, data):
+        filename = f'{name}.json'
+        with open(os.path.join(self.path, filename), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        self.manifest['files'].append(filename)
+
+    def add_event_ids(self, event_ids):
+        packed = self.add_array('event_id_map', EventIdMap.pack(event_ids))
+        self.manifest['n_events'] = int(packed.shape[1])
+
+    def add_vectorizer(self, vectorizer):
+        """Persist a fitted TfidfVectorizer as its vocabulary and idf weights."""
+        params = vectorizer.get_params()
+        self.manifest['vectorizer'] = {
+            name: list(params[name]) if isinstance(params[name], tuple) else params[name]
+            for name in VECTORIZER_PARAMS
+        }
+        terms = [str(t) for t in vectorizer.get_feature_names_out()]
+        self.add_json('tfidf_terms', terms)
+        sorted_terms, columns = TermIndex.pack(terms)
+        self.add_array('tfidf_vocabulary', sorted_terms)
+        self.add_array('tfidf_vocabulary_columns', columns)
+        self.add_array('tfidf_idf', vectorizer.idf_, dtype=np.float64)
+
+    def copy_svd(self, artifact):
+        """Carry the collaborative factors of an existing artifact into this one."""
+        svd = artifact.svd if artifact is not None else None
+        if svd is not None:
+            self.add_svd(**svd)
+
+    def add_postings(self, matrix):
+        """
+        Store the TF-IDF matrix term-major (one row of postings per term), so a new
+        document is scored against every event by touching only its own terms.
+        """
+        postings = matrix.T.tocsr()
+        index_dtype = np.int32 if postings.nnz < np.iinfo(np.int32).max else np.int64
+        self.add_array('tfidf_postings_indptr', postings.indptr, dtype=index_dtype)
+        self.add_array('tfidf_postings_indices', postings.indices, dtype=index_dtype)
+        self.add_array('tfidf_postings_data', postings.data, dtype=np.float32)
+
+    def add_svd(self, user_ids, item_ids, user_factors, item_factors, user_bias, item_bias, global_mean):
+        self.add_array('svd_user_ids', np.asarray([str(u) for u in user_ids], dtype=str))
+        self.add_array('svd_item_ids', item_ids, dtype=np.int64)
+        self.add_array('svd_user_factors', user_factors, dtype=np.float32)
+        self.add_array('svd_item_factors', item_factors, dtype=np.float32)
+        self.add_array('svd_user_bias', user_bias, dtype=np.float32)
+        self.add_array('svd_item_bias', item_bias, dtype=np.float32)
+        self.manifest['svd'] = {'global_mean': float(global_mean)}
+
+    def add_embeddings(self, embeddings, dtype='float32', components=None):
+        """Store row-normalised event embeddings as float32, float16 or int8 (+ per-row scales)."""
+        values, scales = quantise(embeddings, dtype)
+        self.add_array('embedding_values', values)
+        if scales is not None:
+            self.add_array('embedding_scales', scales, dtype=np.float32)
+        if components is not None:
+            self.add_array('embedding_components', components, dtype=np.float32)
+        self.manifest['embeddings'] = {'dim': int(values.shape[1]), 'dtype': str(values.dtype)}
+        return Embeddings(values, scales, components)
+
+    def add_ivf(self, centroids, indptr, rows):
+        """Store an IVF index over the embeddings: centroids plus the members of each list, CSR-style."""
+        self.add_array('ivf_centroids', centroids, dtype=np.float32)
+        self.add_array('ivf_indptr', indptr, dtype=np.int64)
+        self.add_array('ivf_rows', rows, dtype=np.int32)
+        self.manifest['ivf'] = {'n_lists': int(len(centroids))}
+
+    def add_neighbours(self, indptr, indices, scores, k):
+        self.add_array('neighbour_indptr', indptr, dtype=np.int64)
+        self.add_array('neighbour_indices', indices, dtype=np.int32)
+        self.add_array('neighbour_scores', scores, dtype=np.float32)
+        self.manifest['neighbours'] = {'k': int(k)}
+
+    def set(self, key, value):
+        self.manifest[key] = value
+
+    def close(self):
+        # Written last and atomically: readers never see a manifest for a partial artifact.
+        tmp_path = os.path.join(self.path, MANIFEST_FILENAME + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILENAME))
+        return self.manifest
+
+
+class RecommenderArtifact:
+    """A loaded artifact. Arrays are memory-mapped lazily on first access."""
+
+    def __init__(self, path, manifest, arrays=None):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest.get('version')
+        self.shared_segments = None
+        self._arrays = dict(arrays or {})
+        self._vectorizer = None
+        self._postings = None
+        self._delta = None
+        self._memo = {}
+        self.id_map = EventIdMap(self.array('event_id_map'))
+
+    def memo(self, key, build, stale=None):
+        """Compute a derived structure once per loaded version (again whenever stale(value) says so)."""
+        value = self._memo.get(key)
+        if value is None or (stale is not None and stale(value)):
+            value = self._memo[key] = build()
+        return value
+
+    def memoised(self, key):
+        """The memoised value for key, or None if it has not been built."""
+        return self._memo.get(key)
+
+    def has_array(self, name):
+        return name in self.manifest.get('arrays', {})
+
+    def array(self, name):
+        if name not in self._arrays:
+            if not self.has_array(name):
+                return None
+            filename = self.manifest['arrays'][name]['file']
+            self._arrays[name] = np.load(os.path.join(self.path, filename), mmap_mode='r', allow_pickle=False)
+        return self._arrays[name]
+
+    def read_json(self, name):
+        with open(os.path.join(self.path, f'{name}.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    @property
+    def n_events(self):
+        return len(self.id_map)
+
+    @property
+    def similarity(self):
+        return self.array('similarity')
+
+    @property
+    def neighbours(self):
+        if not self.has_array('neighbour_indptr'):
+            return None
+        return NeighbourIndex(
+            self.array('neighbour_indptr'),
+            self.array('neighbour_indices'),
+            self.array('neighbour_scores'),
+        )
+
+    @property
+    def embeddings(self):
+        if not self.has_array('embedding_values'):
+            return None
+        return Embeddings(
+            self.array('embedding_values'),
+            self.array('embedding_scales'),
+            self.array('embedding_components'),
+        )
+
+    @property
+    def ann(self):
+        """The IVF index over the embeddings, with events added or deleted since the build applied."""
+        if not self.has_array('ivf_centroids') or not self.has_array('embedding_values'):
+            return None
+        index = self.memo('ann', lambda: IVFIndex(
+            self.array('ivf_centroids'), self.array('ivf_indptr'), self.array('ivf_rows'), self.embeddings,
+        ))
+        index.sync(self.delta)
+        return index
+
+    @property
+    def vectorizer(self):
+        """Rebuild the TfidfVectorizer from its vocabulary and idf weights (no unpickling)."""
+        if self._vectorizer is None and 'vectorizer' in self.manifest:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            params = dict(self.manifest['vectorizer'])
+            params['ngram_range'] = tuple(params['ngram_range'])
+            if self.has_array('tfidf_vocabulary'):
+                # Fitted state set directly: sklearn would copy a vocabulary given to the constructor into a dict
+                vectorizer = TfidfVectorizer(**params)
+                vectorizer.vocabulary_ = TermIndex(self.array('tfidf_vocabulary'), self.array('tfidf_vocabulary_columns'))
+                vectorizer.fixed_vocabulary_ = True
+            else:
+                terms = self.read_json('tfidf_terms')
+                vectorizer = TfidfVectorizer(vocabulary={t: i for i, t in enumerate(terms)}, **params)
+            vectorizer.idf_ = np.asarray(self.array('tfidf_idf'))
+            self._vectorizer = vectorizer
+        return self._vectorizer
+
+    @property
+    def n_terms(self):
+        return len(self.array('tfidf_idf')) if self.has_array('tfidf_idf') else 0
+
+    @property
+    def supports_delta(self):
+        return self.has_array('tfidf_postings_indptr') and 'vectorizer' in self.manifest
+
+    @property
+    def delta(self):
+        """Events added since the build; tailed from delta.jsonl on every access."""
+        if not self.supports_delta:
+            return None
+        if self._delta is None:
+            self._delta = DeltaSegment(self)
+        self._delta.refresh()
+        return self._delta
+
+    @property
+    def n_rows(self):
+        """Size of the index space: base events plus events added through the delta segment."""
+        delta = self.delta
+        return self.n_events + (len(delta.extra_ids) if delta is not None else 0)
+
+    def term_scores(self, cols, weights):
+        """Dot product of a TF-IDF query (term columns, weights) with every base event."""
+        if self._postings is None:
+            from scipy.sparse import csr_matrix
+            self._postings = csr_matrix(
+                (self.array('tfidf_postings_data'), self.array('tfidf_postings_indices'),
+                 self.array('tfidf_postings_indptr')),
+                shape=(self.n_terms, self.n_events),
+            )
+        if not len(cols):
+            return np.zeros(self.n_events, dtype=np.float32)
+        return np.asarray(self._postings[cols].T @ weights, dtype=np.float32).ravel()
+
+    def indices_for(self, event_ids):
+        """Row index per event id across base and delta rows; -1 where unknown."""
+        indices = self.id_map.indices_for(event_ids)
+        delta = self.delta
+        if delta is not None and delta.extra_ids and (indices < 0).any():
+            missing = np.flatnonzero(indices < 0)
+            for pos in missing:
+                found = delta.index_of(int(np.asarray(event_ids).ravel()[pos]))
+                if found is not None:
+                    indices[pos] = found
+        return indices
+
+    def ids_for(self, indices):
+        delta = self.delta
+        if delta is None or not delta.extra_ids:
+            return self.id_map.ids_for(indices)
+        return delta.ids_for(indices)
+
+    def neighbour_lists(self, rows):
+        """(neighbour rows, scores) for each row, with delta rows overriding the base index."""
+        base = self.neighbours
+        delta = self.delta
+        for row in rows:
+            row = int(row)
+            if delta is not None and row in delta.rows:
+                yield delta.rows[row]
+            elif base is not None and 0 <= row < len(base):
+                yield base.row(row)
+            reverse = delta.reverse.get(row) if delta is not None else None
+            if reverse:
+                yield (np.fromiter(reverse.keys(), dtype=np.int64, count=len(reverse)),
+                       np.fromiter(reverse.values(), dtype=np.float32, count=len(reverse)))
+
+    def merge_neighbours(self, rows):
+        parts = list(self.neighbour_lists(rows))
+        if not parts:
+            return merge_scored([], [])
+        return merge_scored(np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]))
+
+    @property
+    def svd(self):
+        if 'svd' not in self.manifest:
+            return None
+        return {
+            'global_mean': self.manifest['svd']['global_mean'],
+            'user_ids': self.array('svd_user_ids'),
+            'item_ids': self.array('svd_item_ids'),
+            'user_factors': self.array('svd_user_factors'),
+            'item_factors': self.array('svd_item_factors'),
+            'user_bias': self.array('svd_user_bias'),
+            'item_bias': self.array('svd_item_bias'),
+        }
+
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recommender artifact format {manifest.get('format_version')!r} in {path}")
+    return manifest
+
+
+def load_artifact(path, shared=False):
+    """
+    Open the artifact at path, or return None if it has not been (fully) written.
+    With shared=True its arrays are served from shared memory segments when
+    possible (see shared.py), otherwise memory-mapped.
+    """
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    artifact = RecommenderArtifact(path, manifest)
+    if shared:
+        from .shared import attach_shared
+        attached = attach_shared(artifact)
+        if attached is not None:
+            segments, arrays = attached
+            artifact = RecommenderArtifact(path, manifest, arrays)
+            # Keep the segments open for as long as the arrays viewing them are in use
+            artifact.shared_segments = segments
+    return artifact
+
+
+# --- Versioned artifact store ---
+
+def new_version_name():
+    return f"{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def versions_path(models_path):
+    return os.path.join(models_path, VERSIONS_DIRNAME)
+
+
+def staging_path(models_path, version):
+    return os.path.join(versions_path(models_path), STAGING_PREFIX + version)
+
+
+def read_current_version(models_path):
+    try:
+        with open(os.path.join(models_path, CURRENT_POINTER), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_artifact_path(models_path):
+    version = read_current_version(models_path)
+    if version is None:
+        return None
+    return os.path.join(versions_path(models_path), version)
+
+
+def publish_version(models_path, version, delta_since=None):
+    """
+    Move a completed staging directory into place and point CURRENT at it.
+    Both steps are renames, so a concurrent reader sees either the old or the
+    new version, never a half-written one.
+
+    delta_since: when the build read the database. Event changes the previous
+    version recorded from then on are carried over to the new version's delta.
+    """
+    staged = staging_path(models_path, version)
+    if read_manifest(staged) is None:
+        raise ValueError(f'Refusing to publish {staged}: artifact has no manifest.')
+    previous = read_current_version(models_path)
+    final = os.path.join(versions_path(models_path), version)
+    os.replace(staged, final)
+    tmp_pointer = os.path.join(models_path, f'{CURRENT_POINTER}.{uuid.uuid4().hex}.tmp')
+    with open(tmp_pointer, 'w', encoding='utf-8') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, os.path.join(models_path, CURRENT_POINTER))
+    # After the switch: from now on workers also record changes for the new version
+    # themselves, so nothing written to the previous delta is missed
+    if delta_since is not None and previous and previous != version:
+        carry_delta(os.path.join(versions_path(models_path), previous), final, delta_since)
+    return final
+
+
+def prune_versions(models_path, keep=3):
+    """Delete all but the newest `keep` published versions, never the current one."""
+    root = versions_path(models_path)
+    if not os.path.isdir(root):
+        return []
+    current = read_current_version(models_path)
+    names = sorted(n for n in os.listdir(root) if not n.startswith('.'))
+    removed = []
+    for name in names[:-keep] if keep > 0 else names:
+        if name != current:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed.append(name)
+    return removed
@@ -0,0 +1,303 @@
+import numpy as np
+
+from .collaborative import DEFAULT_CF_WEIGHT, SAVED_WEIGHT, TICKET_WEIGHT, svd_lookups
+from .embeddings import normalise_rows
+from .engine import DEFAULT_ENGINE, DEFAULT_RECOMMENDATIONS
+from .external import external_embeddings, external_term_scores, external_vectors, load_external_saves
+from .masks import get_eligibility_masks
+from .neighbours import block_rows_for
+from .trending import trending_event_ids
+
+# --- Batch recommendations ---
+# Scores many users at once instead of calling recommend_event_ids_for_user in a
+# loop. Interactions for every user come from one query per table and form a
+# sparse user x event matrix B; content scores for a chunk of users are then
+# B_chunk @ N (N = the sparse neighbour index, with the delta segment applied)
+# and collaborative scores are one dense product with the item factors. The
+# blending and ranking rules are the same as the per-user path, applied row-wise.
+
+DEFAULT_BATCH_MB = 256
+# Dense (users x events) arrays alive at once while a chunk is scored: content,
+# collaborative, total, the content/CF masks and _normalise_rows' temporaries.
+LIVE_SCORE_BLOCKS = 6
+
+
+def popular_event_ids(n=DEFAULT_RECOMMENDATIONS, categories=None):
+    """Fallback for users the models know nothing about: what is trending right now (a cached read)."""
+    return trending_event_ids(n, categories)
+
+
+def load_interactions(user_ids=None, chunk_size=5000):
+    """
+    (user ids, event ids, weights) for ticket purchases and internal saved events,
+    optionally restricted to user_ids. One query per table, however many users.
+    Saved external events are loaded separately (external.load_external_saves).
+    """
+    from saved.models import SavedEvent
+    from tickets.models import Ticket
+
+    tickets = Ticket.objects.all()
+    saved = SavedEvent.objects.filter(event__isnull=False)
+    if user_ids is not None:
+        tickets = tickets.filter(user_id__in=user_ids)
+        saved = saved.filter(user_id__in=user_ids)
+    users, events, weights = [], [], []
+    for queryset, weight in ((saved, SAVED_WEIGHT), (tickets, TICKET_WEIGHT)):
+        for user_id, event_id in queryset.values_list('user_id', 'event_id').iterator(chunk_size=chunk_size):
+            users.append(user_id)
+            events.append(event_id)
+            weights.append(weight)
+    return (
+        np.asarray(users, dtype=np.int64),
+        np.asarray(events, dtype=np.int64),
+        np.asarray(weights, dtype=np.float32),
+    )
+
+
+def _positions(sorted_keys, order, keys):
+    """Position in the unsorted array of each key (via its argsort order), -1 where absent."""
+    keys = np.asarray(keys)
+    if not len(sorted_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[pos] == keys, order[pos], -1)
+
+
+def interaction_matrix(models, user_ids, interaction_users, interaction_events, interaction_weights):
+    """
+    Sparse (len(user_ids) x n_rows) matrix of interaction weights. A user who both
+    saved and bought an event keeps the larger weight, as in the per-user path.
+    """
+    from scipy.sparse import csr_matrix
+
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    n_rows = models.n_rows
+    order = np.argsort(user_ids, kind='stable')
+    user_pos = _positions(user_ids[order], order, interaction_users)
+    rows = models.indices_for(interaction_events) if len(interaction_events) else np.empty(0, dtype=np.int64)
+    known = (user_pos >= 0) & (rows >= 0)
+    user_pos, rows, weights = user_pos[known], rows[known], interaction_weights[known]
+
+    # Collapse duplicate (user, event) pairs to their maximum weight.
+    keys = user_pos * n_rows + rows
+    key_order = np.argsort(keys, kind='stable')
+    keys, weights = keys[key_order], weights[key_order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+    weights = np.maximum.reduceat(weights, starts) if len(keys) else weights
+    keys = keys[starts]
+    return csr_matrix((weights, (keys // n_rows, keys % n_rows)), shape=(len(user_ids), n_rows), dtype=np.float32)
+
+
+def neighbour_matrix(models):
+    """The neighbour index as a sparse n_rows x n_rows matrix, delta rows and reverse edges applied."""
+    from scipy.sparse import coo_matrix, csr_matrix, diags
+
+    n_rows = models.n_rows
+    base = models.neighbours
+    if base is not None:
+        n_base = len(base)
+        indptr = np.r_[np.asarray(base.indptr, dtype=np.int64), np.full(n_rows - n_base, base.indptr[-1], dtype=np.int64)]
+        matrix = csr_matrix((base.scores, base.indices, indptr), shape=(n_rows, n_rows), dtype=np.float32)
+    else:
+        matrix = csr_matrix((n_rows, n_rows), dtype=np.float32)
+
+    delta = models.delta
+    if delta is None or not len(delta):
+        return matrix
+    keep = np.ones(n_rows, dtype=np.float32)
+    keep[np.fromiter(delta.rows.keys(), dtype=np.int64, count=len(delta.rows))] = 0
+    rows, cols, scores = [], [], []
+    for row, (neighbour_rows, neighbour_scores) in delta.rows.items():
+        rows.append(np.full(len(neighbour_rows), row, dtype=np.int64))
+        cols.append(neighbour_rows)
+        scores.append(neighbour_scores)
+    for row, edges in delta.reverse.items():
+        rows.append(np.full(len(edges), row, dtype=np.int64))
+        cols.append(np.fromiter(edges.keys(), dtype=np.int64, count=len(edges)))
+        scores.append(np.fromiter(edges.values(), dtype=np.float32, count=len(edges)))
+    extra = coo_matrix(
+        (np.concatenate(scores), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_rows, n_rows), dtype=np.float32,
+    )
+    return (diags(keep) @ matrix + extra).tocsr()
+
+
+def _normalise_rows(scores, mask):
+    """Row-wise min-max scaling over the masked entries, matching collaborative._normalise."""
+    low = np.where(mask, scores, np.inf).min(axis=1, keepdims=True)
+    high = np.where(mask, scores, -np.inf).max(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore'):
+        span = high - low
+        flat = ~(span > 0)
+        out = np.where(flat, (high > 0).astype(np.float32), (scores - low) / np.where(flat, 1, span))
+    return np.where(mask, out, 0).astype(np.float32)
+
+
+def _top_n(scores, n):
+    """(rows, scores) of the best n positive entries of every row, best first."""
+    n = min(n, scores.shape[1])
+    if n <= 0:
+        return [np.empty(0, dtype=np.int64)] * len(scores)
+    top = np.argpartition(-scores, n - 1, axis=1)[:, :n] if scores.shape[1] > n else np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    # Equal scores go to the lower row, as in engine.rank
+    order = np.lexsort((top, -top_scores), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    return [row[row_scores > 0].astype(np.int64) for row, row_scores in zip(top, top_scores)]
+
+
+def user_profiles(models, seen, external=None):
+    """
+    Normalised mean embedding per user row of seen (plus the projected external
+    vectors of {user row: vectors}), and which rows the embeddings cover.
+    """
+    embeddings = models.embeddings
+    n_base = len(embeddings)
+    profiles = embeddings.weighted_sums(seen[:, :n_base])
+    covered = np.zeros(models.n_rows, dtype=bool)
+    covered[:n_base] = True
+    extra_rows, extra_vectors = (np.empty(0, dtype=np.int64), None)
+    delta = models.delta
+    if delta is not None and delta.vectors:
+        extra_rows, extra_vectors = delta.extra_embeddings(embeddings)
+        if len(extra_rows):
+            profiles += seen[:, extra_rows] @ extra_vectors
+            covered[extra_rows] = True
+    for position, vectors in (external or {}).items():
+        profiles[position] += external_embeddings(models, vectors).sum(axis=0)
+    return normalise_rows(profiles), covered, extra_rows, extra_vectors
+
+
+def recommend_for_users(models, user_ids, interactions=None, n=DEFAULT_RECOMMENDATIONS,
+                        cf_weight=DEFAULT_CF_WEIGHT, max_block_mb=DEFAULT_BATCH_MB, engine=DEFAULT_ENGINE,
+                        external_saves=None):
+    """
+    Ranked event ids for every user in user_ids, scored in chunks whose dense score
+    blocks together stay under max_block_mb. Users left without an eligible scored
+    event map to None so the caller can apply its own fallback. external_saves
+    ({user id: [(external id, data)]}, loaded when omitted) adds saved external
+    events to the content scores, as in the per-user path.
+    """
+    user_ids = np.asarray(list(user_ids), dtype=np.int64)
+    if interactions is None:
+        interactions = load_interactions(user_ids.tolist())
+    if external_saves is None:
+        external_saves = load_external_saves(user_ids.tolist())
+    positions = {int(user_id): position for position, user_id in enumerate(user_ids)}
+    external = {}
+    for user_id, saves in external_saves.items():
+        vectors = external_vectors(models, saves) if user_id in positions else []
+        if vectors:
+            external[positions[user_id]] = vectors
+    n_rows = models.n_rows
+    interacted = interaction_matrix(models, user_ids, *interactions)
+    eligible = get_eligibility_masks(models).mask(n_rows)
+    # Content scores ignore interaction weights, like merge_neighbours in the per-user path.
+    seen = interacted.copy()
+    seen.data[:] = 1
+
+    # The ANN index only pays off per request; a batch scores every event anyway, so 'ann' runs exact.
+    embeddings = models.embeddings if engine in ('embeddings', 'ann') else None
+    if embeddings is not None:
+        profiles, covered, extra_rows, extra_vectors = user_profiles(models, seen, external)
+        neighbours = dense = None
+    else:
+        neighbours = neighbour_matrix(models) if models.neighbours is not None or models.delta is not None else None
+        dense = models.similarity if neighbours is None else None
+
+    svd = models.svd
+    if svd is not None:
+        from scipy.sparse import csr_matrix
+        sorted_ids, factor_order, item_rows, item_pos = svd_lookups(models)
+        known_items = np.flatnonzero(item_rows >= 0)
+        item_factors = np.asarray(svd['item_factors'], dtype=np.float32)
+        item_bias = np.asarray(svd['item_bias'], dtype=np.float32)
+        factor_rows = _positions(sorted_ids, factor_order, user_ids.astype(str))
+        # Sparse model row -> SVD item map, so fold-in never materialises n_rows x factors.
+        rows_with_factors = np.flatnonzero(item_pos >= 0)
+        row_to_item = csr_matrix(
+            (np.ones(len(rows_with_factors), dtype=np.float32), (rows_with_factors, item_pos[rows_with_factors])),
+            shape=(n_rows, len(item_factors)),
+        )
+
+    results = {}
+    chunk_size = block_rows_for(n_rows, max_block_mb / LIVE_SCORE_BLOCKS)
+    for start in range(0, len(user_ids), chunk_size):
+        stop = min(start + chunk_size, len(user_ids))
+        chunk_seen = seen[start:stop]
+        has_content = np.diff(chunk_seen.indptr) > 0
+        chunk_external = {p - start: external[p] for p in range(start, stop) if p in external}
+        has_content[list(chunk_external)] = True
+
+        if embeddings is not None:
+            content = np.zeros((stop - start, n_rows), dtype=np.float32)
+            content[:, :len(embeddings)] = embeddings.dot_many(profiles[start:stop])
+            if len(extra_rows):
+                content[:, extra_rows] = profiles[start:stop] @ extra_vectors.T
+            content_mask = has_content[:, None] & covered[None, :]
+        elif neighbours is not None or dense is not None:
+            if neighbours is not None:
+                content = (chunk_seen @ neighbours).toarray()
+            else:
+                content = np.asarray(chunk_seen @ dense, dtype=np.float32)
+            for offset, vectors in chunk_external.items():
+                rows, scores = external_term_scores(models, vectors)
+                content[offset, rows] += scores
+            if neighbours is not None:
+                content_mask = content > 0
+            else:
+                content_mask = np.repeat(has_content[:, None], n_rows, axis=1)
+        else:
+            content = np.zeros((stop - start, n_rows), dtype=np.float32)
+            content_mask = np.zeros_like(content, dtype=bool)
+        total = (1.0 - cf_weight) * _normalise_rows(content, content_mask)
+
+        if svd is not None:
+            chunk_rows = factor_rows[start:stop]
+            vectors = np.zeros((stop - start, item_factors.shape[1]), dtype=np.float32)
+            own = chunk_rows >= 0
+            vectors[own] = np.asarray(svd['user_factors'], dtype=np.float32)[chunk_rows[own]]
+            # Fold-in: weighted mean of the item factors of each user's interactions.
+            weighted = interacted[start:stop] @ row_to_item
+            weight_sums = np.asarray(weighted.sum(axis=1)).ravel()
+            folded = ~own & (weight_sums > 0)
+            if folded.any():
+                vectors[folded] = (weighted[folded] @ item_factors) / weight_sums[folded, None]
+            with_cf = own | folded
+            collaborative = np.zeros_like(content)
+            collaborative[:, item_rows[known_items]] = (vectors @ item_factors[known_items].T) + item_bias[known_items]
+            cf_mask = np.zeros_like(content_mask)
+            cf_mask[np.ix_(with_cf, item_rows[known_items])] = True
+            total += cf_weight * _normalise_rows(collaborative, cf_mask)
+
+        # Never recommend what the user already saved or bought, nor past, sold-out or cancelled events.
+        total[chunk_seen.nonzero()] = 0
+        total[:, ~eligible] = 0
+        for offset, rows in enumerate(_top_n(total, n)):
+            user_id = int(user_ids[start + offset])
+            # None: nothing eligible was scored, so the caller falls back as the per-user path does
+            results[user_id] = list(dict.fromkeys(int(eid) for eid in models.ids_for(rows))) if len(rows) else None
+    return results
+
+
+def precompute_recommendations(models, user_ids=None, n=DEFAULT_RECOMMENDATIONS, cf_weight=DEFAULT_CF_WEIGHT,
+                               max_block_mb=DEFAULT_BATCH_MB, engine=DEFAULT_ENGINE):
+    """
+    Score user_ids (default: every user with a ticket or saved event) and write
+    the results into the per-user recommendation cache, with the popularity
+    fallback for users with nothing eligible to recommend. Returns {user_id: event_ids}.
+    """
+    from .cache import set_many_cached_recommendations
+
+    interactions = load_interactions(user_ids)
+    external_saves = load_external_saves(user_ids)
+    if user_ids is None:
+        user_ids = np.union1d(interactions[0], np.fromiter(external_saves, dtype=np.int64, count=len(external_saves)))
+    results = recommend_for_users(models, user_ids, interactions, n=n, cf_weight=cf_weight,
+                                  max_block_mb=max_block_mb, engine=engine, external_saves=external_saves)
+    if any(event_ids is None for event_ids in results.values()):
+        popular = popular_event_ids(n)
+        results = {user_id: popular if event_ids is None else event_ids for user_id, event_ids in results.items()}
+    set_many_cached_recommendations(models.version, results)
+    return results
@@ -0,0 +1,279 @@
+import os
+import platform
+from functools import partial
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .ann import build_ivf, default_n_lists
+from .artifacts import ArtifactWriter, load_artifact
+from .embeddings import DEFAULT_EMBEDDING_DIM, normalise_rows
+from .engine import DEFAULT_RECOMMENDATIONS, content_scores, rank
+from .neighbours import DEFAULT_NEIGHBOURS
+
+# --- Recommender benchmark ---
+# Generates synthetic catalogues, writes an artifact per engine, and measures the
+# serving path (content scores + ranking + id mapping) for users with varying
+# numbers of saved events. Each case runs in a fresh spawned process so peak RSS
+# and load time are those of a cold worker. Only NumPy/SciPy are needed: no
+# database, cache or network.
+#
+# Engines are registered in ENGINES as (prepare, query, max_events); prepare
+# writes an artifact for a catalogue and query scores one user against it. An
+# engine that leaves a float64 reference_embeddings.npy next to its artifact also
+# gets recall@10 against exact float64 scoring, so quantisation and approximate
+# search can be judged on quality as well as speed.
+
+DEFAULT_SIZES = (10_000, 100_000)
+DEFAULT_SAVED_COUNTS = (1, 5, 20, 100)
+TOPICS = 40
+WORDS_PER_TOPIC = 60
+REFERENCE_FILENAME = 'reference_embeddings.npy'
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1M' -> 1000000."""
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def synthetic_event_ids(n, rng):
+    """Non-contiguous, shuffled ids, like a table with deletions."""
+    return rng.permutation(np.arange(1, 2 * n + 1, 2, dtype=np.int64))
+
+
+def synthetic_documents(event_ids, rng, topics=None):
+    """(event_id, text) pairs drawn from a few topics (random unless given), so TF-IDF neighbours are meaningful."""
+    vocabulary = [[f't{t}w{w}' for w in range(WORDS_PER_TOPIC)] for t in range(TOPICS)]
+    if topics is None:
+        topics = rng.integers(0, TOPICS, size=len(event_ids))
+    for event_id, topic in zip(event_ids, topics):
+        words = rng.choice(vocabulary[topic], size=12)
+        yield int(event_id), ' '.join(words)
+
+
+def synthetic_neighbours(n, k, rng, block=100_000):
+    """Random top-k neighbour lists with decreasing scores (no self loops)."""
+    k = min(k, n - 1)
+    indptr = np.arange(0, (n + 1) * k, k, dtype=np.int64)
+    indices = np.empty(n * k, dtype=np.int32)
+    scores = np.empty(n * k, dtype=np.float32)
+    for start in range(0, n, block):
+        rows = np.arange(start, min(start + block, n))
+        neighbours = (rows[:, None] + rng.integers(1, n, size=(len(rows), k))) % n
+        indices[start * k:(start + len(rows)) * k] = neighbours.ravel()
+        scores[start * k:(start + len(rows)) * k] = -np.sort(-rng.random((len(rows), k), dtype=np.float32), axis=1).ravel()
+    return indptr, indices, scores
+
+
+def synthetic_embeddings(n, dim, rng, block=100_000):
+    """Clustered unit vectors (topic centroid + noise), float64."""
+    centroids = rng.standard_normal((TOPICS, dim))
+    embeddings = np.empty((n, dim))
+    for start in range(0, n, block):
+        size = min(block, n - start)
+        embeddings[start:start + size] = (centroids[rng.integers(0, TOPICS, size=size)]
+                                          + 0.8 * rng.standard_normal((size, dim)))
+    return normalise_rows(embeddings)
+
+
+# --- Engines ---
+
+def prepare_neighbours(path, n, k, rng, train=False, **options):
+    if train:
+        from .builder import build_artifact
+        return build_artifact(synthetic_documents(synthetic_event_ids(n, rng), rng), path, k=k)
+    writer = ArtifactWriter(path)
+    writer.set('source', 'benchmark')
+    writer.add_event_ids(synthetic_event_ids(n, rng))
+    writer.add_neighbours(*synthetic_neighbours(n, k, rng), k=k)
+    return writer.close()
+
+
+def prepare_dense(path, n, k, rng, block=2048, **options):
+    writer = ArtifactWriter(path)
+    writer.set('source', 'benchmark')
+    writer.add_event_ids(synthetic_event_ids(n, rng))
+    similarity = writer.create_array('similarity', (n, n), np.float32)
+    for start in range(0, n, block):
+        similarity[start:start + block] = rng.random((min(block, n - start), n), dtype=np.float32)
+    similarity.flush()
+    del similarity
+    return writer.close()
+
+
+def prepare_embeddings(path, n, k, rng, dtype='float32', embedding_dim=DEFAULT_EMBEDDING_DIM, ann=False, **options):
+    reference = synthetic_embeddings(n, embedding_dim, rng)
+    writer = ArtifactWriter(path)
+    writer.set('source', 'benchmark')
+    writer.add_event_ids(synthetic_event_ids(n, rng))
+    stored = writer.add_embeddings(reference, dtype)
+    if ann:
+        writer.add_ivf(*build_ivf(stored, default_n_lists(n)))
+    manifest = writer.close()
+    np.save(os.path.join(path, REFERENCE_FILENAME), reference)
+    return manifest
+
+
+def query_content(models, saved_rows, engine='neighbours', **options):
+    candidates, scores = content_scores(models, saved_rows, engine, **options)
+    top, _ = rank(candidates, scores, exclude=saved_rows)
+    return models.ids_for(top)
+
+
+ENGINES = {
+    # name: (prepare, query, largest catalogue it is run for by default)
+    'dense': (prepare_dense, query_content, 20_000),
+    'neighbours': (prepare_neighbours, query_content, None),
+    'embeddings-float32': (partial(prepare_embeddings, dtype='float32'), partial(query_content, engine='embeddings'), None),
+    'embeddings-float16': (partial(prepare_embeddings, dtype='float16'), partial(query_content, engine='embeddings'), None),
+    'embeddings-int8': (partial(prepare_embeddings, dtype='int8'), partial(query_content, engine='embeddings'), None),
+    # IVF with sqrt(N) lists; nprobe is the recall/latency trade-off
+    'ann-int8': (partial(prepare_embeddings, dtype='int8', ann=True), partial(query_content, engine='ann', nprobe=8), None),
+    'ann-int8-nprobe32': (partial(prepare_embeddings, dtype='int8', ann=True),
+                          partial(query_content, engine='ann', nprobe=32), None),
+}
+
+
+def exact_top_ids(models, reference, saved_rows, n=DEFAULT_RECOMMENDATIONS):
+    """Top-n event ids by exact float64 cosine similarity to the user's profile."""
+    profile = normalise_rows(reference[saved_rows].sum(axis=0, keepdims=True))[0]
+    scores = reference @ profile
+    scores[saved_rows] = -np.inf
+    top = np.argpartition(-scores, n - 1)[:n]
+    return models.ids_for(top[np.argsort(-scores[top])])
+
+
+# --- Running ---
+
+def proc_status_mb(field):
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    # VmHWM is reset by exec, unlike ru_maxrss which a spawned child inherits from its parent on Linux
+    peak = proc_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def run_case(engine, path, n_events, saved_counts, queries, seed):
+    """Runs in a fresh process: load the artifact, then time queries per saved-events bucket."""
+    _, query, _ = ENGINES[engine]
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    models = load_artifact(path)
+    load_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed)
+    first = time.perf_counter()
+    query(models, rng.integers(0, n_events, size=1))
+    first_query_ms = (time.perf_counter() - first) * 1000
+
+    buckets, answers = {}, {}
+    for count in saved_counts:
+        timings = []
+        answers[count] = []
+        for _ in range(queries):
+            saved = rng.choice(n_events, size=min(count, n_events), replace=False)
+            started = time.perf_counter()
+            result = query(models, saved)
+            timings.append(time.perf_counter() - started)
+            answers[count].append((saved, result))
+        buckets[str(count)] = {
+            'p50_ms': percentile_ms(timings, 50),
+            'p99_ms': percentile_ms(timings, 99),
+            'mean_ms': round(float(np.mean(timings)) * 1000, 3),
+        }
+    report = {
+        'load_seconds': round(load_seconds, 4),
+        'first_query_ms': round(first_query_ms, 3),
+        'rss_before_load_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        # Memory-mapped artifact pages show up as file RSS: shared between workers through the page cache
+        'rss_anon_mb': proc_status_mb('RssAnon'),
+        'rss_file_mb': proc_status_mb('RssFile'),
+        'latency_by_saved_events': buckets,
+    }
+
+    # Quality, measured after the memory readings so the float64 reference does not inflate them
+    reference_path = os.path.join(path, REFERENCE_FILENAME)
+    if os.path.exists(reference_path):
+        reference = np.load(reference_path, mmap_mode='r')
+        for count, pairs in answers.items():
+            recalls = []
+            for saved, result in pairs:
+                expected = exact_top_ids(models, reference, saved)
+                recalls.append(len(np.intersect1d(result, expected)) / len(expected))
+            buckets[str(count)]['recall_at_10'] = round(float(np.mean(recalls)), 4)
+    return report
+
+
+def directory_mb(path):
+    total = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path)
+                for f in files if f != REFERENCE_FILENAME)
+    return round(total / (1024 * 1024), 1)
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, engines=None, saved_counts=DEFAULT_SAVED_COUNTS, queries=200,
+                  k=DEFAULT_NEIGHBOURS, seed=0, train=False, workdir=None, force=False, log=print,
+                  embedding_dim=DEFAULT_EMBEDDING_DIM):
+    """Run every (size, engine) case and return the results as a JSON-serialisable dict."""
+    import multiprocessing
+
+    engines = list(engines or ENGINES)
+    context = multiprocessing.get_context('spawn')
+    root = workdir or tempfile.mkdtemp(prefix='recommender-bench-')
+    results = []
+    try:
+        for n_events in sizes:
+            for engine in engines:
+                prepare, _, max_events = ENGINES[engine]
+                case = {'engine': engine, 'n_events': n_events, 'k': k, 'train': train}
+                if max_events is not None and n_events > max_events and not force:
+                    case['skipped'] = f'catalogue larger than {max_events} events for this engine (use --force)'
+                    results.append(case)
+                    continue
+                path = os.path.join(root, f'{engine}-{n_events}')
+                log(f'{engine}: building {n_events} events...')
+                started = time.perf_counter()
+                prepare(path, n_events, k, np.random.default_rng(seed), train=train, embedding_dim=embedding_dim)
+                case['build_seconds'] = round(time.perf_counter() - started, 2)
+                case['artifact_mb'] = directory_mb(path)
+                with context.Pool(1) as pool:
+                    case.update(pool.apply(run_case, (engine, path, n_events, saved_counts, queries, seed)))
+                results.append(case)
+                shutil.rmtree(path, ignore_errors=True)
+    finally:
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'machine': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'queries_per_bucket': queries,
+        'seed': seed,
+        'results': results,
+    }
@@ -0,0 +1,82 @@
+import numpy as np
+
+from .ann import build_ivf
+from .artifacts import ArtifactWriter
+from .embeddings import fit_embeddings
+from .neighbours import DEFAULT_NEIGHBOURS, block_rows_for, build_neighbour_index, iter_sparse_blocks
+
+DEFAULT_MAX_FEATURES = 50000
+
+
+def event_document(title, description, category):
+    """The text an event is represented by in the content model."""
+    return ' '.join(part for part in (title, description, category) if part)
+
+
+def make_vectorizer(max_features=DEFAULT_MAX_FEATURES):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(stop_words='english', max_features=max_features, sublinear_tf=True, dtype=np.float32)
+
+
+def fit_documents(documents, max_features=DEFAULT_MAX_FEATURES):
+    """
+    Fit TF-IDF over an iterable of (event_id, text) in a single streaming pass.
+    Only the sparse term matrix is kept in memory, never the raw texts.
+    Returns (event_ids, vectorizer, tfidf_matrix).
+    """
+    event_ids = []
+
+    def texts():
+        for event_id, text in documents:
+            event_ids.append(event_id)
+            yield text
+
+    vectorizer = make_vectorizer(max_features)
+    matrix = vectorizer.fit_transform(texts()).tocsr()
+    return np.asarray(event_ids, dtype=np.int64), vectorizer, matrix
+
+
+def build_artifact(documents, path, version=None, k=DEFAULT_NEIGHBOURS, max_features=DEFAULT_MAX_FEATURES,
+                   max_block_mb=256, dense=False, previous=None, svd=None, embedding_dim=0,
+                   embedding_dtype='int8', ann_lists=0):
+    """
+    Train the content model from (event_id, text) pairs and write a complete
+    artifact to path. Similarities are computed one row block at a time, so peak
+    memory is bounded by max_block_mb rather than by N^2. With embedding_dim,
+    LSA embeddings of that size are also stored, quantised to embedding_dtype,
+    and with ann_lists an IVF index with that many lists is built over them.
+    """
+    event_ids, vectorizer, matrix = fit_documents(documents, max_features)
+    n_events = len(event_ids)
+
+    writer = ArtifactWriter(path, version=version)
+    writer.set('source', 'build_recommender')
+    writer.add_event_ids(event_ids)
+    writer.add_vectorizer(vectorizer)
+    writer.add_postings(matrix)
+    if embedding_dim and n_events > 1:
+        embeddings, components = fit_embeddings(matrix, embedding_dim)
+        stored = writer.add_embeddings(embeddings, embedding_dtype, components)
+        if ann_lists:
+            # Clustered from the stored (quantised) rows, which are what queries are scored against
+            writer.add_ivf(*build_ivf(stored, ann_lists))
+
+    similarity = writer.create_array('similarity', (n_events, n_events), np.float32) if dense and n_events else None
+
+    def blocks():
+        for row_offset, block in iter_sparse_blocks(matrix, block_rows_for(n_events, max_block_mb)):
+            if similarity is not None:
+                similarity[row_offset:row_offset + len(block)] = block
+            yield row_offset, block
+
+    indptr, indices, scores = build_neighbour_index(blocks(), k=k)
+    writer.add_neighbours(indptr, indices, scores, k=k)
+    if similarity is not None:
+        similarity.flush()
+        del similarity
+    if svd is not None:
+        writer.add_svd(**svd)
+    else:
+        # No fresh collaborative factors: keep the current ones across content rebuilds.
+        writer.copy_svd(previous)
+    return writer.close()
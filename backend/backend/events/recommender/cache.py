@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Ranked event ids per user, stored in the Django cache. The cache alias is
+# configured in settings.CACHES (TTL via TIMEOUT, LRU eviction via MAX_ENTRIES).
+# Entries record the model version they were computed with, so publishing a new
+# artifact invalidates every user at once without touching the cache.
+
+RECOMMENDATIONS_CACHE = 'recommendations'
+
+
+def _cache():
+    alias = RECOMMENDATIONS_CACHE if RECOMMENDATIONS_CACHE in settings.CACHES else 'default'
+    return caches[alias]
+
+
+def is_process_local():
+    """True when the recommendation cache is only visible to the current process (local memory or none)."""
+    return isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+# Why precomputing needs a shared backend, for the batch job and its admin endpoint
+PROCESS_LOCAL_MESSAGE = (
+    f"The '{RECOMMENDATIONS_CACHE}' cache is local to each process, so precomputed recommendations "
+    "would not reach the web workers; point CACHES['recommendations'] at a shared backend (e.g. Redis)."
+)
+
+
+def cache_key(user_id):
+    return f'recommendations:user:{user_id}'
+
+
+def get_cached_recommendations(user_id, version):
+    entry = _cache().get(cache_key(user_id))
+    if not entry or entry.get('version') != version:
+        return None
+    return entry['event_ids']
+
+
+def set_cached_recommendations(user_id, version, event_ids):
+    _cache().set(cache_key(user_id), {'version': version, 'event_ids': [int(e) for e in event_ids]})
+
+
+def set_many_cached_recommendations(version, recommendations):
+    """Store {user_id: event_ids} in one round trip, e.g. from the batch precompute job."""
+    _cache().set_many({
+        cache_key(user_id): {'version': version, 'event_ids': [int(e) for e in event_ids]}
+        for user_id, event_ids in recommendations.items()
+    })
+
+
+def invalidate_user_recommendations(user_id):
+    """Call whenever a user's SavedEvent or Ticket rows change."""
+    _cache().delete(cache_key(user_id))
+
+
+# --- Similar events ---
+# The "more like this" list of each event, keyed the same way: one entry per
+# event, tagged with the model version it was ranked with.
+
+def similar_cache_key(event_id):
+    return f'recommendations:similar:{event_id}'
+
+
+def get_cached_similar_events(event_id, version):
+    entry = _cache().get(similar_cache_key(event_id))
+    if not entry or entry.get('version') != version:
+        return None
+    return entry['event_ids']
+
+
+def set_cached_similar_events(event_id, version, event_ids):
+    _cache().set(similar_cache_key(event_id), {'version': version, 'event_ids': [int(e) for e in event_ids]})
+
+
+def invalidate_similar_events(event_id):
+    """Call when an event's own content changes (its neighbours are recomputed)."""
+    _cache().delete(similar_cache_key(event_id))
+
+
+# --- External event vectors ---
+# TF-IDF vectors of saved Ticketmaster/Skiddle events, per external id. They only
+# depend on the vectorizer, so they are tagged with the model version as well.
+
+def external_cache_key(external_id):
+    return f'recommendations:external:{external_id}'
+
+
+def get_many_cached_external_vectors(version, external_ids):
+    """{external id: [term columns, weights]} for the ids cached for this version."""
+    keys = {external_cache_key(external_id): external_id for external_id in external_ids}
+    entries = _cache().get_many(list(keys))
+    return {
+        keys[key]: entry['vector'] for key, entry in entries.items()
+        if entry and entry.get('version') == version
+    }
+
+
+def set_many_cached_external_vectors(version, vectors):
+    _cache().set_many({
+        external_cache_key(external_id): {'version': version, 'vector': vector}
+        for external_id, vector in vectors.items()
+    })
@@ -0,0 +1,135 @@
+import numpy as np
+
+from .neighbours import merge_scored
+
+# --- Collaborative filtering ---
+# Scores come from the SVD factors stored in the artifact: a user known to the
+# factor model uses their own factor row; anyone else is folded in as the
+# weighted mean of the item factors of the events they bought or saved. Either
+# way one matrix-vector product scores every item, with no per-event Python loop.
+
+TICKET_WEIGHT = 1.0
+SAVED_WEIGHT = 0.5
+DEFAULT_CF_WEIGHT = 0.3
+
+
+def _svd_lookups(models):
+    svd = models.svd
+    user_ids = np.asarray(svd['user_ids'])
+    user_order = np.argsort(user_ids, kind='stable')
+    item_rows = models.id_map.indices_for(svd['item_ids'])
+    # Inverse of item_rows: SVD item position of every model row, -1 if it has no factors
+    item_pos = np.full(models.n_events, -1, dtype=np.int64)
+    known = item_rows >= 0
+    item_pos[item_rows[known]] = np.flatnonzero(known)
+    return user_ids[user_order], user_order, item_rows, item_pos
+
+
+def svd_lookups(models):
+    """
+    (sorted user ids, their factor rows, model row of every SVD item, SVD item of
+    every model row) — built once per loaded version.
+    """
+    return models.memo('svd_lookups', lambda: _svd_lookups(models))
+
+
+def user_factor_row(models, user_key):
+    sorted_ids, order, _, _ = svd_lookups(models)
+    user_key = str(user_key)
+    pos = int(np.searchsorted(sorted_ids, user_key))
+    if pos < len(sorted_ids) and sorted_ids[pos] == user_key:
+        return int(order[pos])
+    return None
+
+
+def fold_in(models, interaction_rows, interaction_weights):
+    """Project an interaction row (model rows, weights) into the factor space."""
+    _, _, _, item_pos = svd_lookups(models)
+    if not len(interaction_rows):
+        return None
+    interaction_rows = np.asarray(interaction_rows, dtype=np.int64)
+    in_base = interaction_rows < models.n_events
+    positions = item_pos[interaction_rows[in_base]]
+    weights = np.asarray(interaction_weights, dtype=np.float32)[in_base]
+    hit = positions >= 0
+    if not hit.any():
+        return None
+    factors = np.asarray(models.svd['item_factors'][positions[hit]], dtype=np.float32)
+    return weights[hit] @ factors / weights[hit].sum()
+
+
+def collaborative_scores(models, user_key, interaction_rows, interaction_weights):
+    """
+    Returns (model rows, scores) for every SVD item that maps into the model, or
+    None when the artifact has no factors or the user has nothing to fold in.
+    """
+    svd = models.svd
+    if svd is None:
+        return None
+    row = user_factor_row(models, user_key)
+    if row is not None:
+        user_vector = np.asarray(svd['user_factors'][row], dtype=np.float32)
+    else:
+        user_vector = fold_in(models, interaction_rows, interaction_weights)
+    if user_vector is None:
+        return None
+    _, _, item_rows, _ = svd_lookups(models)
+    scores = np.asarray(svd['item_factors'], dtype=np.float32) @ user_vector + svd['item_bias']
+    known = item_rows >= 0
+    return item_rows[known], scores[known].astype(np.float32)
+
+
+def _normalise(scores):
+    if not len(scores):
+        return scores
+    low, high = float(scores.min()), float(scores.max())
+    if high <= low:
+        return np.ones_like(scores) if high > 0 else np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+def blend(content, collaborative, cf_weight=DEFAULT_CF_WEIGHT):
+    """
+    Mix content and collaborative (rows, scores) pairs after min-max scaling each
+    to [0, 1]. A missing side simply contributes nothing.
+    """
+    parts = []
+    if content is not None and len(content[0]):
+        parts.append((content[0], (1.0 - cf_weight) * _normalise(content[1])))
+    if collaborative is not None and len(collaborative[0]):
+        parts.append((collaborative[0], cf_weight * _normalise(collaborative[1])))
+    if not parts:
+        return merge_scored([], [])
+    return merge_scored(np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]))
+
+
+def fit_interaction_factors(user_ids, event_ids, weights, n_factors=32):
+    """
+    Factorise the implicit user x event interaction matrix with a truncated SVD.
+    Returns kwargs for ArtifactWriter.add_svd, or None if there is too little data.
+    """
+    from scipy.sparse import csr_matrix
+    from sklearn.decomposition import TruncatedSVD
+
+    user_ids = np.asarray(user_ids)
+    event_ids = np.asarray(event_ids, dtype=np.int64)
+    unique_users, user_pos = np.unique(user_ids, return_inverse=True)
+    unique_items, item_pos = np.unique(event_ids, return_inverse=True)
+    n_components = min(n_factors, len(unique_users) - 1, len(unique_items) - 1)
+    if n_components < 1:
+        return None
+    matrix = csr_matrix(
+        (np.asarray(weights, dtype=np.float32), (user_pos, item_pos)),
+        shape=(len(unique_users), len(unique_items)),
+    )
+    svd = TruncatedSVD(n_components=n_components, random_state=0)
+    user_factors = svd.fit_transform(matrix)
+    return {
+        'user_ids': unique_users,
+        'item_ids': unique_items,
+        'user_factors': user_factors,
+        'item_factors': svd.components_.T,
+        'user_bias': np.zeros(len(unique_users)),
+        'item_bias': np.zeros(len(unique_items)),
+        'global_mean': 0.0,
+    }
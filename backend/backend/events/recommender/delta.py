@@ -0,0 +1,333 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+# --- Incremental (delta) segment ---
+# Events created or edited after a build are appended to <artifact>/delta.jsonl,
+# one JSON line per change, holding the event's TF-IDF terms and its top-K
+# neighbours against the base artifact (and earlier delta events). Every worker
+# tails the same file, so a new event is recommendable as soon as its line is
+# written, without an O(N^2) rebuild.
+#
+# New events get virtual row indices n_base, n_base + 1, ... in file order, which
+# is identical in every process. Each delta row also adds reverse edges, so users
+# whose saved events are neighbours of the new event see it too.
+#
+# Deleted events are recorded as {"op": "delete"} lines: their row keeps its index
+# but loses its neighbours, reverse edges and vector, and is listed in `removed`.
+#
+# Entries also keep the event's text. Changes made while build_recommender runs
+# may be missing from the database snapshot it trained on, so publishing copies
+# the previous version's entries from after the snapshot into the new version
+# (carry_delta()), and a worker still serving the previous version writes its
+# changes to the current one too. Such entries only hold the text ("pending"):
+# every process vectorises them against its own version when applying them.
+
+logger = logging.getLogger(__name__)
+
+DELTA_FILENAME = 'delta.jsonl'
+
+
+class DeltaSegment:
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.path = os.path.join(artifact.path, DELTA_FILENAME)
+        self.n_base = artifact.n_events
+        self.extra_ids = []        # event id of virtual row n_base + j
+        self._extra_index = {}     # event id -> virtual row
+        self.rows = {}             # row -> (neighbour rows, scores), overriding the base index
+        self.reverse = {}          # row -> {neighbour row: score} added by delta events
+        self._edges_of = {}        # delta row -> rows it added reverse edges to
+        self.vectors = {}          # virtual row -> (term columns, weights)
+        self._extra_matrix = None
+        self._extra_embeddings = None
+        self.removed = set()       # rows of deleted events
+        self.changes = 0           # lines applied so far, for caches derived from the segment
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    # --- Reading ---
+
+    def refresh(self):
+        """Apply any lines appended since the last call. Cheap when nothing changed (one stat)."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if size <= self._offset:
+            return
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+            # Only consume complete lines; a concurrent append may still be in flight.
+            end = data.rfind(b'\n') + 1
+            for line in data[:end].splitlines():
+                if line.strip():
+                    entry = _parse(line)
+                    if entry is not None:
+                        self.apply(entry)
+            self._offset += end
+
+    def index_of(self, event_id):
+        idx = self.artifact.id_map.index_of(event_id)
+        if idx is None:
+            idx = self._extra_index.get(int(event_id))
+        return idx
+
+    def apply(self, entry):
+        self.changes += 1
+        event_id = int(entry['event_id'])
+        if entry.get('op') == 'delete':
+            idx = self.index_of(event_id)
+            if idx is not None:
+                self.remove(idx)
+            return
+        if 'terms' not in entry:
+            # Pending entry from another version: vectorise it against this one
+            entry = self.build_entry(event_id, entry.get('text') or '')
+        idx = self.index_of(event_id)
+        if idx is None:
+            idx = self.n_base + len(self.extra_ids)
+            self.extra_ids.append(event_id)
+            self._extra_index[event_id] = idx
+        if idx >= self.n_base:
+            terms = entry.get('terms') or []
+            self.vectors[idx] = (
+                np.asarray([t[0] for t in terms], dtype=np.int64),
+                np.asarray([t[1] for t in terms], dtype=np.float32),
+            )
+            self._extra_matrix = None
+            self._extra_embeddings = None
+
+        pairs = [(self.index_of(nid), score) for nid, score in entry.get('neighbours', [])]
+        pairs = [(n, s) for n, s in pairs if n is not None and n != idx]
+        self.rows[idx] = (
+            np.asarray([n for n, _ in pairs], dtype=np.int64),
+            np.asarray([s for _, s in pairs], dtype=np.float32),
+        )
+        # Replace the reverse edges from any earlier version of this event.
+        for neighbour in self._edges_of.pop(idx, ()):
+            self.reverse.get(neighbour, {}).pop(idx, None)
+        for neighbour, score in pairs:
+            self.reverse.setdefault(neighbour, {})[idx] = score
+        self._edges_of[idx] = [n for n, _ in pairs]
+        self.removed.discard(idx)
+
+    def remove(self, idx):
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        self.rows[idx] = empty
+        for neighbour in self._edges_of.pop(idx, ()):
+            self.reverse.get(neighbour, {}).pop(idx, None)
+        if self.vectors.pop(idx, None) is not None:
+            self._extra_matrix = None
+            self._extra_embeddings = None
+        self.removed.add(idx)
+
+    def ids_for(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        extra = np.asarray(self.extra_ids, dtype=np.int64)
+        base = indices < self.n_base
+        ids = np.empty(len(indices), dtype=np.int64)
+        ids[base] = self.artifact.id_map.ids_for(indices[base])
+        ids[~base] = extra[indices[~base] - self.n_base]
+        return ids
+
+    def extra_scores(self, cols, weights):
+        """Cosine scores of a query vector against the delta-only events."""
+        if not self.vectors:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self._extra_matrix is None:
+            from scipy.sparse import csr_matrix
+            vectors = list(self.vectors.values())
+            indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+            np.cumsum([len(v[0]) for v in vectors], out=indptr[1:])
+            self._extra_matrix = (
+                np.fromiter(self.vectors.keys(), dtype=np.int64, count=len(vectors)),
+                csr_matrix(
+                    (np.concatenate([v[1] for v in vectors]), np.concatenate([v[0] for v in vectors]), indptr),
+                    shape=(len(vectors), self.artifact.n_terms),
+                ),
+            )
+        rows, matrix = self._extra_matrix
+        query = np.zeros(self.artifact.n_terms, dtype=np.float32)
+        query[cols] = weights
+        return rows, np.asarray(matrix @ query, dtype=np.float32)
+
+    def extra_embeddings(self, embeddings):
+        """(virtual rows, float32 embeddings) of the delta-only events, projected from their TF-IDF terms."""
+        if self._extra_embeddings is None:
+            rows, vectors = [], []
+            for row, (cols, weights) in self.vectors.items():
+                vector = embeddings.project(cols, weights)
+                if vector is not None:
+                    rows.append(row)
+                    vectors.append(vector)
+            self._extra_embeddings = (
+                np.asarray(rows, dtype=np.int64),
+                np.vstack(vectors).astype(np.float32) if vectors else np.empty((0, embeddings.dim), dtype=np.float32),
+            )
+        return self._extra_embeddings
+
+    # --- Writing ---
+
+    def build_entry(self, event_id, text, k=None):
+        """Vectorise one event and compute its neighbour row against the current model."""
+        artifact = self.artifact
+        k = k or artifact.manifest.get('neighbours', {}).get('k', 50)
+        query = artifact.vectorizer.transform([text]).tocsr()
+        cols, weights = query.indices.astype(np.int64), query.data.astype(np.float32)
+
+        base_scores = artifact.term_scores(cols, weights)
+        extra_rows, extra_scores = self.extra_scores(cols, weights)
+        rows = np.concatenate([np.arange(len(base_scores), dtype=np.int64), extra_rows])
+        scores = np.concatenate([base_scores, extra_scores])
+
+        own = self.index_of(event_id)
+        keep = scores > 0
+        if own is not None:
+            keep &= rows != own
+        rows, scores = rows[keep], scores[keep]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        neighbour_ids = self.ids_for(rows[order])
+        return {
+            'op': 'upsert',
+            'event_id': int(event_id),
+            'at': datetime.now(timezone.utc).isoformat(),
+            'text': text,
+            'terms': [[int(c), round(float(w), 6)] for c, w in zip(cols, weights)],
+            'neighbours': [[int(i), round(float(s), 6)] for i, s in zip(neighbour_ids, scores[order])],
+        }
+
+    def delete_entry(self, event_id):
+        return {
+            'op': 'delete',
+            'event_id': int(event_id),
+            'at': datetime.now(timezone.utc).isoformat(),
+        }
+
+    def append(self, entry):
+        append_entries(self.path, [entry])
+        self.refresh()
+
+
+def _parse(line):
+    """A delta line as an entry, or None (logged) for a corrupt one, which is skipped rather than failing every reader."""
+    try:
+        entry = json.loads(line)
+        int(entry['event_id'])
+        datetime.fromisoformat(entry['at'])
+        return entry
+    except (ValueError, KeyError, TypeError):
+        logger.warning('Skipping corrupt recommender delta line: %.200r', line)
+        return None
+
+
+def append_entries(path, entries):
+    # One write() of whole lines on an O_APPEND file: concurrent workers never interleave lines.
+    data = b''.join((json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8') for entry in entries)
+    if data:
+        with open(path, 'ab') as f:
+            f.write(data)
+
+
+def pending_entry(entry):
+    """The version-independent part of an entry (None for entries written without their text)."""
+    if entry.get('op') == 'delete':
+        return {'op': 'delete', 'event_id': entry['event_id'], 'at': entry['at']}
+    if 'text' not in entry:
+        return None
+    return {'op': 'upsert', 'event_id': entry['event_id'], 'at': entry['at'], 'text': entry['text']}
+
+
+def carry_delta(previous_path, path, since):
+    """
+    Copy the changes recorded in previous_path's delta at or after `since` (when
+    the new version's build read the database) into path's delta, as pending
+    entries. Returns the number of entries copied.
+    """
+    try:
+        with open(os.path.join(previous_path, DELTA_FILENAME), 'rb') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return 0
+    entries, skipped = [], 0
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = _parse(line)
+        if entry is None or datetime.fromisoformat(entry['at']) < since:
+            continue
+        carried = pending_entry(entry)
+        if carried is None:
+            skipped += 1
+        else:
+            entries.append(carried)
+    if skipped:
+        logger.warning('%d recommender delta change(s) from before entries kept their text were not carried over.', skipped)
+    append_entries(os.path.join(path, DELTA_FILENAME), entries)
+    return len(entries)
+
+
+def _stale_version_path(models):
+    """Directory of the current version when this process still serves an older one, else None."""
+    from .artifacts import read_current_version, versions_path
+    from .loader import get_models_path
+    models_path = get_models_path()
+    current = read_current_version(models_path)
+    if not current or current == models.version:
+        return None
+    return os.path.join(versions_path(models_path), current)
+
+
+def record_event_change(event):
+    """
+    Add a created or edited event to the live recommender. Failures are logged and
+    swallowed: the event itself is already saved and the next build will pick it up.
+    """
+    from .builder import event_document
+    from .cache import invalidate_similar_events
+    from .loader import RecommendationModelLoader
+    try:
+        invalidate_similar_events(event.id)
+        models = RecommendationModelLoader.get_models()
+        if models is None or not models.supports_delta:
+            return
+        delta = models.delta
+        entry = delta.build_entry(event.id, event_document(event.title, event.description, event.category))
+        delta.append(entry)
+        current = _stale_version_path(models)
+        if current is not None:
+            # A newer version was published and this worker hasn't switched yet
+            append_entries(os.path.join(current, DELTA_FILENAME), [pending_entry(entry)])
+    except Exception:
+        logger.exception('Could not add event %s to the recommender delta', getattr(event, 'id', None))
+
+
+def record_event_deletion(event_id):
+    """Drop a deleted event from the live recommender (neighbour lists and ANN index). Best-effort."""
+    from .loader import RecommendationModelLoader
+    try:
+        models = RecommendationModelLoader.get_models()
+        if models is None or not models.supports_delta:
+            return
+        delta = models.delta
+        entry = delta.delete_entry(event_id)
+        if delta.index_of(event_id) is not None:
+            delta.append(entry)
+        current = _stale_version_path(models)
+        if current is not None:
+            append_entries(os.path.join(current, DELTA_FILENAME), [entry])
+    except Exception:
+        logger.exception('Could not remove event %s from the recommender delta', event_id)
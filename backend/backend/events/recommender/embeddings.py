@@ -0,0 +1,107 @@
+import numpy as np
+
+# --- Quantised event embeddings ---
+# Dense, L2-normalised event vectors (LSA: a truncated SVD of the TF-IDF matrix)
+# stored as float32, float16 or int8. int8 rows carry a float32 scale each
+# (x ~= q * scale, scale = max|x| / 127), so a 128-d embedding costs 132 bytes
+# instead of 512. Scoring walks the matrix in small row blocks, widening each
+# block to float32 just before the dot product, so the working set stays in cache
+# and no full-size float copy of the matrix is ever made.
+
+EMBEDDING_DTYPES = ('float32', 'float16', 'int8')
+DEFAULT_EMBEDDING_DIM = 128
+SCORE_BLOCK_ROWS = 8192
+
+
+def quantise(matrix, dtype):
+    """Returns (values, scales); scales is None unless dtype is int8."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == 'int8':
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        values = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return values, scales.astype(np.float32)
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unsupported embedding dtype {dtype!r}; expected one of {', '.join(EMBEDDING_DTYPES)}")
+    return matrix.astype(dtype), None
+
+
+def normalise_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def fit_embeddings(tfidf_matrix, dim=DEFAULT_EMBEDDING_DIM, seed=0):
+    """
+    LSA embeddings of a sparse TF-IDF matrix. Returns (row-normalised embeddings,
+    components); components project new TF-IDF vectors into the same space.
+    """
+    from sklearn.decomposition import TruncatedSVD
+    dim = min(dim, tfidf_matrix.shape[1] - 1, max(tfidf_matrix.shape[0] - 1, 1))
+    svd = TruncatedSVD(n_components=dim, random_state=seed)
+    embeddings = svd.fit_transform(tfidf_matrix).astype(np.float32)
+    return normalise_rows(embeddings), svd.components_.astype(np.float32)
+
+
+class Embeddings:
+    """Read-only view over (possibly memory-mapped, possibly quantised) embedding rows."""
+
+    def __init__(self, values, scales=None, components=None):
+        self.values = values
+        self.scales = scales
+        self.components = components
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def dim(self):
+        return self.values.shape[1]
+
+    def rows(self, indices):
+        """Dequantised float32 rows."""
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = np.asarray(self.values[indices], dtype=np.float32)
+        if self.scales is not None:
+            rows *= np.asarray(self.scales[indices])[:, None]
+        return rows
+
+    def dot(self, query, block_rows=SCORE_BLOCK_ROWS):
+        """query . row for every row, as float32."""
+        query = np.asarray(query, dtype=np.float32)
+        scores = np.empty(len(self.values), dtype=np.float32)
+        for start in range(0, len(self.values), block_rows):
+            block = np.asarray(self.values[start:start + block_rows], dtype=np.float32)
+            np.dot(block, query, out=scores[start:start + len(block)])
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def dot_many(self, queries, block_rows=SCORE_BLOCK_ROWS):
+        """(n_queries x n_rows) scores of several float32 queries at once."""
+        queries = np.asarray(queries, dtype=np.float32)
+        scores = np.empty((len(queries), len(self.values)), dtype=np.float32)
+        for start in range(0, len(self.values), block_rows):
+            block = self.rows(np.arange(start, min(start + block_rows, len(self.values))))
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def weighted_sums(self, matrix, block_rows=SCORE_BLOCK_ROWS):
+        """matrix @ embeddings for a sparse (k x n_rows) matrix, one dequantised row block at a time."""
+        matrix = matrix.tocsc()
+        sums = np.zeros((matrix.shape[0], self.dim), dtype=np.float32)
+        for start in range(0, len(self.values), block_rows):
+            end = min(start + block_rows, len(self.values))
+            part = matrix[:, start:end]
+            if part.nnz:
+                sums += part @ self.rows(np.arange(start, end))
+        return sums
+
+    def project(self, cols, weights):
+        """Embed a sparse TF-IDF vector (term columns, weights), e.g. an event added through the delta."""
+        if self.components is None or not len(cols):
+            return None
+        vector = np.asarray(self.components[:, cols], dtype=np.float32) @ np.asarray(weights, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
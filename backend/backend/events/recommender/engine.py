@@ -0,0 +1,105 @@
+import numpy as np
+
+from .ann import DEFAULT_CANDIDATES, DEFAULT_NPROBE
+from .embeddings import normalise_rows
+from .neighbours import merge_scored
+
+DEFAULT_RECOMMENDATIONS = 10
+ENGINES = ('neighbours', 'embeddings', 'ann')
+DEFAULT_ENGINE = 'neighbours'
+
+
+def user_profile(models, saved_indices, external=()):
+    """Normalised mean embedding of the saved events (base rows, delta rows and external vectors), or None."""
+    embeddings = models.embeddings
+    saved_indices = np.asarray(saved_indices, dtype=np.int64)
+    base = saved_indices[saved_indices < models.n_events]
+    parts = [embeddings.rows(base)] if len(base) else []
+    delta = models.delta
+    if delta is not None and len(base) < len(saved_indices):
+        extra_rows, extra_vectors = delta.extra_embeddings(embeddings)
+        parts.append(extra_vectors[np.isin(extra_rows, saved_indices)])
+    if len(external):
+        from .external import external_embeddings
+        parts.append(external_embeddings(models, external))
+    if not parts or not sum(len(p) for p in parts):
+        return None
+    return normalise_rows(np.vstack(parts).sum(axis=0, keepdims=True))[0]
+
+
+def embedding_scores(models, saved_indices, external=()):
+    """Cosine similarity of every event (base and delta) to the user's profile embedding."""
+    profile = user_profile(models, saved_indices, external)
+    if profile is None:
+        return merge_scored([], [])
+    embeddings = models.embeddings
+    candidates = np.arange(len(embeddings), dtype=np.int64)
+    scores = embeddings.dot(profile)
+    delta = models.delta
+    if delta is not None and delta.vectors:
+        extra_rows, extra_vectors = delta.extra_embeddings(embeddings)
+        candidates = np.concatenate([candidates, extra_rows])
+        scores = np.concatenate([scores, extra_vectors @ profile])
+    return candidates, scores
+
+
+def ann_scores(models, saved_indices, nprobe=DEFAULT_NPROBE, candidates=DEFAULT_CANDIDATES, external=()):
+    """Like embedding_scores, but only for the best `candidates` events found in the nprobe nearest IVF lists."""
+    profile = user_profile(models, saved_indices, external)
+    if profile is None:
+        return merge_scored([], [])
+    return models.ann.search(profile, n=candidates, nprobe=nprobe)
+
+
+def content_scores(models, saved_indices, engine=DEFAULT_ENGINE, nprobe=DEFAULT_NPROBE,
+                   candidates=DEFAULT_CANDIDATES, external=()):
+    """
+    Aggregate content similarity to the user's saved events.
+    Returns (candidate_indices, scores). With a neighbour index only the K
+    neighbours of each saved event are touched; the dense matrix is a fallback
+    for artifacts converted without one. Rows added since the build (the delta
+    segment) are merged in alongside the base index. engine='embeddings' scores
+    every event against the user's mean embedding instead, when the artifact has
+    embeddings; engine='ann' searches only the nprobe nearest lists of the IVF
+    index for the best `candidates` events (falling back to exact embedding
+    scores when the artifact has no IVF index).
+
+    external holds TF-IDF vectors (term columns, weights) of saved events that
+    are not in the model (see external.py); they are scored against every event
+    by their terms, or embedded into the profile by the embedding engines.
+    """
+    if engine == 'ann' and models.ann is not None:
+        return ann_scores(models, saved_indices, nprobe, candidates, external)
+    if engine in ('embeddings', 'ann') and models.embeddings is not None:
+        return embedding_scores(models, saved_indices, external)
+    if len(external):
+        from .external import external_term_scores
+        rows, scores = external_term_scores(models, external)
+        if len(saved_indices):
+            neighbour_rows, neighbour_scores = models.merge_neighbours(saved_indices)
+            rows, scores = np.concatenate([rows, neighbour_rows]), np.concatenate([scores, neighbour_scores])
+        return merge_scored(rows, scores)
+    if models.neighbours is not None or models.delta is not None:
+        return models.merge_neighbours(saved_indices)
+    if models.similarity is not None and len(saved_indices):
+        scores = np.asarray(models.similarity[saved_indices], dtype=np.float32).sum(axis=0)
+        return np.arange(len(scores), dtype=np.int64), scores
+    return merge_scored([], [])
+
+
+def rank(candidates, scores, exclude=(), n=DEFAULT_RECOMMENDATIONS, eligible=None):
+    """
+    Best n positive-scoring candidates, excluding the given indices and, when an
+    eligibility mask over the index space is given, every row it rules out.
+    """
+    keep = (scores > 0) & ~np.isin(candidates, np.asarray(exclude, dtype=np.int64))
+    if eligible is not None:
+        keep &= eligible[candidates]
+    candidates, scores = candidates[keep], scores[keep]
+    if len(scores) > n:
+        # O(len) selection of the best n, then sort only those n
+        top = np.argpartition(-scores, n - 1)[:n]
+        candidates, scores = candidates[top], scores[top]
+    # Equal scores go to the lower row, as in the batch path
+    order = np.lexsort((candidates, -scores))
+    return candidates[order], scores[order]
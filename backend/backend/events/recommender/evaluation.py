@@ -0,0 +1,306 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .ann import DEFAULT_CANDIDATES, DEFAULT_NPROBE, default_n_lists
+from .artifacts import load_artifact
+from .benchmark import (TOPICS, directory_mb, peak_rss_mb, percentile_ms, proc_status_mb, synthetic_documents,
+                        synthetic_event_ids)
+from .builder import build_artifact
+from .collaborative import DEFAULT_CF_WEIGHT, SAVED_WEIGHT, TICKET_WEIGHT, blend, collaborative_scores, fit_interaction_factors
+from .engine import DEFAULT_RECOMMENDATIONS, ENGINES, content_scores, rank
+from .neighbours import DEFAULT_NEIGHBOURS
+
+# --- Offline evaluation ---
+# Replays history to measure what a recommender change costs in quality as well as
+# in speed. Ticket purchases and saved events are split at a point in time: each
+# configuration is trained on the event catalogue plus the interactions before the
+# split, then asked for the top k of every user with interactions on both sides.
+# Held-out events the user went on to buy or save count as hits.
+#
+# Reported per configuration: precision@k, recall@k, hit rate and catalogue
+# coverage, plus build time, artifact size, load time, per-user latency and memory.
+# Scoring follows the serving path (content scores, collaborative scores, blend,
+# rank) but without the eligibility mask, since held-out events are in the past.
+# Each configuration runs in a fresh spawned process, as in the benchmark, so
+# memory readings are those of a cold worker.
+
+DEFAULT_TEST_FRACTION = 0.2
+DEFAULT_CONFIGS = (
+    'engine=popular',
+    'engine=neighbours',
+    'engine=neighbours,k=10',
+    'engine=neighbours,cf_weight=0',
+    'engine=embeddings,dim=64,dtype=float32',
+    'engine=embeddings,dim=64,dtype=int8',
+    'engine=ann,dim=64,dtype=int8,nprobe=2',
+    'engine=ann,dim=64,dtype=int8,nprobe=8',
+)
+CONFIG_DEFAULTS = {
+    'engine': 'neighbours',
+    'k': DEFAULT_NEIGHBOURS,
+    'dim': 0,
+    'dtype': 'int8',
+    'lists': 0,
+    'nprobe': DEFAULT_NPROBE,
+    'candidates': DEFAULT_CANDIDATES,
+    'cf_weight': DEFAULT_CF_WEIGHT,
+    'factors': 32,
+}
+
+
+def parse_config(text):
+    """'engine=ann,dim=64,nprobe=4' -> a full configuration dict (unset keys take CONFIG_DEFAULTS)."""
+    config = dict(CONFIG_DEFAULTS)
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        key, _, value = part.partition('=')
+        key = key.strip()
+        if key not in CONFIG_DEFAULTS:
+            raise ValueError(f"Unknown configuration key {key!r}; expected one of {', '.join(CONFIG_DEFAULTS)}")
+        config[key] = type(CONFIG_DEFAULTS[key])(value.strip())
+    if config['engine'] not in ENGINES + ('popular',):
+        raise ValueError(f"Unknown engine {config['engine']!r}")
+    if config['engine'] in ('embeddings', 'ann') and not config['dim']:
+        config['dim'] = 64
+    config['name'] = text
+    return config
+
+
+# --- Data ---
+
+def load_timed_interactions():
+    """(user ids, event ids, weights, epoch seconds) of every internal save and ticket purchase."""
+    from saved.models import SavedEvent
+    from tickets.models import Ticket
+
+    users, events, weights, times = [], [], [], []
+    sources = (
+        (SavedEvent.objects.filter(event__isnull=False).values_list('user_id', 'event_id', 'created_at'), SAVED_WEIGHT),
+        (Ticket.objects.values_list('user_id', 'event_id', 'purchase_time'), TICKET_WEIGHT),
+    )
+    for queryset, weight in sources:
+        for user_id, event_id, when in queryset.iterator(chunk_size=5000):
+            users.append(user_id)
+            events.append(event_id)
+            weights.append(weight)
+            times.append(when.timestamp() if when else 0.0)
+    return (
+        np.asarray(users, dtype=np.int64),
+        np.asarray(events, dtype=np.int64),
+        np.asarray(weights, dtype=np.float32),
+        np.asarray(times, dtype=np.float64),
+    )
+
+
+def synthetic_dataset(n_events=5000, n_users=1000, per_user=20, seed=0):
+    """
+    A catalogue of topical events and users who mostly interact with one or two
+    favourite topics over time: (documents, (users, events, weights, times)).
+    Lets the harness run without any database.
+    """
+    rng = np.random.default_rng(seed)
+    event_ids = synthetic_event_ids(n_events, rng)
+    topics = rng.integers(0, TOPICS, size=n_events)
+    documents = list(synthetic_documents(event_ids, rng, topics))
+    by_topic = [event_ids[topics == t] for t in range(TOPICS)]
+    users, events, weights, times = [], [], [], []
+    for user_id in range(1, n_users + 1):
+        favourites = rng.choice(TOPICS, size=rng.integers(1, 3), replace=False)
+        for _ in range(per_user):
+            if rng.random() < 0.8:
+                pool = by_topic[rng.choice(favourites)]
+                event_id = pool[rng.integers(len(pool))] if len(pool) else rng.choice(event_ids)
+            else:
+                event_id = rng.choice(event_ids)
+            users.append(user_id)
+            events.append(event_id)
+            weights.append(TICKET_WEIGHT if rng.random() < 0.4 else SAVED_WEIGHT)
+            times.append(rng.random())
+    interactions = (
+        np.asarray(users, dtype=np.int64),
+        np.asarray(events, dtype=np.int64),
+        np.asarray(weights, dtype=np.float32),
+        np.asarray(times, dtype=np.float64),
+    )
+    return documents, interactions
+
+
+def time_split(interactions, test_fraction=DEFAULT_TEST_FRACTION, split_at=None):
+    """
+    Split at split_at (epoch seconds) or at the (1 - test_fraction) quantile of
+    interaction times. Returns (train interactions, {user: held-out event ids}):
+    held-out events are those a user with earlier interactions first touched
+    after the split.
+    """
+    users, events, weights, times = interactions
+    cutoff = split_at if split_at is not None else float(np.quantile(times, 1 - test_fraction)) if len(times) else 0.0
+    before = times <= cutoff
+    train = (users[before], events[before], weights[before])
+    seen = {}
+    for user_id, event_id in zip(train[0].tolist(), train[1].tolist()):
+        seen.setdefault(user_id, set()).add(event_id)
+    held_out = {}
+    for user_id, event_id in zip(users[~before].tolist(), events[~before].tolist()):
+        if user_id in seen and event_id not in seen[user_id]:
+            held_out.setdefault(user_id, set()).add(event_id)
+    return train, {user_id: sorted(event_ids) for user_id, event_ids in held_out.items()}, cutoff
+
+
+def user_histories(train, user_ids):
+    """{user: (event ids, weights)} from training interactions, keeping the larger weight of duplicates."""
+    wanted = set(user_ids)
+    histories = {}
+    for user_id, event_id, weight in zip(*(a.tolist() for a in train)):
+        if user_id in wanted:
+            events = histories.setdefault(user_id, {})
+            events[event_id] = max(weight, events.get(event_id, 0.0))
+    return {
+        user_id: (np.fromiter(events, dtype=np.int64), np.fromiter(events.values(), dtype=np.float32))
+        for user_id, events in histories.items()
+    }
+
+
+# --- Running ---
+
+def prepare_configuration(path, documents, config, train):
+    """Build the artifact of one configuration (content model + factors fitted on train only)."""
+    svd = None
+    if config['cf_weight'] > 0 and config['factors'] and len(train[0]):
+        svd = fit_interaction_factors(*train, n_factors=config['factors'])
+    lists = config['lists'] or (default_n_lists(len(documents)) if config['engine'] == 'ann' else 0)
+    return build_artifact(iter(documents), path, k=config['k'], svd=svd, embedding_dim=config['dim'],
+                          embedding_dtype=config['dtype'], ann_lists=lists)
+
+
+def recommend_rows(models, user_id, rows, weights, config, n):
+    """The serving path's scoring for one user, minus the eligibility mask."""
+    content = content_scores(models, rows, config['engine'], nprobe=config['nprobe'],
+                             candidates=config['candidates']) if len(rows) else None
+    collaborative = collaborative_scores(models, user_id, rows, weights)
+    if content is None and collaborative is None:
+        return np.empty(0, dtype=np.int64)
+    candidates, scores = blend(content, collaborative, config['cf_weight'])
+    top, _ = rank(candidates, scores, exclude=rows, n=n)
+    return top
+
+
+def _quality(recommended, held_out, k, n_events):
+    precision, recall, hits = [], [], 0
+    distinct = set()
+    for user_id, expected in held_out.items():
+        result = recommended.get(user_id, [])
+        distinct.update(result)
+        hit = len(set(result) & set(expected))
+        hits += hit > 0
+        precision.append(hit / k)
+        recall.append(hit / len(expected))
+    users = max(len(held_out), 1)
+    return {
+        f'precision_at_{k}': round(float(np.mean(precision)), 4) if precision else 0.0,
+        f'recall_at_{k}': round(float(np.mean(recall)), 4) if recall else 0.0,
+        f'hit_rate_at_{k}': round(hits / users, 4),
+        'coverage': round(len(distinct) / max(n_events, 1), 4),
+    }
+
+
+def run_configuration(path, config, histories, held_out, k):
+    """Runs in a fresh process: load the artifact, recommend for every held-out user, score the results."""
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    models = load_artifact(path)
+    load_seconds = time.perf_counter() - started
+
+    recommended, timings, no_scores = {}, [], 0
+    for user_id, (event_ids, weights) in histories.items():
+        started = time.perf_counter()
+        rows = models.indices_for(event_ids)
+        known = rows >= 0
+        top = recommend_rows(models, user_id, rows[known], weights[known], config, k)
+        recommended[user_id] = [int(e) for e in models.ids_for(top)]
+        timings.append(time.perf_counter() - started)
+        no_scores += not len(top)
+    report = {
+        'load_seconds': round(load_seconds, 4),
+        'latency_p50_ms': percentile_ms(timings, 50) if timings else None,
+        'latency_p99_ms': percentile_ms(timings, 99) if timings else None,
+        'latency_mean_ms': round(float(np.mean(timings)) * 1000, 3) if timings else None,
+        'rss_before_load_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_anon_mb': proc_status_mb('RssAnon'),
+        'rss_file_mb': proc_status_mb('RssFile'),
+        'users_without_scores': no_scores,
+    }
+    report.update(_quality(recommended, held_out, k, models.n_events))
+    return report
+
+
+def popularity_baseline(train, histories, held_out, k, n_events):
+    """Most-interacted training events, minus what each user already has: the fallback users get today."""
+    started = time.perf_counter()
+    event_ids, counts = np.unique(train[1], return_counts=True)
+    ranked = event_ids[np.argsort(-counts, kind='stable')].tolist()
+    recommended = {}
+    for user_id, (seen, _) in histories.items():
+        seen = set(seen.tolist())
+        recommended[user_id] = [e for e in ranked[:k + len(seen)] if e not in seen][:k]
+    report = {'latency_mean_ms': round((time.perf_counter() - started) * 1000 / max(len(histories), 1), 4)}
+    report.update(_quality(recommended, held_out, k, n_events))
+    return report
+
+
+def run_evaluation(documents, interactions, configs=DEFAULT_CONFIGS, k=DEFAULT_RECOMMENDATIONS,
+                   test_fraction=DEFAULT_TEST_FRACTION, split_at=None, max_users=None, seed=0, workdir=None,
+                   log=print):
+    """Evaluate every configuration on one time split; returns a JSON-serialisable report."""
+    import multiprocessing
+
+    configs = [parse_config(c) if isinstance(c, str) else c for c in configs]
+    documents = list(documents)
+    train, held_out, cutoff = time_split(interactions, test_fraction, split_at)
+    if max_users and len(held_out) > max_users:
+        rng = np.random.default_rng(seed)
+        keep = rng.choice(sorted(held_out), size=max_users, replace=False)
+        held_out = {int(u): held_out[int(u)] for u in keep}
+    histories = user_histories(train, held_out)
+
+    context = multiprocessing.get_context('spawn')
+    root = workdir or tempfile.mkdtemp(prefix='recommender-eval-')
+    results = []
+    try:
+        for number, config in enumerate(configs):
+            case = {'config': config['name'], 'settings': {key: config[key] for key in CONFIG_DEFAULTS}}
+            log(f"{config['name']}: evaluating {len(held_out)} users...")
+            if config['engine'] == 'popular':
+                case.update(popularity_baseline(train, histories, held_out, k, len(documents)))
+                results.append(case)
+                continue
+            path = os.path.join(root, f'config-{number}')
+            started = time.perf_counter()
+            prepare_configuration(path, documents, config, train)
+            case['build_seconds'] = round(time.perf_counter() - started, 2)
+            case['artifact_mb'] = directory_mb(path)
+            with context.Pool(1) as pool:
+                case.update(pool.apply(run_configuration, (path, config, histories, held_out, k)))
+            results.append(case)
+            shutil.rmtree(path, ignore_errors=True)
+    finally:
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'k': k,
+        'split': {
+            'cutoff': cutoff,
+            'train_interactions': int(len(train[0])),
+            'test_interactions': int(len(interactions[0]) - len(train[0])),
+            'evaluated_users': len(held_out),
+            'held_out_events': sum(len(e) for e in held_out.values()),
+        },
+        'events': len(documents),
+        'results': results,
+    }
@@ -0,0 +1,115 @@
+import numpy as np
+
+from .builder import event_document
+from .cache import get_many_cached_external_vectors, set_many_cached_external_vectors
+
+# --- External saved events ---
+# Ticketmaster/Skiddle events a user saved have no row in the model, so they are
+# vectorised on the fly: the artifact's TF-IDF vectorizer turns the saved event
+# data into a sparse query vector, cached by external id and model version. The
+# vectors then act like extra saved events: their term scores against every event
+# are added to the neighbour scores, and with the embedding engines their
+# projections join the user's profile.
+
+# Keys the frontend (and the raw Ticketmaster/Skiddle payloads) use for each field
+TITLE_KEYS = ('title', 'name', 'eventname')
+DESCRIPTION_KEYS = ('description', 'info', 'pleaseNote', 'summary')
+CATEGORY_KEYS = ('category', 'genre', 'EventCode')
+
+
+def _first_text(data, keys):
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, str) and value.strip():
+            return value
+    return None
+
+
+def external_event_document(data):
+    """The text of a saved external event, in the same shape as event_document()."""
+    if not isinstance(data, dict):
+        return ''
+    category = _first_text(data, CATEGORY_KEYS)
+    if category is None:
+        # Ticketmaster: classifications[0].segment/genre.name
+        for classification in data.get('classifications') or []:
+            if isinstance(classification, dict):
+                names = [(classification.get(part) or {}).get('name') for part in ('segment', 'genre')]
+                category = ' '.join(n for n in names if isinstance(n, str)) or None
+                break
+    return event_document(_first_text(data, TITLE_KEYS), _first_text(data, DESCRIPTION_KEYS), category)
+
+
+def load_external_saves(user_ids=None, chunk_size=5000):
+    """{user id: [(external id, event data)]} for saved events that only exist on another platform."""
+    from saved.models import SavedEvent
+
+    saved = SavedEvent.objects.filter(event__isnull=True, external_event_id__isnull=False)
+    if user_ids is not None:
+        saved = saved.filter(user_id__in=user_ids)
+    saves = {}
+    rows = saved.values_list('user_id', 'external_event_id', 'external_event_data')
+    for user_id, external_id, data in rows.iterator(chunk_size=chunk_size):
+        if data:
+            saves.setdefault(user_id, []).append((external_id, data))
+    return saves
+
+
+def external_vectors(models, saves):
+    """
+    TF-IDF (term columns, weights) of each (external id, event data) pair; events
+    with no known terms are left out. Vectors are read from and written to the
+    recommendations cache in one round trip each.
+    """
+    if models is None or not saves or models.vectorizer is None:
+        return []
+    cached = get_many_cached_external_vectors(models.version, [external_id for external_id, _ in saves])
+    missing = {}
+    for external_id, data in saves:
+        if external_id not in cached and external_id not in missing:
+            missing[external_id] = external_event_document(data)
+    if missing:
+        matrix = models.vectorizer.transform(list(missing.values())).tocsr()
+        for external_id, row in zip(missing, range(matrix.shape[0])):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            cached[external_id] = [
+                [int(c) for c in matrix.indices[start:end]],
+                [round(float(w), 6) for w in matrix.data[start:end]],
+            ]
+        set_many_cached_external_vectors(models.version, {external_id: cached[external_id] for external_id in missing})
+    vectors = []
+    for external_id in dict.fromkeys(external_id for external_id, _ in saves):
+        cols, weights = cached[external_id]
+        if cols:
+            vectors.append((np.asarray(cols, dtype=np.int64), np.asarray(weights, dtype=np.float32)))
+    return vectors
+
+
+def external_term_scores(models, vectors):
+    """(rows, scores): summed cosine similarity of every event (base and delta) to the external vectors."""
+    if not vectors or not models.supports_delta:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    # Dot products are linear, so one query with the summed vectors scores all of them at once
+    query = np.zeros(models.n_terms, dtype=np.float32)
+    for cols, weights in vectors:
+        np.add.at(query, cols, weights)
+    cols = np.flatnonzero(query)
+    rows = np.arange(models.n_events, dtype=np.int64)
+    scores = models.term_scores(cols, query[cols])
+    delta = models.delta
+    if delta is not None and delta.vectors:
+        extra_rows, extra_scores = delta.extra_scores(cols, query[cols])
+        rows, scores = np.concatenate([rows, extra_rows]), np.concatenate([scores, extra_scores])
+    keep = scores > 0
+    if delta is not None and delta.removed:
+        keep &= ~np.isin(rows, list(delta.removed))
+    return rows[keep], scores[keep]
+
+
+def external_embeddings(models, vectors):
+    """Projected embeddings of the external vectors (an empty array without embeddings)."""
+    embeddings = models.embeddings
+    if embeddings is None:
+        return np.empty((0, 0), dtype=np.float32)
+    projected = [v for v in (embeddings.project(cols, weights) for cols, weights in vectors) if v is not None]
+    return np.vstack(projected).astype(np.float32) if projected else np.empty((0, embeddings.dim), dtype=np.float32)
@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .artifacts import current_artifact_path, load_artifact, read_current_version, versions_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RELOAD_SECONDS = 30
+
+
+def get_models_path():
+    return getattr(settings, 'RECOMMENDER_MODELS_PATH', None) or os.path.join(settings.BASE_DIR, 'recommender_models')
+
+
+def recommender_engine():
+    """The content engine requests are scored with (settings.RECOMMENDER_ENGINE)."""
+    from .engine import DEFAULT_ENGINE
+    return getattr(settings, 'RECOMMENDER_ENGINE', DEFAULT_ENGINE)
+
+
+def ann_options():
+    """Search knobs for the 'ann' engine: lists probed per query and candidates kept."""
+    from .ann import DEFAULT_CANDIDATES, DEFAULT_NPROBE
+    return {
+        'nprobe': getattr(settings, 'RECOMMENDER_ANN_NPROBE', DEFAULT_NPROBE),
+        'candidates': getattr(settings, 'RECOMMENDER_ANN_CANDIDATES', DEFAULT_CANDIDATES),
+    }
+
+
+def use_shared_memory():
+    return getattr(settings, 'RECOMMENDER_SHARED_MEMORY', False)
+
+
+def warm_artifact(models):
+    """Build everything the first request would otherwise pay for (vectorizer, delta, lookups, masks)."""
+    from .collaborative import svd_lookups
+    from .masks import get_eligibility_masks
+    models.vectorizer
+    models.delta
+    models.ann
+    if models.svd is not None:
+        svd_lookups(models)
+    get_eligibility_masks(models)
+
+
+class RecommendationModelLoader:
+    """
+    Per-process handle on the current recommender artifact.
+    Loading only reads the manifest and memory-maps the arrays, so it is cheap
+    enough to do lazily on the first request.
+
+    Publishing a new version is picked up without a restart: at most every
+    RECOMMENDER_RELOAD_SECONDS the CURRENT pointer is read, and if it names a new
+    version that version is loaded and warmed on a background thread, then
+    swapped in with a single assignment. Requests keep using the old version
+    until then and never see a half-loaded one.
+    """
+    _models = None
+    _warned_missing = False
+    _checked_at = 0.0
+    _reloading = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def artifact_path(cls):
+        return current_artifact_path(get_models_path())
+
+    @classmethod
+    def load_models(cls):
+        path = cls.artifact_path()
+        cls._models = load_artifact(path, shared=use_shared_memory()) if path else None
+        cls._checked_at = time.monotonic()
+        if cls._models is None and not cls._warned_missing:
+            cls._warned_missing = True
+            logger.warning('No recommender artifact published under %s; run `manage.py build_recommender` '
+                           'to create one.', get_models_path())
+        return cls._models
+
+    @classmethod
+    def preload(cls):
+        """
+        Load and warm the current version in a server's master process before it
+        forks workers (settings.RECOMMENDER_PRELOAD, e.g. with gunicorn --preload),
+        so every worker starts with the model already in place.
+        """
+        from django.db import connections
+        models = cls.load_models()
+        if models is not None:
+            warm_artifact(models)
+        # Workers must not inherit the master's database connections
+        connections.close_all()
+        return models
+
+    @classmethod
+    def get_models(cls):
+        models = cls._models
+        if models is None:
+            return cls.load_models()
+        cls.check_for_update(models)
+        return models
+
+    @classmethod
+    def check_for_update(cls, models):
+        """Start a background reload if CURRENT names another version (rate-limited, never blocks)."""
+        interval = getattr(settings, 'RECOMMENDER_RELOAD_SECONDS', DEFAULT_RELOAD_SECONDS)
+        now = time.monotonic()
+        if interval < 0 or now - cls._checked_at < interval:
+            return
+        with cls._lock:
+            if cls._reloading or now - cls._checked_at < interval:
+                return
+            cls._checked_at = now
+            version = read_current_version(get_models_path())
+            if not version or version == models.version:
+                return
+            cls._reloading = True
+        threading.Thread(target=cls._reload, args=(version,), name='recommender-reload', daemon=True).start()
+
+    @classmethod
+    def _reload(cls, version):
+        from django.db import connection
+        try:
+            models = load_artifact(os.path.join(versions_path(get_models_path()), version), shared=use_shared_memory())
+            if models is None:
+                return
+            warm_artifact(models)
+            previous, cls._models = cls._models, models
+            logger.info('Recommender models reloaded: now serving version %s', version)
+            if previous is not None and previous.shared_segments:
+                from .shared import release_shared
+                release_shared(previous.manifest)
+        except Exception:
+            logger.exception('Could not load recommender version %s; still serving the previous one', version)
+        finally:
+            cls._reloading = False
+            connection.close()
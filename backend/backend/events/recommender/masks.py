@@ -0,0 +1,236 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+# --- Eligibility masks ---
+# Boolean arrays aligned with the model's row index space, so filtering out past,
+# sold-out, cancelled or off-category events is one vectorised step before top-K
+# selection instead of a database round trip per candidate.
+#
+# Masks are built from one query over the events table (availability comes from
+# the stored is_sold_out column, never from re-parsing ticketTypes) and memoised
+# on the loaded artifact; warm_artifact() builds them before a version serves
+# requests. Writers call eligibility_changed(), which patches the local copy and
+# bumps a generation stamp in the default cache. Masks older than
+# RECOMMENDER_ELIGIBILITY_REFRESH_SECONDS are rebuilt on a background thread
+# while requests keep using the current ones: with a shared cache backend only
+# once the stamp has moved, with the default per-process LocMemCache (where other
+# workers' stamps are invisible) every time. Rows the masks have not seen,
+# such as events other workers added through the delta segment, are looked up in
+# the database when first needed rather than treated as ineligible. The start
+# time is stored as an epoch array and compared at request time, so events drop
+# out the moment they start without any rebuild.
+
+logger = logging.getLogger(__name__)
+
+INELIGIBLE_STATUSES = ('cancelled', 'canceled', 'completed', 'draft')
+GENERATION_KEY = 'recommender:eligibility:generation'
+DEFAULT_REFRESH_SECONDS = 30
+
+
+def eligible_events(queryset, now=None):
+    """The same rules as the masks (minus ticket availability), for plain querysets."""
+    statuses = Q()
+    for name in INELIGIBLE_STATUSES:
+        statuses |= Q(status__iexact=name)
+    return queryset.filter(start_time__gt=now or timezone.now()).exclude(statuses)
+
+
+def _is_usable(status, is_sold_out, typed_available):
+    """Status allows it and tickets are left (events without ticket types are never sold out)."""
+    return (status or '').lower() not in INELIGIBLE_STATUSES and (not is_sold_out or bool(typed_available))
+
+
+class EligibilityMasks:
+
+    def __init__(self, generation, size):
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.start = np.full(size, -np.inf)            # start time (epoch seconds); -inf for unknown rows
+        self.usable = np.zeros(size, dtype=bool)       # status allows it and tickets are left
+        self.category = np.full(size, -1, dtype=np.int32)
+        self.category_codes = {}
+        self.checked = np.ones(size, dtype=bool)       # False for rows added since the build, not yet looked up
+        self.refreshing = False                        # a background rebuild is running
+
+    def __len__(self):
+        return len(self.start)
+
+    @staticmethod
+    def _fetch(event_ids=None):
+        """(ids, start epochs, usable flags, lower-cased categories) of every event, or of event_ids."""
+        from events.models import Event
+        from tickets.models import EventTicketType
+
+        typed = EventTicketType.objects.all()
+        rows = Event.objects.all()
+        if event_ids is not None:
+            typed = typed.filter(event_id__in=event_ids)
+            rows = rows.filter(id__in=event_ids)
+        typed = dict(typed.values('event_id').annotate(total=Sum('available')).values_list('event_id', 'total'))
+        ids, starts, usable, categories = [], [], [], []
+        rows = rows.values_list('id', 'start_time', 'status', 'is_sold_out', 'category')
+        for event_id, start_time, status, is_sold_out, category in rows.iterator(chunk_size=5000):
+            ids.append(event_id)
+            starts.append(start_time.timestamp() if start_time else -np.inf)
+            usable.append(_is_usable(status, is_sold_out, typed.get(event_id)))
+            categories.append((category or '').lower())
+        return ids, starts, usable, categories
+
+    @classmethod
+    def build(cls, models, generation):
+        ids, starts, usable, categories = cls._fetch()
+        masks = cls(generation, models.n_rows)
+        if ids:
+            indices = models.indices_for(ids)
+            known = indices >= 0
+            names, codes = np.unique(np.asarray(categories), return_inverse=True)
+            masks.category_codes = {name: code for code, name in enumerate(names.tolist())}
+            masks.start[indices[known]] = np.asarray(starts)[known]
+            masks.usable[indices[known]] = np.asarray(usable, dtype=bool)[known]
+            masks.category[indices[known]] = codes[known]
+        return masks
+
+    def _grow(self, size):
+        if size <= len(self):
+            return
+        extra = size - len(self)
+        self.start = np.concatenate([self.start, np.full(extra, -np.inf)])
+        self.usable = np.concatenate([self.usable, np.zeros(extra, dtype=bool)])
+        self.category = np.concatenate([self.category, np.full(extra, -1, dtype=np.int32)])
+        self.checked = np.concatenate([self.checked, np.zeros(extra, dtype=bool)])
+
+    def load_unchecked(self, models):
+        """Look up the rows added since the build (e.g. by other workers' delta entries) in the database."""
+        self._grow(models.n_rows)
+        rows = np.flatnonzero(~self.checked[:models.n_rows])
+        if not len(rows):
+            return
+        event_ids = [int(i) for i in models.ids_for(rows)]
+        ids, starts, usable, categories = self._fetch(event_ids)
+        found = dict(zip(ids, zip(starts, usable, categories)))
+        for row, event_id in zip(rows, event_ids):
+            # Gone from the database: stays ineligible
+            start, ok, category = found.get(event_id, (-np.inf, False, ''))
+            self.start[row] = start
+            self.usable[row] = ok
+            self.category[row] = self.category_codes.setdefault(category, len(self.category_codes))
+        self.checked[rows] = True
+
+    def update(self, row, event, typed_available=None):
+        """Patch one row from an Event instance (e.g. right after it was saved)."""
+        self._grow(row + 1)
+        self.start[row] = event.start_time.timestamp() if event.start_time else -np.inf
+        self.usable[row] = _is_usable(event.status, event.is_sold_out, typed_available)
+        category = (event.category or '').lower()
+        self.category[row] = self.category_codes.setdefault(category, len(self.category_codes))
+        self.checked[row] = True
+
+    def clear(self, row):
+        if 0 <= row < len(self):
+            self.usable[row] = False
+
+    def mask(self, size, now=None, categories=None):
+        """Eligible rows as a bool array of length size (call load_unchecked() first for rows added since the build)."""
+        now = (now or timezone.now()).timestamp()
+        eligible = self.usable & (self.start > now)
+        if categories:
+            codes = [self.category_codes[c.lower()] for c in categories if c and c.lower() in self.category_codes]
+            eligible &= np.isin(self.category, codes)
+        if len(eligible) < size:
+            eligible = np.concatenate([eligible, np.zeros(size - len(eligible), dtype=bool)])
+        return eligible[:size]
+
+
+_lock = threading.Lock()
+
+
+def _generation():
+    return cache.get(GENERATION_KEY, 0)
+
+
+def _rebuild(models, current, generation):
+    from django.db import connection
+    try:
+        masks = EligibilityMasks.build(models, generation)
+        # Swapped in with one assignment; requests meanwhile keep using `current`
+        models.memo('eligibility', lambda: masks, lambda value: value is current)
+    except Exception:
+        logger.exception('Could not rebuild the recommender eligibility masks; still serving the previous ones')
+    finally:
+        current.refreshing = False
+        connection.close()
+
+
+def get_eligibility_masks(models):
+    """
+    The masks for models, covering every row. Only the first call for a version
+    (normally warm_artifact()) builds them in the caller; once they are older than
+    the refresh interval they are rebuilt in the background.
+    """
+    generation = _generation()
+    refresh = getattr(settings, 'RECOMMENDER_ELIGIBILITY_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS)
+    # A per-process cache never shows other workers' generation bumps
+    process_local = isinstance(caches['default'], (LocMemCache, DummyCache))
+
+    masks = models.memoised('eligibility')
+    if masks is None:
+        with _lock:
+            masks = models.memo('eligibility', lambda: EligibilityMasks.build(models, generation))
+    elif (time.monotonic() - masks.built_at >= refresh and (process_local or masks.generation != generation)
+          and not masks.refreshing):
+        with _lock:
+            if not masks.refreshing:
+                masks.refreshing = True
+                threading.Thread(target=_rebuild, args=(models, masks, generation),
+                                 name='recommender-eligibility', daemon=True).start()
+    if len(masks) < models.n_rows or not masks.checked.all():
+        with _lock:
+            masks.load_unchecked(models)
+    return masks
+
+
+def eligibility_mask(models, now=None, categories=None):
+    """Bool array over models.n_rows: upcoming, not cancelled/completed/draft, not sold out, in categories."""
+    return get_eligibility_masks(models).mask(models.n_rows, now=now, categories=categories)
+
+
+def eligibility_changed(event=None, event_id=None):
+    """
+    Call after an event is created, edited, sold from or deleted. Pass the saved
+    event to patch this process's masks in place; pass only event_id for a delete.
+    Failures are logged and swallowed, like the other recommender hooks.
+    """
+    try:
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 0, None)
+            generation = cache.incr(GENERATION_KEY)
+        from .loader import RecommendationModelLoader
+        models = RecommendationModelLoader.get_models()
+        masks = models.memoised('eligibility') if models is not None else None
+        if masks is None:
+            return
+        row = models.indices_for([event.id if event is not None else event_id])[0]
+        if row < 0:
+            return
+        if event is not None:
+            from tickets.models import EventTicketType
+            typed = EventTicketType.objects.filter(event_id=event.id).aggregate(total=Sum('available'))['total']
+            masks.update(int(row), event, typed)
+        else:
+            masks.clear(int(row))
+        # Still current apart from this change: keep serving it without a rebuild.
+        if masks.generation == generation - 1:
+            masks.generation = generation
+    except Exception:
+        logger.exception('Could not update recommender eligibility for event %s', event_id or getattr(event, 'id', None))
@@ -0,0 +1,116 @@
+import numpy as np
+
+# --- Sparse top-K neighbour index ---
+# Each event keeps only its K most similar events, stored CSR-style:
+#   neighbour_indptr[i]:neighbour_indptr[i+1] slices neighbour_indices / neighbour_scores
+# Memory is O(N*K) instead of O(N^2), and scoring a user touches K entries per saved event.
+
+DEFAULT_NEIGHBOURS = 50
+
+
+def top_k_block(block, k, row_offset=0):
+    """
+    Select the top-k columns of every row of a dense score block.
+    The diagonal (an event's similarity to itself) and non-positive scores are dropped.
+    Returns (lengths, indices, scores) with rows concatenated in order.
+    """
+    block = np.array(block, dtype=np.float32)
+    n_rows, n_cols = block.shape
+    rows = np.arange(n_rows)
+    self_cols = rows + row_offset
+    in_range = self_cols < n_cols
+    block[rows[in_range], self_cols[in_range]] = -np.inf
+
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.zeros(n_rows, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    if k < n_cols:
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(n_cols), (n_rows, 1))
+    top_scores = np.take_along_axis(block, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    keep = top_scores > 0
+    return keep.sum(axis=1), top[keep].astype(np.int32), top_scores[keep].astype(np.float32)
+
+
+def iter_dense_blocks(similarity, chunk_size=1024):
+    """Yield (row_offset, block) slices of a dense (possibly memory-mapped) similarity matrix."""
+    for start in range(0, similarity.shape[0], chunk_size):
+        yield start, similarity[start:start + chunk_size]
+
+
+def block_rows_for(n_events, max_block_mb=256):
+    """Rows per score block so that a dense float32 block stays under max_block_mb."""
+    return max(1, int(max_block_mb * 1024 * 1024 // (4 * max(n_events, 1))))
+
+
+def iter_sparse_blocks(matrix, chunk_size):
+    """
+    Yield (row_offset, block) cosine similarity blocks of an L2-normalised sparse
+    matrix against itself, one row chunk at a time.
+    """
+    matrix_t = matrix.T.tocsr()
+    for start in range(0, matrix.shape[0], chunk_size):
+        yield start, (matrix[start:start + chunk_size] @ matrix_t).toarray()
+
+
+def build_neighbour_index(blocks, k=DEFAULT_NEIGHBOURS):
+    """Build CSR neighbour arrays from an iterable of (row_offset, dense score block)."""
+    lengths, indices, scores = [], [], []
+    for row_offset, block in blocks:
+        block_lengths, block_indices, block_scores = top_k_block(block, k, row_offset)
+        lengths.append(block_lengths)
+        indices.append(block_indices)
+        scores.append(block_scores)
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    return (
+        indptr,
+        np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+        np.concatenate(scores) if scores else np.empty(0, dtype=np.float32),
+    )
+
+
+def merge_scored(candidates, scores):
+    """Sum scores of duplicate candidates. Returns unique candidates and their totals."""
+    if not len(candidates):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    unique, inverse = np.unique(candidates, return_inverse=True)
+    totals = np.bincount(inverse, weights=scores, minlength=len(unique)).astype(np.float32)
+    return unique.astype(np.int64), totals
+
+
+class NeighbourIndex:
+    """Read-only view over the CSR neighbour arrays of an artifact."""
+
+    def __init__(self, indptr, indices, scores):
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def k(self):
+        return int(np.max(np.diff(self.indptr))) if len(self) else 0
+
+    def row(self, idx):
+        start, end = self.indptr[idx], self.indptr[idx + 1]
+        return np.asarray(self.indices[start:end], dtype=np.int64), np.asarray(self.scores[start:end])
+
+    def merge(self, rows):
+        """Union of the neighbour lists of rows, summing scores of shared neighbours."""
+        rows = [int(r) for r in rows if 0 <= r < len(self)]
+        if not rows:
+            return merge_scored([], [])
+        parts = [self.row(r) for r in rows]
+        return merge_scored(
+            np.concatenate([p[0] for p in parts]),
+            np.concatenate([p[1] for p in parts]),
+        )
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# --- Shared-memory artifact segments ---
+# Optional alternative to plain memory-mapping (settings.RECOMMENDER_SHARED_MEMORY):
+# every array of an artifact version is copied once into a POSIX shared memory
+# segment, and every process on the host attaches the same segments read-only.
+# Unlike page-cache pages of the .npy files, segments are never evicted under
+# memory pressure and do not depend on the artifact directory being on a local
+# filesystem, so a worker's private memory for the model is near zero however
+# many workers run.
+#
+# Segment names are derived from the version and array name, so the first process
+# to load a version creates them and the others attach. A marker segment is
+# created last; a process that finds arrays but no marker (another one is still
+# copying) simply falls back to memory-mapping for that version. Segments outlive
+# the processes that created them and are unlinked when a worker moves on to a
+# newer version (release_shared()).
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'evrec'
+READY_MARKER = '.ready'
+
+
+def segment_name(version, array_name):
+    # Short and portable (macOS limits shared memory names to 31 characters)
+    digest = hashlib.sha1(f'{version}/{array_name}'.encode('utf-8')).hexdigest()[:20]
+    return f'{SEGMENT_PREFIX}_{digest}'
+
+
+def _open(name, create=False, size=0):
+    segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+    # The resource tracker would unlink the segment when this process exits, pulling
+    # it from under the other workers; lifetime is managed by release_shared() instead.
+    try:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    except Exception:
+        pass
+    return segment
+
+
+def _shared_names(manifest):
+    return [name for name, info in manifest.get('arrays', {}).items() if np.prod(info['shape']) > 0]
+
+
+def _view(segment, info):
+    array = np.ndarray(tuple(info['shape']), dtype=np.dtype(info['dtype']), buffer=segment.buf)
+    array.flags.writeable = False
+    return array
+
+
+def attach_shared(artifact):
+    """
+    Attach (or create) the shared segments of an artifact's arrays. Returns
+    (segments, {array name: read-only array}), or None when shared memory is
+    unavailable or another process is still creating this version.
+    """
+    manifest = artifact.manifest
+    version = artifact.version
+    names = _shared_names(manifest)
+    segments = {}
+    created = False
+    try:
+        try:
+            _open(segment_name(version, READY_MARKER)).close()
+            for name in names:
+                segments[name] = _open(segment_name(version, name))
+        except FileNotFoundError:
+            if segments:
+                return None     # released while attaching
+            created = True
+            for name in names:
+                info = manifest['arrays'][name]
+                source = artifact.array(name)
+                segments[name] = _open(segment_name(version, name), create=True, size=max(source.nbytes, 1))
+                target = np.ndarray(source.shape, dtype=source.dtype, buffer=segments[name].buf)
+                target[...] = source
+                del target
+            _open(segment_name(version, READY_MARKER), create=True, size=1).close()
+    except Exception as e:
+        for segment in segments.values():
+            segment.close()
+            if created:
+                _unlink(segment)
+        if not isinstance(e, FileExistsError):
+            logger.warning('Could not place recommender version %s in shared memory: %s', version, e)
+        return None
+    return segments, {name: _view(segment, manifest['arrays'][name]) for name, segment in segments.items()}
+
+
+def release_shared(manifest):
+    """Unlink a version's segments. Processes still attached keep their mappings until they drop them."""
+    version = manifest.get('version')
+    for name in [READY_MARKER] + _shared_names(manifest):
+        try:
+            segment = _open(segment_name(version, name))
+        except FileNotFoundError:
+            continue
+        segment.close()
+        _unlink(segment)
+
+
+def _unlink(segment):
+    # unlink() also unregisters the name, which _open() already did
+    resource_tracker.register(segment._name, 'shared_memory')
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,215 @@
+import logging
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce, Exp, Ln
+from django.utils import timezone
+
+from .masks import eligible_events
+
+# --- Trending scores ---
+# Each event keeps an exponentially decayed activity score
+#     score(t) = sum_i w_i * exp(-lambda * (t - t_i)),   lambda = ln 2 / half-life
+# stored in log space relative to a fixed epoch:
+#     Event.trending_score = ln(sum_i w_i * exp(lambda * (t_i - EPOCH)))
+# Every score decays at the same rate, so ordering by the stored value is ordering
+# by the current decayed score, and the column never needs a periodic decay pass.
+# A new activity is folded in with one atomic UPDATE (log-add-exp in SQL), so
+# concurrent purchases never lose increments.
+#
+# Views are too frequent for a write each: record_view() counts them in the cache
+# and flush_views() folds the counts in, one UPDATE per distinct count. The first
+# view after TRENDING_VIEW_FLUSH_SECONDS triggers a flush (once per cache, so per
+# worker with the default LocMemCache), and rebuild_trending flushes as well.
+# An event whose counter starts from zero is appended to a pending list (numbered
+# slots behind an atomic counter), so a flush reads only the events viewed since
+# the last one instead of probing a counter for every event in the catalogue.
+#
+# Top-N lists (overall, per category, per location) are one indexed
+# ORDER BY trending_score query, cached for TRENDING_CACHE_SECONDS.
+
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+TRENDING_WEIGHTS = {
+    'ticket': 3.0,
+    'save': 2.0,
+    'view': 0.2,
+}
+DEFAULT_HALF_LIFE_HOURS = 72
+DEFAULT_CACHE_SECONDS = 300
+DEFAULT_TRENDING = 10
+DEFAULT_VIEW_FLUSH_SECONDS = 60
+# Held while views are buffered; expires to let the next view flush
+VIEW_FLUSH_KEY = 'trending:views:flush'
+# Unflushed counts are dropped after this long
+VIEW_COUNT_SECONDS = 24 * 3600
+# Pending list of viewed event ids: slot count, slots flushed so far
+VIEW_PENDING_KEY = 'trending:views:pending'
+VIEW_FLUSHED_KEY = 'trending:views:flushed'
+
+logger = logging.getLogger(__name__)
+
+
+def decay_rate():
+    """lambda, per hour."""
+    return math.log(2) / getattr(settings, 'TRENDING_HALF_LIFE_HOURS', DEFAULT_HALF_LIFE_HOURS)
+
+
+def log_weight(weight, when=None):
+    """ln(weight * exp(lambda * (when - EPOCH))): the log-space contribution of one activity."""
+    hours = ((when or timezone.now()) - TRENDING_EPOCH).total_seconds() / 3600
+    return math.log(weight) + decay_rate() * hours
+
+
+def decayed_score(trending_score, now=None):
+    """The stored log-space value as today's decayed score (for display and debugging)."""
+    if trending_score is None:
+        return 0.0
+    return math.exp(trending_score - log_weight(1.0, now))
+
+
+def record_trending(event_id, kind, when=None):
+    """
+    Add one ticket purchase, save or view to an event's trending score.
+    Failures are logged and swallowed: trending is best-effort.
+    """
+    from events.models import Event
+    try:
+        x = log_weight(TRENDING_WEIGHTS[kind], when)
+        # ln(e^old + e^x) = x + ln(e^(old - x) + 1); old - x <= 0 for recent activity, so exp() cannot overflow
+        Event.objects.filter(pk=event_id).update(
+            trending_score=Value(x) + Ln(Coalesce(Exp(F('trending_score') - Value(x)), Value(0.0)) + Value(1.0))
+        )
+    except Exception:
+        logger.exception('Could not record %s for event %s in trending scores', kind, event_id)
+
+
+def _view_key(event_id):
+    return f'trending:views:{event_id}'
+
+
+def _slot_key(slot):
+    return f'{VIEW_PENDING_KEY}:{slot}'
+
+
+def _add_pending(event_id):
+    cache.add(VIEW_PENDING_KEY, 0, None)
+    cache.set(_slot_key(cache.incr(VIEW_PENDING_KEY)), int(event_id), VIEW_COUNT_SECONDS)
+
+
+def record_view(event_id):
+    """Count a detail view towards an event's trending score, without a database write. Best-effort."""
+    try:
+        key = _view_key(event_id)
+        views = 1 if cache.add(key, 1, VIEW_COUNT_SECONDS) else cache.incr(key)
+        if views == 1:
+            _add_pending(event_id)
+        if cache.add(VIEW_FLUSH_KEY, 1, getattr(settings, 'TRENDING_VIEW_FLUSH_SECONDS', DEFAULT_VIEW_FLUSH_SECONDS)):
+            flush_views()
+    except Exception:
+        logger.exception('Could not record view for event %s in trending scores', event_id)
+
+
+def pending_view_ids(chunk_size=1000):
+    """Ids of the events viewed since the last flush, taken off the pending list."""
+    last = cache.get(VIEW_PENDING_KEY, 0)
+    flushed = min(cache.get(VIEW_FLUSHED_KEY, 0), last)
+    event_ids = set()
+    for start in range(flushed + 1, last + 1, chunk_size):
+        keys = [_slot_key(slot) for slot in range(start, min(start + chunk_size, last + 1))]
+        event_ids.update(cache.get_many(keys).values())
+        cache.delete_many(keys)
+    cache.set(VIEW_FLUSHED_KEY, last, None)
+    return sorted(event_ids)
+
+
+def flush_views(when=None, chunk_size=1000):
+    """
+    Fold the view counts buffered by record_view() into the trending scores of
+    the events viewed since the last flush. Returns the number of views.
+    """
+    from events.models import Event
+    by_count = {}
+    event_ids = pending_view_ids(chunk_size)
+    for start in range(0, len(event_ids), chunk_size):
+        chunk = event_ids[start:start + chunk_size]
+        for key, views in cache.get_many([_view_key(event_id) for event_id in chunk]).items():
+            if views:
+                event_id = int(key.rsplit(':', 1)[1])
+                # decr rather than delete: views counted meanwhile stay buffered, and back on the list
+                if cache.decr(key, views) > 0:
+                    _add_pending(event_id)
+                by_count.setdefault(views, []).append(event_id)
+    for views, ids in by_count.items():
+        x = log_weight(TRENDING_WEIGHTS['view'] * views, when)
+        Event.objects.filter(pk__in=ids).update(
+            trending_score=Value(x) + Ln(Coalesce(Exp(F('trending_score') - Value(x)), Value(0.0)) + Value(1.0))
+        )
+    return sum(views * len(ids) for views, ids in by_count.items())
+
+
+def _cache_key(n, categories, location):
+    categories = ','.join(sorted(c.lower() for c in categories)) if categories else '*'
+    location = (location or '*').lower()
+    return f'trending:{n}:{categories}:{location}'
+
+
+def trending_queryset(categories=None, location=None):
+    from events.models import Event
+    queryset = eligible_events(Event.objects.all())
+    if categories:
+        in_categories = Q()
+        for category in categories:
+            in_categories |= Q(category__iexact=category)
+        queryset = queryset.filter(in_categories)
+    if location:
+        queryset = queryset.filter(location__iexact=location)
+    return queryset
+
+
+def compute_trending_event_ids(n=DEFAULT_TRENDING, categories=None, location=None):
+    queryset = trending_queryset(categories, location)
+    event_ids = list(
+        queryset.filter(trending_score__isnull=False).order_by('-trending_score').values_list('id', flat=True)[:n]
+    )
+    if len(event_ids) < n:
+        # Not enough recent activity yet: pad with lifetime best-sellers
+        event_ids += list(
+            queryset.exclude(id__in=event_ids).order_by('-tickets_sold').values_list('id', flat=True)[:n - len(event_ids)]
+        )
+    return event_ids
+
+
+def trending_event_ids(n=DEFAULT_TRENDING, categories=None, location=None):
+    """Top-n upcoming events by trending score, optionally by category and/or location (cached)."""
+    key = _cache_key(n, categories, location)
+    event_ids = cache.get(key)
+    if event_ids is None:
+        event_ids = compute_trending_event_ids(n, categories, location)
+        cache.set(key, event_ids, getattr(settings, 'TRENDING_CACHE_SECONDS', DEFAULT_CACHE_SECONDS))
+    return event_ids
+
+
+def warm_trending_cache(n=DEFAULT_TRENDING, max_locations=50):
+    """Precompute the overall list, one per category, and one per busiest location. Returns the count."""
+    from django.db.models import Count
+    from events.models import Event
+    seen = set()
+    lists = [(None, None)]
+    for category in Event.objects.values_list('category', flat=True).distinct():
+        if category and category.lower() not in seen:
+            seen.add(category.lower())
+            lists.append(([category], None))
+    locations = (
+        trending_queryset().values('location').annotate(events=Count('id')).order_by('-events')
+        .values_list('location', flat=True)[:max_locations]
+    )
+    lists += [(None, location) for location in locations if location]
+    timeout = getattr(settings, 'TRENDING_CACHE_SECONDS', DEFAULT_CACHE_SECONDS)
+    cache.set_many({
+        _cache_key(n, categories, location): compute_trending_event_ids(n, categories, location)
+        for categories, location in lists
+    }, timeout)
+    return len(lists)
@@ -0,0 +1,131 @@
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from .models import Event
+
+# --- Full-text search ---
+# The events list's ?search= is answered from a full-text index rather than one
+# LIKE '%term%' per field, which can't use an index:
+#   - MySQL: a FULLTEXT index over the searched columns, queried in boolean mode
+#     (every term required, prefix-matched so results follow the search box as
+#     the user types) and ranked by MySQL's relevance.
+#   - SQLite (local runs): an FTS5 table with the porter stemmer, kept in sync
+#     with events_event by triggers and ranked by bm25.
+# Both are created by migration 0004, which holds the DDL. The SQLite triggers
+# belong to events_event, so SQLite drops them whenever a migration makes Django
+# rebuild that table; such migrations restore them (see 0007). Any other backend,
+# or a database where the index could not be created, falls back to DRF's
+# icontains search.
+
+SEARCH_COLUMNS = ('title', 'description', 'location', 'organizer_name')
+FTS_TABLE = 'events_event_fts'
+# bm25 column weights, in SEARCH_COLUMNS order: title matches count most
+FTS_WEIGHTS = (10.0, 1.0, 3.0, 3.0)
+# Terms shorter than InnoDB's default innodb_ft_min_token_size are not indexed
+MYSQL_MIN_TOKEN = 3
+# Runs of word characters; everything else (including MySQL and FTS5 query operators) is a separator
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(text):
+    return TERM_PATTERN.findall(text or '')
+
+
+def fts_available(using='default'):
+    """True when the database has the full-text index this module queries."""
+    connection = connections[using]
+    if connection.vendor == 'mysql':
+        return True
+    if connection.vendor != 'sqlite':
+        return False
+    if not hasattr(connection, '_events_fts_available'):
+        try:
+            with connection.cursor() as cursor:
+                connection._events_fts_available = FTS_TABLE in connection.introspection.table_names(cursor)
+        except OperationalError:
+            connection._events_fts_available = False
+    return connection._events_fts_available
+
+
+def _mysql_search(queryset, terms):
+    indexed = [t for t in terms if len(t) >= MYSQL_MIN_TOKEN]
+    short = [t for t in terms if len(t) < MYSQL_MIN_TOKEN]
+    if not indexed:
+        return None
+    qn = connections[queryset.db].ops.quote_name
+    table = qn(Event._meta.db_table)
+    columns = ', '.join(f'{table}.{qn(c)}' for c in SEARCH_COLUMNS)
+    query = ' '.join(f'+{t}*' for t in indexed)
+    queryset = queryset.annotate(
+        search_rank=RawSQL(f'MATCH ({columns}) AGAINST (%s IN BOOLEAN MODE)', [query]),
+    ).filter(search_rank__gt=0)
+    # Short terms aren't in the index: match them the old way, within the indexed matches
+    for term in short:
+        queryset = queryset.filter(_icontains(term))
+    return queryset
+
+
+def _sqlite_search(queryset, terms):
+    qn = connections[queryset.db].ops.quote_name
+    query = ' '.join('"{}"*'.format(t.replace('"', '')) for t in terms)
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query]),
+    ).annotate(
+        # bm25() is lower for better matches
+        search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {qn(Event._meta.db_table)}.{qn("id")}',
+            [query],
+        ),
+    )
+
+
+def _icontains(term):
+    condition = Q()
+    for column in SEARCH_COLUMNS:
+        condition |= Q(**{f'{column}__icontains': term})
+    return condition
+
+
+def search_events(queryset, text):
+    """
+    Events matching every term of text, annotated with search_rank (higher is a
+    better match), or None when the database has no full-text index.
+    """
+    terms = search_terms(text)
+    if not terms or not fts_available(queryset.db):
+        return None
+    if connections[queryset.db].vendor == 'mysql':
+        return _mysql_search(queryset, terms)
+    return _sqlite_search(queryset, terms)
+
+
+def search_queryset(queryset, text):
+    """search_events(), or icontains matching of every term when there is no full-text index."""
+    results = search_events(queryset, text)
+    if results is not None:
+        return results
+    for term in search_terms(text):
+        queryset = queryset.filter(_icontains(term))
+    return queryset
+
+
+class EventSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the full-text index. Results are ranked by relevance
+    unless the request asks for an explicit ?ordering=.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        results = search_events(queryset, text)
+        if results is None:
+            return super().filter_queryset(request, queryset, view)
+        if not request.query_params.get('ordering'):
+            results = results.order_by('-search_rank', '-id')
+        return results
@@ -1,12 +1,38 @@
 from rest_framework import serializers
-from .models import Event
+from .models import DESCRIPTION_EXCERPT_CHARS, Event
 from tickets.models import Ticket
 from users.models import ClerkUser
+from .recommender.delta import record_event_change
+from .recommender.masks import eligibility_changed
+from .facets import facets_changed
 
-class EventSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """The ?fields=a,b,c sparse fieldset of a request, or None when not given."""
+    if request is None:
+        return None
+    fields = [f.strip() for f in request.query_params.get('fields', '').split(',') if f.strip()]
+    return fields or None
+
+
+class SparseFieldsetMixin:
+    """Only render the fields named in ?fields= (top-level serializer only, not nested ones)."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.root
+        is_top_level = root is self or (self.parent is root and isinstance(root, serializers.ListSerializer))
+        wanted = requested_fields(self.context.get('request')) if is_top_level else None
+        if wanted:
+            fields = {name: field for name, field in fields.items() if name in wanted or name == 'id'}
+        return fields
+
+
+class EventSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     image = serializers.CharField(required=False, allow_null=True, allow_blank=True)
     ticketsSold = serializers.SerializerMethodField()
     totalTickets = serializers.SerializerMethodField()
+    # Only on ?near= searches, which annotate it; omitted from other responses
+    distance_km = serializers.FloatField(read_only=True, required=False)
 
     @staticmethod
     def sync_ticket_types(event):
@@ -111,16 +137,29 @@ class EventSerializer(serializers.ModelSerializer):
         # --- Sync ticketTypes with correct price and sold values ---
         self.sync_ticket_types(event)
 
+        # --- Make the new event recommendable without waiting for a rebuild ---
+        record_event_change(event)
+        eligibility_changed(event)
+        facets_changed()
+
         return event
 
     def update(self, instance, validated_data):
         image = validated_data.get('image', None)
+        # Coordinates geocoded from the old location no longer apply; geocode_events fills them again
+        moved = any(field in validated_data and validated_data[field] != getattr(instance, field)
+                    for field in ('location', 'address'))
+        if moved and 'latitude' not in validated_data and 'longitude' not in validated_data:
+            validated_data['latitude'] = validated_data['longitude'] = None
         event = super().update(instance, validated_data)
         if image is not None:
             event.image = image
         event.save()
         # --- Sync ticketTypes with correct price and sold values ---
         self.sync_ticket_types(event)
+        record_event_change(event)
+        eligibility_changed(event)
+        facets_changed()
         return event
 
     customCategory = serializers.CharField(write_only=True, required=False, allow_blank=True)
@@ -179,7 +218,10 @@ class EventSerializer(serializers.ModelSerializer):
         }
 
     def get_ticketsSold(self, obj):
-        # Count all tickets for this event
+        # Annotated by Event.objects.with_serializer_data(); count per event otherwise
+        count = getattr(obj, 'tickets_sold_count', None)
+        if count is not None:
+            return count
         return Ticket.objects.filter(event=obj).count()
 
     def get_totalTickets(self, obj):
@@ -201,6 +243,20 @@ class EventSerializer(serializers.ModelSerializer):
             attrs['category'] = custom_category
         return attrs
 
+class EventListSerializer(EventSerializer):
+    """EventSerializer without the comments thread and with a short description, for lists of events."""
+    description = serializers.SerializerMethodField()
+
+    class Meta(EventSerializer.Meta):
+        fields = None
+        exclude = ('comments',)
+
+    def get_description(self, obj):
+        # Annotated by Event.objects.for_list(); cut from the full text otherwise
+        excerpt = getattr(obj, 'description_excerpt', None)
+        return excerpt if excerpt is not None else (obj.description or '')[:DESCRIPTION_EXCERPT_CHARS]
+
+
 from rest_framework import serializers
 
 class ImageUploadSerializer(serializers.Serializer):
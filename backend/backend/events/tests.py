@@ -0,0 +1,1325 @@
+import datetime
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+from importlib import import_module
+from multiprocessing import shared_memory
+from unittest import mock
+from urllib.parse import urlparse
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from saved.models import SavedEvent
+from tickets.models import Ticket
+from users.models import ClerkUser
+
+from .facets import compute_facets
+from .filters import DEFAULT_RADIUS_KM, MAX_RADIUS_KM, EventFilter, filter_near, weekend_range
+from .geocoding import EARTH_RADIUS_KM, bounding_box
+from .models import DESCRIPTION_EXCERPT_CHARS, Event, parse_event_date, parse_event_time, ticket_summary
+from .pagination import EventCursorPagination
+from .recommender import batch, loader, masks, shared, trending
+from .recommender.ann import IVFIndex, build_ivf
+from .recommender.artifacts import (
+    ArtifactWriter, load_artifact, new_version_name, publish_version, staging_path, versions_path,
+)
+from .recommender.builder import build_artifact, event_document
+from .recommender.cache import get_cached_recommendations, set_cached_recommendations
+from .recommender.collaborative import (
+    SAVED_WEIGHT, TICKET_WEIGHT, blend, collaborative_scores, fit_interaction_factors, user_factor_row,
+)
+from .recommender.delta import DELTA_FILENAME, record_event_change, record_event_deletion
+from .recommender.embeddings import Embeddings, normalise_rows, quantise
+from .recommender.external import (
+    external_event_document, external_term_scores, external_vectors, load_external_saves,
+)
+from .recommender.loader import RecommendationModelLoader
+from .recommender.neighbours import build_neighbour_index, iter_dense_blocks
+from .recommender.shared import READY_MARKER, release_shared, segment_name
+from .search import FTS_TABLE, fts_available, search_events, search_queryset
+from .views import recommend_event_ids_for_user
+
+
+def make_event(**fields):
+    start_time = fields.pop('start_time', timezone.now() + datetime.timedelta(days=7))
+    return Event.objects.create(**{
+        'title': 'Event',
+        'description': '',
+        'location': 'Addis Ababa',
+        'start_time': start_time,
+        'end_time': start_time + datetime.timedelta(hours=2),
+        **fields,
+    })
+
+
+class RecommenderTestCase(TestCase):
+    """Publishes artifacts under a temporary RECOMMENDER_MODELS_PATH and serves them through the loader."""
+
+    def setUp(self):
+        super().setUp()
+        self.models_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.models_path, ignore_errors=True)
+        overrides = override_settings(RECOMMENDER_MODELS_PATH=self.models_path, RECOMMENDER_RELOAD_SECONDS=-1)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        RecommendationModelLoader._models = None
+        self.addCleanup(setattr, RecommendationModelLoader, '_models', None)
+        # Trending lists, eligibility stamps and cached recommendations must not leak between tests
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def publish(self, events=None, delta_since=None, **options):
+        """Build an artifact from events (default: every event), publish it and return the loaded version."""
+        events = Event.objects.order_by('id') if events is None else events
+        documents = [(e.id, event_document(e.title, e.description, e.category)) for e in events]
+        version = new_version_name()
+        build_artifact(documents, staging_path(self.models_path, version), version=version,
+                       k=options.pop('k', 5), **options)
+        publish_version(self.models_path, version, delta_since=delta_since)
+        return RecommendationModelLoader.load_models()
+
+
+# --- Recommender artifacts ---
+
+class ArtifactRoundTripTests(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+    def write(self, event_ids, similarity, k):
+        writer = ArtifactWriter(self.path, version='test-version')
+        writer.add_event_ids(np.asarray(event_ids, dtype=np.int64))
+        writer.add_neighbours(*build_neighbour_index(iter_dense_blocks(similarity, chunk_size=2), k=k), k=k)
+        writer.add_array('similarity', similarity, dtype='float32')
+        writer.close()
+        return load_artifact(self.path)
+
+    def test_unfinished_artifact_is_not_loaded(self):
+        ArtifactWriter(self.path).add_event_ids(np.asarray([1, 2], dtype=np.int64))
+        self.assertIsNone(load_artifact(self.path))
+
+    def test_round_trip(self):
+        similarity = np.eye(3, dtype=np.float32)
+        artifact = self.write([30, 10, 20], similarity, k=2)
+        self.assertEqual(artifact.version, 'test-version')
+        self.assertEqual(artifact.n_events, 3)
+        np.testing.assert_array_equal(artifact.similarity, similarity)
+        np.testing.assert_array_equal(artifact.indices_for([10, 20, 30, 99]), [1, 2, 0, -1])
+        np.testing.assert_array_equal(artifact.ids_for([2, 0]), [20, 30])
+        self.assertEqual(artifact.manifest['neighbours'], {'k': 2})
+
+    def test_neighbour_lookup(self):
+        similarity = np.array([
+            [1.0, 0.9, 0.1, 0.5],
+            [0.9, 1.0, 0.2, 0.0],
+            [0.1, 0.2, 1.0, 0.7],
+            [0.5, 0.0, 0.7, 1.0],
+        ], dtype=np.float32)
+        artifact = self.write([1, 2, 3, 4], similarity, k=2)
+        neighbours = artifact.neighbours
+        self.assertEqual(len(neighbours), 4)
+        rows, scores = neighbours.row(0)
+        # Best first, never the event itself, zero scores dropped
+        self.assertEqual(rows.tolist(), [1, 3])
+        np.testing.assert_allclose(scores, [0.9, 0.5])
+        rows, scores = neighbours.row(1)
+        self.assertEqual(rows.tolist(), [0, 2])
+        # Shared neighbours of several rows are summed
+        rows, scores = artifact.merge_neighbours([0, 2])
+        self.assertEqual(rows.tolist(), [1, 3])
+        np.testing.assert_allclose(scores, [0.9 + 0.2, 0.5 + 0.7], rtol=1e-6)
+
+
+# --- Quantised embeddings ---
+
+class EmbeddingTests(SimpleTestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.matrix = normalise_rows(rng.standard_normal((50, 16)).astype(np.float32))
+        self.query = normalise_rows(rng.standard_normal((3, 16)).astype(np.float32))
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+    def round_trip(self, dtype):
+        """Write the matrix to an artifact as dtype and read it back."""
+        writer = ArtifactWriter(self.path, version=dtype)
+        writer.add_event_ids(np.arange(1, len(self.matrix) + 1, dtype=np.int64))
+        writer.add_embeddings(self.matrix, dtype=dtype)
+        writer.close()
+        return load_artifact(self.path).embeddings
+
+    def test_round_trips_stay_close_to_float32(self):
+        # int8 rounds each value to within half a step of max|x| / 127
+        for dtype, atol in (('float32', 1e-7), ('float16', 1e-3), ('int8', 1 / 254)):
+            with self.subTest(dtype=dtype):
+                embeddings = self.round_trip(dtype)
+                self.assertEqual(embeddings.values.dtype, np.dtype(dtype))
+                self.assertEqual(embeddings.scales is not None, dtype == 'int8')
+                rows = embeddings.rows(np.arange(len(self.matrix)))
+                self.assertEqual(rows.dtype, np.float32)
+                np.testing.assert_allclose(rows, self.matrix, atol=atol)
+                # Blocked scoring agrees with the dequantised rows, across block boundaries
+                exact = self.matrix @ self.query.T
+                np.testing.assert_allclose(embeddings.dot(self.query[0], block_rows=7), exact[:, 0], atol=16 * atol)
+                np.testing.assert_allclose(embeddings.dot_many(self.query, block_rows=7), exact.T, atol=16 * atol)
+                np.testing.assert_allclose(embeddings.dot(self.query[0], block_rows=7), rows @ self.query[0], atol=1e-5)
+
+    def test_int8_keeps_ranking(self):
+        exact = np.argsort(-(self.matrix @ self.query[0]))[:5]
+        scores = self.round_trip('int8').dot(self.query[0])
+        self.assertEqual(set(np.argsort(-scores)[:5].tolist()), set(exact.tolist()))
+
+    def test_int8_zero_row(self):
+        values, scales = quantise(np.zeros((2, 4)), 'int8')
+        self.assertEqual(values.dtype, np.int8)
+        np.testing.assert_array_equal(values, 0)
+        np.testing.assert_array_equal(scales, [1.0, 1.0])
+
+    def test_unsupported_dtype(self):
+        with self.assertRaises(ValueError):
+            quantise(self.matrix, 'float64')
+
+
+# --- Approximate nearest neighbours ---
+
+class IVFIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        # 400 events around 20 topics, the shape LSA embeddings of a catalogue take
+        rng = np.random.default_rng(0)
+        topics = normalise_rows(rng.standard_normal((20, 32)))
+        members = topics[rng.integers(0, len(topics), size=400)]
+        self.matrix = normalise_rows(members + 0.1 * rng.standard_normal(members.shape)).astype(np.float32)
+        self.embeddings = Embeddings(self.matrix)
+        self.index = IVFIndex(*build_ivf(self.embeddings, n_lists=20), self.embeddings)
+        self.queries = self.matrix[rng.choice(len(self.matrix), size=25, replace=False)]
+
+    def exact(self, query, n):
+        return set(np.argsort(-(self.matrix @ query))[:n].tolist())
+
+    def test_every_row_is_in_one_list(self):
+        self.assertEqual(self.index.indptr[-1], len(self.matrix))
+        self.assertEqual(sorted(self.index.rows.tolist()), list(range(len(self.matrix))))
+
+    def test_probing_every_list_is_exact(self):
+        for query in self.queries:
+            rows, scores = self.index.search(query, n=10, nprobe=self.index.n_lists)
+            self.assertEqual(set(rows.tolist()), self.exact(query, 10))
+            np.testing.assert_allclose(scores, self.matrix[rows] @ query, rtol=1e-5)
+
+    def test_recall_against_exact_search(self):
+        def recall(nprobe):
+            found = [len(set(self.index.search(q, n=10, nprobe=nprobe)[0].tolist()) & self.exact(q, 10))
+                     for q in self.queries]
+            return sum(found) / (10 * len(self.queries))
+
+        # A few of the 20 lists already find nearly all of the true top 10
+        self.assertGreaterEqual(recall(1), 0.9)
+        self.assertGreaterEqual(recall(4), 0.95)
+        self.assertGreaterEqual(recall(4), recall(1))
+
+    def test_overlay(self):
+        query = self.queries[0]
+        best = int(self.index.search(query, n=1, nprobe=self.index.n_lists)[0][0])
+        self.index.remove(best)
+        self.assertNotIn(best, self.index.search(query, n=10, nprobe=self.index.n_lists)[0].tolist())
+        # An event added after the build is found in the list nearest to it
+        self.index.add(len(self.matrix), query)
+        rows, scores = self.index.search(query, n=1, nprobe=1)
+        self.assertEqual(rows.tolist(), [len(self.matrix)])
+        self.assertAlmostEqual(float(scores[0]), 1.0, places=5)
+
+
+# --- Shared-memory segments ---
+
+class SharedMemoryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        writer = ArtifactWriter(self.path, version=new_version_name())
+        writer.add_event_ids(np.asarray([30, 10, 20], dtype=np.int64))
+        writer.add_array('similarity', np.eye(3, dtype=np.float32), dtype='float32')
+        writer.close()
+        self.mapped = load_artifact(self.path)
+        # Segments outlive the test otherwise
+        self.addCleanup(release_shared, self.mapped.manifest)
+
+    def segment_exists(self, array_name):
+        try:
+            shared_memory.SharedMemory(name=segment_name(self.mapped.version, array_name)).close()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def test_attach_and_release(self):
+        first = load_artifact(self.path, shared=True)
+        self.assertEqual(set(first.shared_segments), {'event_id_map', 'similarity'})
+        self.assertTrue(self.segment_exists(READY_MARKER))
+        np.testing.assert_array_equal(first.similarity, self.mapped.similarity)
+        self.assertFalse(first.similarity.flags.writeable)
+        # Another process finds the marker and attaches the same segments instead of copying
+        second = load_artifact(self.path, shared=True)
+        self.assertEqual({name: s.name for name, s in second.shared_segments.items()},
+                         {name: s.name for name, s in first.shared_segments.items()})
+        np.testing.assert_array_equal(second.ids_for([0, 2]), [30, 20])
+
+        release_shared(first.manifest)
+        self.assertFalse(self.segment_exists(READY_MARKER))
+        self.assertFalse(self.segment_exists('similarity'))
+        # Processes already attached keep their mappings
+        np.testing.assert_array_equal(first.similarity, np.eye(3))
+        # A later load starts over with fresh segments
+        self.assertIsNotNone(load_artifact(self.path, shared=True).shared_segments)
+
+    def test_version_being_copied_falls_back_to_memory_mapping(self):
+        # Another process has created a segment but not the ready marker yet
+        busy = shared_memory.SharedMemory(name=segment_name(self.mapped.version, 'similarity'), create=True, size=36)
+        self.addCleanup(busy.close)
+        with self.assertNoLogs(shared.logger):
+            artifact = load_artifact(self.path, shared=True)
+        self.assertIsNone(artifact.shared_segments)
+        np.testing.assert_array_equal(artifact.similarity, np.eye(3))
+        # Segments this attempt created are removed again; the other process's one is left alone
+        self.assertFalse(self.segment_exists('event_id_map'))
+        self.assertTrue(self.segment_exists('similarity'))
+
+
+# --- Cursor pagination ---
+
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        base = timezone.now()
+        for i in range(23):
+            # Repeated sort keys, ties broken by id
+            make_event(
+                title=f'Event {i % 5}',
+                date=f'2026-11-{1 + i % 6:02d}',
+                attendees=i % 3,
+                start_time=base + datetime.timedelta(days=i % 7),
+                ticketTypes=[{'name': 'General', 'price': i % 4 * 100, 'quantity': 10}] if i % 3 else None,
+            )
+        # NULL sort keys: dates nothing could be derived from, events without ticket types
+        Event.objects.filter(id__in=list(Event.objects.order_by('id').values_list('id', flat=True))[::4]).update(event_date=None)
+
+    def page(self, queryset, query=''):
+        paginator = EventCursorPagination()
+        request = Request(APIRequestFactory().get('/api/events/' + query))
+        rows = paginator.paginate_queryset(queryset, request)
+        return [row.id for row in rows], paginator.get_next_link(), paginator.get_previous_link()
+
+    def walk(self, queryset, page_size=4):
+        pages = []
+        ids, next_link, previous_link = self.page(queryset, f'?page_size={page_size}')
+        self.assertIsNone(previous_link)
+        pages.append(ids)
+        while next_link:
+            ids, next_link, previous_link = self.page(queryset, '?' + urlparse(next_link).query)
+            self.assertIsNotNone(previous_link)
+            pages.append(ids)
+        # And back again from the last page
+        backwards = [pages[-1]]
+        while previous_link:
+            ids, _, previous_link = self.page(queryset, '?' + urlparse(previous_link).query)
+            backwards.append(ids)
+        return pages, backwards[::-1]
+
+    def test_pages_cover_every_row_once(self):
+        total = Event.objects.count()
+        for ordering in ('-start_time', 'start_time', 'event_date', '-event_date', 'attendees', '-title', 'min_price'):
+            with self.subTest(ordering=ordering):
+                pages, backwards = self.walk(Event.objects.order_by(ordering))
+                ids = [i for page in pages for i in page]
+                self.assertEqual(len(ids), total)
+                self.assertEqual(len(set(ids)), total)
+                self.assertEqual(backwards, pages)
+
+    def test_order_matches_queryset(self):
+        pages, _ = self.walk(Event.objects.order_by('-event_date'))
+        expected = list(Event.objects.order_by('-event_date', '-id').values_list('id', flat=True))
+        self.assertEqual([i for page in pages for i in page], expected)
+
+    def test_unknown_ordering_falls_back_to_default(self):
+        ids, _, _ = self.page(Event.objects.order_by('location'), '?page_size=100')
+        self.assertEqual(ids, list(Event.objects.order_by('-start_time', '-id').values_list('id', flat=True)))
+
+    def assert_walks_in_order(self, queryset):
+        pages, backwards = self.walk(queryset, page_size=3)
+        self.assertEqual([i for page in pages for i in page], [e.id for e in queryset])
+        self.assertEqual(backwards, pages)
+
+    def test_search_rank_ordering(self):
+        if not fts_available():
+            self.skipTest('No full-text index on this database')
+        for i in range(10):
+            # Equal ranks for pairs of events, ties broken by id
+            make_event(title='Jazz night', description='jazz ' * (i // 2) + 'live music')
+        results = search_events(Event.objects.all(), 'jazz').order_by('-search_rank', '-id')
+        self.assertEqual(len(results), 10)
+        self.assertEqual(EventCursorPagination().get_ordering(results), '-search_rank')
+        self.assert_walks_in_order(results)
+
+    def test_distance_ordering(self):
+        for i in range(10):
+            make_event(title='Nearby', latitude=9.0 + i // 2 * 0.01, longitude=38.75)
+        results = filter_near(Event.objects.all(), 9.0, 38.75, 50).order_by('distance_km', 'id')
+        self.assertEqual(len(results), 10)
+        self.assertEqual(EventCursorPagination().get_ordering(results), 'distance_km')
+        self.assert_walks_in_order(results)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(NotFound):
+            self.page(Event.objects.order_by('title'), '?cursor=not-a-cursor')
+
+
+# --- Full-text search ---
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.jazz = make_event(title='Jazz Night', description='Live saxophone quartet', location='Bole')
+        cls.festival = make_event(title='Food festival', description='Jazz bands playing all evening', location='Piassa')
+        cls.running = make_event(title='City run', description='A morning of running', organizer_name='Addis Runners')
+
+    def setUp(self):
+        if not fts_available():
+            self.skipTest('SQLite built without FTS5')
+
+    def search(self, text):
+        return list(search_events(Event.objects.all(), text).order_by('-search_rank', '-id').values_list('id', flat=True))
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('jazz'), [self.jazz.id, self.festival.id])
+
+    def test_every_term_is_required(self):
+        self.assertEqual(self.search('jazz saxophone'), [self.jazz.id])
+        self.assertEqual(self.search('jazz marathon'), [])
+
+    def test_prefix_and_stemmed_matches(self):
+        self.assertEqual(self.search('saxo'), [self.jazz.id])
+        self.assertEqual(self.search('runs'), [self.running.id])
+
+    def test_query_operators_are_plain_text(self):
+        self.assertEqual(self.search('"jazz" (night*'), [self.jazz.id])
+        self.assertIsNone(search_events(Event.objects.all(), '*'))
+
+    def test_triggers_follow_writes(self):
+        self.jazz.title = 'Blues Night'
+        self.jazz.save()
+        self.assertEqual(self.search('blues'), [self.jazz.id])
+        self.assertEqual(self.search('jazz'), [self.festival.id])
+        self.festival.delete()
+        self.assertEqual(self.search('jazz'), [])
+        created = make_event(title='Jazz brunch')
+        self.assertEqual(self.search('jazz'), [created.id])
+
+    def fts_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s", [f'{FTS_TABLE}_%'])
+            return sorted(name for name, in cursor.fetchall())
+
+    def test_migrations_create_index_and_triggers(self):
+        # 0007 rebuilt events_event after 0004 created the triggers; they must have been restored
+        self.assertIn(FTS_TABLE, connection.introspection.table_names())
+        self.assertEqual(self.fts_triggers(), [f'{FTS_TABLE}_ad', f'{FTS_TABLE}_ai', f'{FTS_TABLE}_au'])
+
+    def run_step(self, step):
+        # The schema editor can't open inside the test's transaction on SQLite; the steps only need execute()
+        with connection.cursor() as cursor:
+            step(None, mock.Mock(connection=connection, execute=cursor.execute))
+
+    def test_migration_restores_triggers(self):
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER {FTS_TABLE}_{suffix}')
+        make_event(title='Jazz brunch')
+        self.assertEqual(self.search('brunch'), [])
+        self.run_step(import_module('events.migrations.0007_event_ticket_summary').restore_sqlite_triggers)
+        self.assertEqual(len(self.search('brunch')), 1)
+        self.assertEqual(len(self.fts_triggers()), 3)
+
+    def test_migration_drops_and_recreates_index(self):
+        migration = import_module('events.migrations.0004_event_fulltext_search')
+        self.run_step(migration.drop_search_index)
+        self.assertNotIn(FTS_TABLE, connection.introspection.table_names())
+        self.assertEqual(self.fts_triggers(), [])
+        # Recreated over the existing rows, then kept in sync again
+        self.run_step(migration.create_search_index)
+        self.assertEqual(self.search('jazz'), [self.jazz.id, self.festival.id])
+        created = make_event(title='Jazz brunch')
+        self.assertEqual(self.search('brunch'), [created.id])
+
+    def test_icontains_fallback(self):
+        with mock.patch('events.search.fts_available', return_value=False):
+            self.assertIsNone(search_events(Event.objects.all(), 'jazz'))
+            results = search_queryset(Event.objects.all(), 'JAZZ even')
+        self.assertEqual(list(results.values_list('id', flat=True)), [self.festival.id])
+
+
+# --- Distance filter ---
+
+def offset_point(latitude, longitude, km, bearing):
+    """The point km away from (latitude, longitude) along the initial bearing (degrees), on the sphere."""
+    lat, lng, angle, bearing = math.radians(latitude), math.radians(longitude), km / EARTH_RADIUS_KM, math.radians(bearing)
+    to_lat = math.asin(math.sin(lat) * math.cos(angle) + math.cos(lat) * math.sin(angle) * math.cos(bearing))
+    to_lng = lng + math.atan2(math.sin(bearing) * math.sin(angle) * math.cos(lat),
+                              math.cos(angle) - math.sin(lat) * math.sin(to_lat))
+    return math.degrees(to_lat), (math.degrees(to_lng) + 540) % 360 - 180
+
+
+class NearFilterTests(TestCase):
+
+    def near(self, point, radius_km=None, **data):
+        data['near'] = '{},{}'.format(*point)
+        if radius_km is not None:
+            data['radius_km'] = radius_km
+        filterset = EventFilter(data, queryset=Event.objects.all())
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return filterset.qs
+
+    def ring(self, centre, radius_km, bearings=range(0, 360, 30)):
+        """(inside, outside) events 1% either side of the radius, around centre."""
+        inside, outside = [], []
+        for bearing in bearings:
+            for km, found in ((radius_km * 0.99, inside), (radius_km * 1.01, outside)):
+                latitude, longitude = offset_point(*centre, km, bearing)
+                found.append(make_event(title=f'{km:.1f} km at {bearing}', latitude=latitude, longitude=longitude).id)
+        return inside, outside
+
+    def assert_ring(self, centre, radius_km, bearings=range(0, 360, 30)):
+        inside, _ = self.ring(centre, radius_km, bearings)
+        self.assertCountEqual(self.near(centre, radius_km).values_list('id', flat=True), inside)
+
+    def test_radius_cut_off(self):
+        self.assert_ring((9.03, 38.74), 10)
+        make_event(title='No coordinates')
+        events = list(self.near((9.03, 38.74), 10))
+        self.assertTrue(all(0.9 <= event.distance_km <= 10 for event in events))
+        self.assertEqual([e.distance_km for e in events], sorted(e.distance_km for e in events))
+
+    def test_default_radius(self):
+        inside, _ = self.ring((9.03, 38.74), DEFAULT_RADIUS_KM, bearings=[0])
+        self.assertEqual(list(self.near((9.03, 38.74)).values_list('id', flat=True)), inside)
+
+    def test_high_latitude_box_is_wide_enough(self):
+        # Points due east/west bulge poleward of the centre; the box must still reach them
+        self.assert_ring((75.0, 10.0), 500, bearings=[*range(60, 125, 5), *range(240, 305, 5)])
+
+    def test_across_the_antimeridian(self):
+        min_lat, max_lat, ranges = bounding_box(0.0, 179.9, 50)
+        self.assertEqual(len(ranges), 2)
+        self.assert_ring((0.0, 179.9), 50)
+        self.assert_ring((-16.5, -179.95), 30)
+
+    def test_near_a_pole(self):
+        min_lat, max_lat, ranges = bounding_box(89.9, 0.0, 50)
+        self.assertEqual((max_lat, ranges), (90.0, []))
+        self.assert_ring((89.9, 0.0), 50)
+        self.assertEqual(bounding_box(-89.9, 0.0, 50)[0], -90.0)
+
+    def test_invalid_input(self):
+        for data in ({'near': 'addis'}, {'near': '9.03'}, {'near': '91,38.7'}, {'near': '9,181'},
+                     {'near': '9,38', 'radius_km': 0}, {'near': '9,38', 'radius_km': -5},
+                     {'near': '9,38', 'radius_km': MAX_RADIUS_KM + 1}):
+            with self.subTest(data=data), self.assertRaises(ValidationError):
+                list(EventFilter(data, queryset=Event.objects.all()).qs)
+        self.assertFalse(EventFilter({'near': '9,38', 'radius_km': 'far'}, queryset=Event.objects.all()).is_valid())
+
+
+# --- Typed dates ---
+
+class EventDateTests(TestCase):
+
+    def test_parse_event_date(self):
+        expected = datetime.date(2026, 11, 7)
+        for value in ('2026-11-07', 'November 7, 2026', 'Nov 7, 2026', '7 November 2026', '7 Nov 2026',
+                      ' 2026-11-07T18:30:00Z ', '2026-11-07T18:30:00+03:00'):
+            with self.subTest(value=value):
+                self.assertEqual(parse_event_date(value), expected)
+
+    def test_parse_event_date_falls_back_to_start_time(self):
+        start_time = timezone.make_aware(datetime.datetime(2026, 11, 7, 23, 30))
+        self.assertEqual(parse_event_date('next friday', start_time), timezone.localtime(start_time).date())
+        self.assertEqual(parse_event_date(None, start_time), timezone.localtime(start_time).date())
+        self.assertIsNone(parse_event_date('11/07/2026'))
+
+    def test_parse_event_time(self):
+        for value, expected in (('18:30', datetime.time(18, 30)), ('18:30:15', datetime.time(18, 30, 15)),
+                                ('6:30 pm', datetime.time(18, 30)), ('6:30PM', datetime.time(18, 30)),
+                                ('9 am', datetime.time(9, 0))):
+            with self.subTest(value=value):
+                self.assertEqual(parse_event_time(value), expected)
+        start_time = timezone.make_aware(datetime.datetime(2026, 11, 7, 20, 15))
+        self.assertEqual(parse_event_time('evening', start_time), timezone.localtime(start_time).time())
+        self.assertIsNone(parse_event_time('evening'))
+
+    def test_save_derives_typed_columns(self):
+        event = make_event(date='Nov 7, 2026', time='7:00 PM')
+        self.assertEqual((event.event_date, event.event_time), (datetime.date(2026, 11, 7), datetime.time(19, 0)))
+        event.date = '2026-12-24'
+        event.save(update_fields=['date'])
+        event.refresh_from_db()
+        self.assertEqual(event.event_date, datetime.date(2026, 12, 24))
+
+    def test_weekend_range(self):
+        friday, sunday = datetime.date(2026, 10, 16), datetime.date(2026, 10, 18)
+        self.assertEqual(weekend_range(datetime.date(2026, 10, 12)), (friday, sunday))   # Monday
+        self.assertEqual(weekend_range(friday), (friday, sunday))
+        self.assertEqual(weekend_range(datetime.date(2026, 10, 17)), (datetime.date(2026, 10, 17), sunday))
+        self.assertEqual(weekend_range(sunday), (sunday, sunday))
+
+    def filtered(self, data):
+        filterset = EventFilter(data, queryset=Event.objects.all())
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return sorted(filterset.qs.values_list('date', flat=True))
+
+    def test_date_filters(self):
+        for day in ('2026-10-15', '2026-10-16', '2026-10-18', '2026-10-19'):
+            make_event(date=day)
+        self.assertEqual(self.filtered({'date_from': '2026-10-16'}), ['2026-10-16', '2026-10-18', '2026-10-19'])
+        self.assertEqual(self.filtered({'date_to': '2026-10-16'}), ['2026-10-15', '2026-10-16'])
+        self.assertEqual(self.filtered({'date_from': '2026-10-16', 'date_to': '2026-10-18'}), ['2026-10-16', '2026-10-18'])
+        with mock.patch('events.filters.timezone.localdate', return_value=datetime.date(2026, 10, 14)):
+            self.assertEqual(self.filtered({'this_weekend': 'true'}), ['2026-10-16', '2026-10-18'])
+            self.assertEqual(len(self.filtered({'this_weekend': 'false'})), 4)
+
+
+# --- Price and availability columns ---
+
+class TicketSummaryTests(TestCase):
+
+    def summary(self, event):
+        event.refresh_from_db()
+        return event.min_price, event.max_price, event.total_available, event.is_sold_out
+
+    def test_ticket_summary(self):
+        self.assertEqual(ticket_summary(None), {'min_price': None, 'max_price': None, 'total_available': 0, 'is_sold_out': False})
+        self.assertEqual(
+            ticket_summary([{'price': '25.5', 'quantity': 3}, {'price': None, 'quantity': '-2'}, 'bad', {'price': 'x'}]),
+            {'min_price': 0.0, 'max_price': 25.5, 'total_available': 3, 'is_sold_out': False},
+        )
+        self.assertTrue(ticket_summary([{'price': 10, 'quantity': 0}])['is_sold_out'])
+
+    def test_save_derives_columns(self):
+        event = make_event(ticketTypes=[{'name': 'General', 'price': 100, 'quantity': 5},
+                                        {'name': 'VIP', 'price': 500, 'quantity': 0}])
+        self.assertEqual(self.summary(event), (100.0, 500.0, 5, False))
+
+    def test_update_fields_extends_to_derived_columns(self):
+        event = make_event(ticketTypes=[{'name': 'General', 'price': 100, 'quantity': 5}])
+        event.ticketTypes = [{'name': 'General', 'price': 80, 'quantity': 0}]
+        event.save(update_fields=['ticketTypes'])
+        self.assertEqual(self.summary(event), (80.0, 80.0, 0, True))
+        # Unrelated update_fields leave the columns alone
+        Event.objects.filter(pk=event.pk).update(min_price=1)
+        event.title = 'Renamed'
+        event.save(update_fields=['title'])
+        self.assertEqual(self.summary(event)[0], 1.0)
+
+    def test_price_filters(self):
+        free = make_event(ticketTypes=[{'price': 0, 'quantity': 10}, {'price': 200, 'quantity': 10}])
+        cheap = make_event(ticketTypes=[{'price': 50, 'quantity': 10}])
+        sold_out = make_event(ticketTypes=[{'price': 300, 'quantity': 0}])
+        untyped = make_event()
+
+        def ids(data):
+            filterset = EventFilter(data, queryset=Event.objects.all())
+            self.assertTrue(filterset.is_valid(), filterset.errors)
+            return set(filterset.qs.values_list('id', flat=True))
+
+        self.assertEqual(ids({'free': 'true'}), {free.id})
+        self.assertEqual(ids({'free': 'false'}), {cheap.id, sold_out.id, untyped.id})
+        self.assertEqual(ids({'price_max': '60'}), {free.id, cheap.id})
+        self.assertEqual(ids({'price_min': '100'}), {free.id, sold_out.id})
+        self.assertEqual(ids({'hide_sold_out': 'true'}), {free.id, cheap.id, untyped.id})
+
+
+# --- Hot reload ---
+
+class DeferredThread:
+    """Stands in for threading.Thread: records the thread so a test can run its target when it chooses."""
+    started = None
+
+    def __init__(self, target, args, **kwargs):
+        self.run = lambda: target(*args)
+
+    def start(self):
+        self.started.append(self)
+
+
+class ModelReloadTests(RecommenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        make_event(title='Jazz night', description='Saxophone jazz quartet live', category='Music')
+        make_event(title='Food festival', description='Street food and coffee tasting', category='Food')
+        self.first = self.publish()
+        self.started = []
+        self.addCleanup(setattr, RecommendationModelLoader, '_reloading', False)
+        overrides = override_settings(RECOMMENDER_RELOAD_SECONDS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # The reload thread closes its own connection when done; here it runs on the test's
+        for patch in (mock.patch.object(loader.threading, 'Thread', DeferredThread),
+                      mock.patch.object(DeferredThread, 'started', self.started),
+                      mock.patch.object(connection, 'close')):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def publish_without_loading(self, **options):
+        """Publish a new version while the loader keeps serving the first one."""
+        version = self.publish(**options).version
+        RecommendationModelLoader._models = self.first
+        return version
+
+    def test_reload_picks_up_new_current(self):
+        make_event(title='Coffee ceremony', description='Traditional coffee and food', category='Food')
+        version = self.publish_without_loading()
+        self.assertNotEqual(version, self.first.version)
+        # Requests keep the loaded version until the background load is done, and only one is started
+        self.assertIs(RecommendationModelLoader.get_models(), self.first)
+        self.assertIs(RecommendationModelLoader.get_models(), self.first)
+        self.assertEqual(len(self.started), 1)
+        with self.assertLogs(loader.logger, 'INFO'):
+            self.started[0].run()
+        models = RecommendationModelLoader.get_models()
+        self.assertEqual(models.version, version)
+        self.assertEqual(models.n_events, 3)
+        # Warmed before it was swapped in
+        self.assertIsNotNone(models.memoised('eligibility'))
+        self.assertEqual(len(self.started), 1)
+
+    def test_unchanged_current_is_not_reloaded(self):
+        self.assertIs(RecommendationModelLoader.get_models(), self.first)
+        self.assertEqual(self.started, [])
+
+    def test_failed_reload_keeps_serving(self):
+        self.publish_without_loading()
+        RecommendationModelLoader.get_models()
+        with mock.patch.object(loader, 'warm_artifact', side_effect=RuntimeError('boom')), \
+                self.assertLogs(loader.logger, 'ERROR'):
+            self.started[0].run()
+        self.assertFalse(RecommendationModelLoader._reloading)
+        # The next check tries again
+        self.assertIs(RecommendationModelLoader.get_models(), self.first)
+        self.assertEqual(len(self.started), 2)
+
+    def test_missing_artifact_is_logged(self):
+        shutil.rmtree(self.models_path)
+        RecommendationModelLoader._models = None
+        self.addCleanup(setattr, RecommendationModelLoader, '_warned_missing', False)
+        RecommendationModelLoader._warned_missing = False
+        with self.assertLogs(loader.logger, 'WARNING'):
+            self.assertIsNone(RecommendationModelLoader.get_models())
+
+
+# --- Eligibility masks ---
+
+class EligibilityMaskTests(RecommenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        past = timezone.now() - datetime.timedelta(days=1)
+        self.open = make_event(title='Open', ticketTypes=[{'name': 'General', 'price': 10, 'quantity': 5}])
+        self.untyped = make_event(title='Untyped')
+        self.garbled = make_event(title='Garbled', ticketTypes=[{'name': 'General', 'price': 10, 'quantity': 'lots'}])
+        self.sold_out = make_event(title='Sold out', ticketTypes=[{'name': 'General', 'price': 10, 'quantity': 0}])
+        self.cancelled = make_event(title='Cancelled', status='Cancelled')
+        self.past = make_event(title='Past', start_time=past)
+        self.models = self.publish()
+
+    def eligible_ids(self):
+        mask = masks.eligibility_mask(self.models)
+        return set(self.models.ids_for(np.flatnonzero(mask)).tolist())
+
+    def test_built_from_stored_columns(self):
+        # A malformed quantity counts as no stock instead of failing the build
+        self.assertEqual(self.eligible_ids(), {self.open.id, self.untyped.id})
+
+    def test_writes_patch_the_local_masks(self):
+        masks.get_eligibility_masks(self.models)
+        self.sold_out.ticketTypes = [{'name': 'General', 'price': 10, 'quantity': 3}]
+        self.sold_out.save()
+        masks.eligibility_changed(self.sold_out)
+        self.assertIn(self.sold_out.id, self.eligible_ids())
+        masks.eligibility_changed(event_id=self.open.id)
+        self.assertNotIn(self.open.id, self.eligible_ids())
+
+    def test_stale_masks_are_rebuilt_in_the_background(self):
+        current = masks.get_eligibility_masks(self.models)
+        Event.objects.filter(pk=self.untyped.pk).update(status='Draft')
+        started = []
+        current.built_at -= 3600
+        # The rebuild thread closes its own connection when done; here it runs on the test's
+        with mock.patch.object(masks.threading, 'Thread', DeferredThread), \
+                mock.patch.object(DeferredThread, 'started', started), mock.patch.object(connection, 'close'):
+            # The request is served from the current masks; the rebuild is only scheduled, once
+            self.assertIs(masks.get_eligibility_masks(self.models), current)
+            self.assertIs(masks.get_eligibility_masks(self.models), current)
+            self.assertEqual(len(started), 1)
+            started[0].run()
+        self.assertIsNot(masks.get_eligibility_masks(self.models), current)
+        self.assertFalse(current.refreshing)
+        self.assertEqual(self.eligible_ids(), {self.open.id})
+
+
+# --- Delta segment ---
+
+class DeltaSegmentTests(RecommenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.jazz = make_event(title='Jazz night', description='Saxophone jazz quartet live', category='Music')
+        self.blues = make_event(title='Blues and jazz', description='Jazz guitar and saxophone', category='Music')
+        self.food = make_event(title='Food festival', description='Street food and coffee tasting', category='Food')
+        self.coffee = make_event(title='Coffee ceremony', description='Traditional coffee and food', category='Food')
+        self.models = self.publish()
+
+    def delta_path(self, models):
+        return os.path.join(models.path, DELTA_FILENAME)
+
+    def neighbour_ids(self, models, event_id):
+        rows, _ = models.merge_neighbours(models.indices_for([event_id]))
+        return set(models.ids_for(rows).tolist())
+
+    def test_append_and_apply_on_load(self):
+        created = make_event(title='Late jazz session', description='Saxophone jazz', category='Music')
+        record_event_change(created)
+        self.assertEqual(self.models.indices_for([created.id]).tolist(), [self.models.n_events])
+        self.assertEqual(self.models.ids_for([self.models.n_events]).tolist(), [created.id])
+        self.assertEqual(self.neighbour_ids(self.models, created.id), {self.jazz.id, self.blues.id})
+        # Reverse edges: the new event is now a neighbour of the ones it resembles
+        self.assertIn(created.id, self.neighbour_ids(self.models, self.jazz.id))
+
+        # Another process loading the version replays the file to the same state
+        reloaded = RecommendationModelLoader.load_models()
+        self.assertIsNot(reloaded, self.models)
+        self.assertEqual(reloaded.indices_for([created.id]).tolist(), [reloaded.n_events])
+        self.assertEqual(self.neighbour_ids(reloaded, created.id), {self.jazz.id, self.blues.id})
+
+        record_event_deletion(created.id)
+        self.assertNotIn(created.id, self.neighbour_ids(self.models, self.jazz.id))
+        self.assertIn(self.models.indices_for([created.id])[0], self.models.delta.removed)
+
+    def test_corrupt_line_is_skipped(self):
+        created = make_event(title='Coffee tasting', description='Coffee and food', category='Food')
+        with open(self.delta_path(self.models), 'ab') as f:
+            f.write(b'{"op": "upsert", "event_id": \n')
+            f.write(b'not json at all\n')
+        with self.assertLogs('events.recommender.delta', 'WARNING') as logs:
+            record_event_change(created)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(self.neighbour_ids(self.models, created.id), {self.food.id, self.coffee.id})
+
+    def test_changes_during_a_build_carry_over(self):
+        built_from = list(Event.objects.order_by('id'))
+        snapshot_at = timezone.now()
+        # Made while the next version trains on built_from: recorded in the serving version's delta
+        created = make_event(title='Jazz brunch', description='Jazz and saxophone over brunch', category='Music')
+        record_event_change(created)
+        record_event_deletion(self.coffee.id)
+        old = self.models
+
+        new = self.publish(built_from, delta_since=snapshot_at)
+        self.assertNotEqual(new.version, old.version)
+        with open(self.delta_path(new), encoding='utf-8') as f:
+            carried = [json.loads(line) for line in f]
+        self.assertEqual([(e['op'], e['event_id']) for e in carried],
+                         [('upsert', created.id), ('delete', self.coffee.id)])
+        self.assertNotIn('terms', carried[0])
+
+        self.assertEqual(new.ids_for(new.indices_for([created.id])).tolist(), [created.id])
+        self.assertEqual(self.neighbour_ids(new, created.id), {self.jazz.id, self.blues.id})
+        self.assertIn(new.indices_for([self.coffee.id])[0], new.delta.removed)
+
+        # A worker still serving the old version also records its changes for the new one
+        RecommendationModelLoader._models = old
+        late = make_event(title='Food market', description='Street food stalls', category='Food')
+        record_event_change(late)
+        self.assertIn(self.food.id, self.neighbour_ids(new, late.id))
+        self.assertEqual(
+            sorted(os.listdir(versions_path(self.models_path))), sorted([old.version, new.version]),
+        )
+
+
+# --- Batch recommendations ---
+
+class BatchRecommendationTests(RecommenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Varied word mixes per theme. Fewer events than DEFAULT_RECOMMENDATIONS, so the top-n cut never
+        # splits equal scores; within the list both paths put equal scores in row order.
+        rng = np.random.default_rng(7)
+        themes = {
+            'Music': 'jazz saxophone quartet guitar blues live band',
+            'Food': 'street food coffee tasting ceremony market chef',
+            'Art': 'painting gallery exhibition sculpture opening studio',
+        }
+        self.events = []
+        for i in range(9):
+            category, words = list(themes.items())[i % 3]
+            picked = rng.choice(words.split(), size=int(rng.integers(2, 6)), replace=False)
+            self.events.append(make_event(title=f'{category} {i}', description=' '.join(picked), category=category))
+        self.users = [ClerkUser.objects.create(clerk_id=f'user_{i}', email=f'user{i}@example.com') for i in range(5)]
+        for user, picks in zip(self.users, [(0, 1), (2,), (4, 5, 8), (3,)]):
+            for position in picks:
+                SavedEvent.objects.create(user=user, event=self.events[position])
+        Ticket.objects.create(user=self.users[3], event=self.events[7], ticket_id='batch-1')
+        Ticket.objects.create(user=self.users[0], event=self.events[6], ticket_id='batch-2')
+        # self.users[4] has no interactions and gets the popularity fallback on both paths
+
+    def assert_matches_per_user(self, models):
+        user_ids = [user.id for user in self.users]
+        # A tiny budget forces one user per chunk
+        with mock.patch.object(batch, 'block_rows_for', return_value=1) as block_rows:
+            results = batch.precompute_recommendations(models, user_ids, max_block_mb=1)
+        self.assertAlmostEqual(block_rows.call_args.args[1], 1 / batch.LIVE_SCORE_BLOCKS)
+        for user in self.users:
+            self.assertEqual(results[user.id], recommend_event_ids_for_user(user, models), user.clerk_id)
+        self.assertTrue(results[self.users[0].id])
+
+    def test_content_only_matches_per_user_path(self):
+        self.assert_matches_per_user(self.publish())
+
+    def test_blend_matches_per_user_path(self):
+        svd = fit_interaction_factors(*batch.load_interactions(), n_factors=2)
+        self.assert_matches_per_user(self.publish(svd=svd))
+
+    def test_chunk_budget_covers_every_live_block(self):
+        n_rows = 1000
+        rows = batch.block_rows_for(n_rows, 24 / batch.LIVE_SCORE_BLOCKS)
+        self.assertLessEqual(rows * n_rows * 4 * batch.LIVE_SCORE_BLOCKS, 24 * 1024 * 1024)
+
+
+# --- Per-user recommendations ---
+
+def clerk_client(testcase, clerk_id):
+    """A test client whose requests the Clerk middleware accepts as clerk_id."""
+    from backend.auth import clerk_middleware
+    testcase.addCleanup(mock.patch.stopall)
+    mock.patch.object(clerk_middleware, 'PyJWKClient').start()
+    mock.patch.object(clerk_middleware.jwt, 'decode', return_value={'sub': clerk_id}).start()
+    return Client(HTTP_AUTHORIZATION='Bearer test-token')
+
+
+class UserRecommendationTests(RecommenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        past = timezone.now() - datetime.timedelta(days=1)
+        self.jazz = make_event(title='Jazz night', description='Saxophone jazz quartet live', category='Music')
+        self.blues = make_event(title='Blues and jazz', description='Jazz guitar and saxophone', category='Music',
+                                start_time=past)
+        self.food = make_event(title='Food festival', description='Street food and coffee tasting', category='Food')
+        self.user = ClerkUser.objects.create(clerk_id='user_1', email='user1@example.com')
+        SavedEvent.objects.create(user=self.user, event=self.jazz)
+        self.models = self.publish()
+
+    def test_no_eligible_candidate_falls_back_to_popular(self):
+        # The only event like the saved one has already started
+        self.assertEqual(recommend_event_ids_for_user(self.user, self.models), batch.popular_event_ids())
+        self.assertEqual(batch.popular_event_ids(), [self.jazz.id, self.food.id])
+        results = batch.precompute_recommendations(self.models, [self.user.id])
+        self.assertEqual(results[self.user.id], batch.popular_event_ids())
+
+    def cached(self):
+        return get_cached_recommendations(self.user.id, self.models.version)
+
+    def test_saving_an_event_invalidates_cached_recommendations(self):
+        client = clerk_client(self, self.user.clerk_id)
+        set_cached_recommendations(self.user.id, self.models.version, [self.food.id])
+        response = client.post('/api/saved-events/', {'event_id': self.food.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(self.cached())
+
+        set_cached_recommendations(self.user.id, self.models.version, [self.food.id])
+        self.assertEqual(client.delete(f'/api/saved-events/{self.food.id}/').status_code, 200)
+        self.assertIsNone(self.cached())
+
+    def test_buying_a_ticket_invalidates_cached_recommendations(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.food.ticketTypes = [{'name': 'General', 'price': 10, 'quantity': 5}]
+        self.food.save()
+        client = clerk_client(self, self.user.clerk_id)
+        set_cached_recommendations(self.user.id, self.models.version, [self.food.id])
+        with override_settings(MEDIA_ROOT=media_root):
+            response = client.post('/api/tickets/', {'event_id': self.food.id, 'ticket_type_name': 'General'},
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIsNone(self.cached())
+
+
+# --- Trending scores ---
+
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.now = timezone.now()
+        self.old = make_event(title='Old favourite')
+        self.new = make_event(title='New arrival')
+
+    def score(self, event, now=None):
+        event.refresh_from_db()
+        return trending.decayed_score(event.trending_score, now or self.now)
+
+    def test_activity_adds_in_log_space(self):
+        half_life = trending.DEFAULT_HALF_LIFE_HOURS
+        trending.record_trending(self.old.id, 'ticket', self.now - datetime.timedelta(hours=half_life))
+        trending.record_trending(self.old.id, 'save', self.now)
+        self.assertAlmostEqual(self.score(self.old), 3.0 / 2 + 2.0, places=4)
+        # Another half-life later everything has halved, without any write
+        later = self.now + datetime.timedelta(hours=half_life)
+        self.assertAlmostEqual(self.score(self.old, later), (3.0 / 2 + 2.0) / 2, places=4)
+
+    def test_order_is_stable_as_scores_decay(self):
+        for days in (30, 20, 10):
+            trending.record_trending(self.old.id, 'ticket', self.now - datetime.timedelta(days=days))
+        trending.record_trending(self.new.id, 'save', self.now)
+        self.assertLess(self.score(self.old), self.score(self.new))
+        for event in (self.old, self.new):
+            event.refresh_from_db()
+        # Stored values order events like today's scores, and like the scores a year from now
+        later = self.now + datetime.timedelta(days=365)
+        self.assertLess(self.old.trending_score, self.new.trending_score)
+        self.assertLess(self.score(self.old, later), self.score(self.new, later))
+        self.assertEqual(trending.compute_trending_event_ids(2), [self.new.id, self.old.id])
+
+    def test_rebuild_matches_incremental_scores(self):
+        user = ClerkUser.objects.create(clerk_id='user_1', email='user1@example.com')
+        ticket = Ticket.objects.create(user=user, event=self.old, ticket_id='trending-1')
+        saved = SavedEvent.objects.create(user=user, event=self.new)
+        trending.record_trending(self.old.id, 'ticket', ticket.purchase_time)
+        trending.record_trending(self.new.id, 'save', saved.created_at)
+        incremental = {e.id: e.trending_score for e in Event.objects.all()}
+        call_command('rebuild_trending', stdout=io.StringIO())
+        for event in Event.objects.all():
+            self.assertAlmostEqual(event.trending_score, incremental[event.id], places=6)
+
+    def test_flush_reads_only_viewed_events(self):
+        others = [make_event(title=f'Unviewed {i}') for i in range(20)]
+        with override_settings(TRENDING_VIEW_FLUSH_SECONDS=3600):
+            trending.record_view(self.new.id)          # first view of the interval flushes straight away
+            for _ in range(3):
+                trending.record_view(self.old.id)
+            trending.record_view(self.new.id)
+        self.assertEqual(trending.pending_view_ids(), [self.old.id, self.new.id])
+        # Reading the list took it off; put the two events back as record_view would
+        trending._add_pending(self.old.id)
+        trending._add_pending(self.new.id)
+
+        tracked = mock.Mock(wraps=caches['default'])
+        with mock.patch.object(trending, 'cache', tracked):
+            self.assertEqual(trending.flush_views(self.now), 4)
+        requested = {key for call in tracked.get_many.call_args_list for key in call.args[0]}
+        self.assertFalse(requested & {trending._view_key(e.id) for e in others})
+        self.assertAlmostEqual(self.score(self.old), trending.TRENDING_WEIGHTS['view'] * 3, places=4)
+        self.assertAlmostEqual(self.score(self.new), trending.TRENDING_WEIGHTS['view'] * 2, places=4)
+
+        # Nothing left buffered; the next view of an event puts it back on the list
+        self.assertEqual(trending.flush_views(self.now), 0)
+        trending.record_view(self.old.id)
+        self.assertEqual(trending.flush_views(self.now), 1)
+
+
+# --- List payloads ---
+
+class ListSerializerTests(TestCase):
+
+    def setUp(self):
+        self.user = ClerkUser.objects.create(clerk_id='user_1', email='user1@example.com')
+        self.client = clerk_client(self, self.user.clerk_id)
+
+    def make_events(self, count):
+        comments = [{'user': 'someone', 'text': 'Great night ' * 50, 'replies': []}]
+        return [make_event(title=f'Event {i}', description='Long description. ' * 40, comments=comments)
+                for i in range(count)]
+
+    def assert_slim(self, event):
+        self.assertNotIn('comments', event)
+        self.assertEqual(event['description'], ('Long description. ' * 40)[:DESCRIPTION_EXCERPT_CHARS])
+        self.assertIn('ticketsSold', event)
+
+    def test_event_list_is_slim_by_default(self):
+        self.make_events(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/events/', {'discover': 'true'})
+        self.assertEqual(response.status_code, 200)
+        for event in response.json()['results']:
+            self.assert_slim(event)
+        self.assertFalse(any('"comments"' in query['sql'] for query in queries.captured_queries))
+
+        full = self.client.get('/api/events/', {'discover': 'true', 'compact': 'false'}).json()['results'][0]
+        self.assertEqual(full['description'], 'Long description. ' * 40)
+        self.assertEqual(len(full['comments']), 1)
+        # Asking for a left-out field by name also gets it in full
+        sparse = self.client.get('/api/events/', {'discover': 'true', 'fields': 'comments'}).json()['results'][0]
+        self.assertEqual(set(sparse), {'id', 'comments'})
+
+    def test_saved_list_nests_the_list_serializer(self):
+        for event in self.make_events(1):
+            SavedEvent.objects.create(user=self.user, event=event)
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get('/api/saved-events/')
+        self.assert_slim(response.json()[0]['event_details'])
+
+        for event in self.make_events(4):
+            SavedEvent.objects.create(user=self.user, event=event)
+        with self.assertNumQueries(len(one)):
+            response = self.client.get('/api/saved-events/')
+        self.assertEqual(len(response.json()), 5)
+        for saved in response.json():
+            self.assert_slim(saved['event_details'])
+
+
+# --- Facets ---
+
+class FacetTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        for category, status, source, count in (
+            ('Music', 'active', 'manual', 3),
+            ('Music', 'draft', 'ticketmaster', 1),
+            ('Food', 'active', 'manual', 2),
+            ('Food', 'draft', 'manual', 1),
+        ):
+            for _ in range(count):
+                make_event(category=category, status=status, source=source)
+
+    def counts(self, facets, field):
+        return {item['value']: item['count'] for item in facets[field]}
+
+    def test_each_facet_ignores_its_own_selection(self):
+        facets = compute_facets({'category': 'Music', 'status': 'active'})
+        self.assertEqual(facets['total'], 3)
+        # Categories under the status selection only, statuses under the category selection only
+        self.assertEqual(self.counts(facets, 'category'), {'Music': 3, 'Food': 2})
+        self.assertEqual(self.counts(facets, 'status'), {'active': 3, 'draft': 1})
+        self.assertEqual(self.counts(facets, 'source'), {'manual': 3})
+
+        facets = compute_facets({'source': 'manual'})
+        self.assertEqual(facets['total'], 6)
+        self.assertEqual(self.counts(facets, 'source'), {'manual': 6, 'ticketmaster': 1})
+        self.assertEqual(self.counts(facets, 'category'), {'Music': 3, 'Food': 3})
+
+    def test_other_filters_apply_to_every_facet(self):
+        make_event(category='Art', status='active', source='manual', location='Hawassa')
+        facets = compute_facets({'location': 'Hawassa', 'category': 'Music'})
+        self.assertEqual(facets['total'], 0)
+        self.assertEqual(self.counts(facets, 'category'), {'Art': 1})
+        self.assertEqual(self.counts(facets, 'status'), {})
+
+    def test_event_save_invalidates_cached_facets(self):
+        admin = ClerkUser.objects.create(clerk_id='admin_1', email='admin@example.com',
+                                         user_type=ClerkUser.USER_TYPE_ADMIN, admin_role=ClerkUser.ADMIN_ROLE_SUPER)
+        client = clerk_client(self, admin.clerk_id)
+        self.assertEqual(self.counts(client.get('/api/events/facets/').json(), 'status'), {'active': 5, 'draft': 2})
+        filtered = client.get('/api/events/facets/', {'status': 'active'}).json()
+        self.assertEqual(self.counts(filtered, 'category'), {'Music': 3, 'Food': 2})
+
+        event = Event.objects.filter(category='Food', status='draft').get()
+        with mock.patch('events.facets.compute_facets', wraps=compute_facets) as computed:
+            # Still cached
+            self.assertEqual(client.get('/api/events/facets/', {'status': 'active'}).json(), filtered)
+            self.assertEqual(computed.call_count, 0)
+            response = client.patch(f'/api/events/{event.id}/', {'status': 'active'}, content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.content)
+            filtered = client.get('/api/events/facets/', {'status': 'active'}).json()
+            self.assertEqual(self.counts(filtered, 'category'), {'Music': 3, 'Food': 3})
+            self.assertEqual(self.counts(client.get('/api/events/facets/').json(), 'status'),
+                             {'active': 6, 'draft': 1})
+            self.assertEqual(computed.call_count, 2)
+
+
+# --- Query counts ---
+
+class ListQueryCountTests(TestCase):
+    """Serialising a list costs the same number of queries for one row as for many."""
+
+    def setUp(self):
+        self.user = ClerkUser.objects.create(clerk_id='user_1', email='user1@example.com')
+        self.client = clerk_client(self, self.user.clerk_id)
+        self.organizers = [
+            ClerkUser.objects.create(clerk_id=f'organizer_{i}', email=f'organizer{i}@example.com', full_name=f'Org {i}')
+            for i in range(3)
+        ]
+
+    def add_events(self, count):
+        for i in range(count):
+            event = make_event(title=f'Event {i}', organizer=self.organizers[i % 3],
+                               ticketTypes=[{'name': 'General', 'price': 10, 'quantity': 5}])
+            Ticket.objects.create(user=self.user, event=event, ticket_id=f'count-{event.id}')
+            SavedEvent.objects.create(user=self.user, event=event)
+
+    def assert_constant(self, url, params=None):
+        Event.objects.all().delete()
+        self.add_events(1)
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.add_events(7)
+        with self.assertNumQueries(len(one)):
+            response = self.client.get(url, params or {})
+        return response.json()
+
+    def test_events_list(self):
+        for params in ({'discover': 'true'}, {'discover': 'true', 'compact': 'false'},
+                       {'discover': 'true', 'pagination': 'cursor'}):
+            with self.subTest(params=params):
+                body = self.assert_constant('/api/events/', params)
+                self.assertEqual(len(body['results']), 8)
+                self.assertEqual(sorted(e['ticketsSold'] for e in body['results']), [1] * 8)
+                self.assertEqual({e['organizer_name'] for e in body['results']}, {'Org 0', 'Org 1', 'Org 2'})
+
+    def test_saved_list(self):
+        self.assertEqual(len(self.assert_constant('/api/saved-events/')), 8)
+
+    def test_ticket_list(self):
+        self.assertEqual(len(self.assert_constant('/api/tickets/')), 8)
+
+
+# --- Collaborative filtering ---
+
+class CollaborativeTests(RecommenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.events = [make_event(title=f'Event {i}', description=f'topic{i % 3} words') for i in range(6)]
+        self.users = [ClerkUser.objects.create(clerk_id=f'user_{i}', email=f'user{i}@example.com') for i in range(3)]
+        for user, picks in zip(self.users, [(0, 1, 2), (1, 2, 3), (3, 4)]):
+            for position in picks:
+                SavedEvent.objects.create(user=user, event=self.events[position])
+        self.svd = fit_interaction_factors(*batch.load_interactions(), n_factors=2)
+        self.models = self.publish(svd=self.svd)
+        self.item_factors = np.asarray(self.models.svd['item_factors'], dtype=np.float32)
+
+    def rows(self, *positions):
+        return self.models.indices_for([self.events[p].id for p in positions])
+
+    def scores_by_id(self, result):
+        rows, scores = result
+        return dict(zip(self.models.ids_for(rows).tolist(), scores.tolist()))
+
+    def expected(self, user_vector):
+        item_ids = self.models.svd['item_ids'].tolist()
+        return dict(zip(item_ids, (self.item_factors @ user_vector).tolist()))
+
+    def test_known_user_uses_own_factors(self):
+        user = self.users[0]
+        row = user_factor_row(self.models, user.id)
+        self.assertIsNotNone(row)
+        # Own factors win over whatever interactions are passed in
+        result = collaborative_scores(self.models, user.id, self.rows(5), [TICKET_WEIGHT])
+        expected = self.expected(np.asarray(self.models.svd['user_factors'][row], dtype=np.float32))
+        for event_id, score in self.scores_by_id(result).items():
+            self.assertAlmostEqual(score, expected[event_id], places=5)
+
+    def test_unknown_user_is_folded_in(self):
+        self.assertIsNone(user_factor_row(self.models, 'someone-new'))
+        rows, weights = self.rows(0, 3), np.asarray([TICKET_WEIGHT, SAVED_WEIGHT], dtype=np.float32)
+        result = collaborative_scores(self.models, 'someone-new', rows, weights)
+        item_pos = {event_id: i for i, event_id in enumerate(self.models.svd['item_ids'].tolist())}
+        folded = (TICKET_WEIGHT * self.item_factors[item_pos[self.events[0].id]]
+                  + SAVED_WEIGHT * self.item_factors[item_pos[self.events[3].id]]) / (TICKET_WEIGHT + SAVED_WEIGHT)
+        expected = self.expected(folded)
+        for event_id, score in self.scores_by_id(result).items():
+            self.assertAlmostEqual(score, expected[event_id], places=5)
+
+    def test_unknown_user_with_nothing_to_fold_in(self):
+        self.assertIsNone(collaborative_scores(self.models, 'someone-new', [], []))
+        # Only interactions with an event the factors have never seen (added through the delta segment)
+        created = make_event(title='Brand new', description='topic0 words')
+        record_event_change(created)
+        row = self.models.indices_for([created.id])
+        self.assertEqual(row.tolist(), [self.models.n_events])
+        self.assertIsNone(collaborative_scores(self.models, 'someone-new', row, [SAVED_WEIGHT]))
+
+    def test_blend_keeps_content_when_collaborative_is_missing(self):
+        content = (np.asarray([2, 4], dtype=np.int64), np.asarray([0.5, 1.5], dtype=np.float32))
+        rows, scores = blend(content, None, cf_weight=0.3)
+        self.assertEqual(rows.tolist(), [2, 4])
+        np.testing.assert_allclose(scores, [0.0, 0.7])
+        collaborative = (np.asarray([4, 5], dtype=np.int64), np.asarray([-1.0, 1.0], dtype=np.float32))
+        rows, scores = blend(content, collaborative, cf_weight=0.3)
+        self.assertEqual(rows.tolist(), [2, 4, 5])
+        np.testing.assert_allclose(scores, [0.0, 0.7, 0.3])
+        self.assertEqual(len(blend(None, None)[0]), 0)
+
+    def test_unknown_user_without_interactions_gets_popular_events(self):
+        stranger = ClerkUser.objects.create(clerk_id='stranger', email='stranger@example.com')
+        self.assertEqual(recommend_event_ids_for_user(stranger, self.models), batch.popular_event_ids())
+
+
+# --- External saved events ---
+
+class ExternalSaveTests(RecommenderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.jazz = make_event(title='Jazz night', description='Saxophone jazz quartet live', category='Music')
+        self.blues = make_event(title='Blues and jazz', description='Jazz guitar and saxophone', category='Music')
+        self.food = make_event(title='Food festival', description='Street food and coffee tasting', category='Food')
+        self.models = self.publish()
+        self.concert = {'name': 'Jazz quartet', 'info': 'Live saxophone jazz', 'classifications': [
+            {'segment': {'name': 'Music'}, 'genre': {'name': 'Jazz'}},
+        ]}
+        self.users = [ClerkUser.objects.create(clerk_id=f'user_{i}', email=f'user{i}@example.com') for i in range(2)]
+        for user in self.users:
+            SavedEvent.objects.create(user=user, source='ticketmaster', external_event_id='tm-1',
+                                      external_event_data=self.concert)
+
+    def test_only_external_saves_are_loaded(self):
+        SavedEvent.objects.create(user=self.users[0], event=self.jazz)
+        SavedEvent.objects.create(user=self.users[0], external_event_id='tm-empty', external_event_data=None)
+        saves = load_external_saves()
+        self.assertEqual(saves, {user.id: [('tm-1', self.concert)] for user in self.users})
+        self.assertEqual(list(load_external_saves([self.users[1].id])), [self.users[1].id])
+
+    def test_duplicate_saves_are_vectorised_once(self):
+        saves = [('tm-1', self.concert), ('tm-1', self.concert)]
+        vectorizer = self.models.vectorizer
+        with mock.patch.object(vectorizer, 'transform', wraps=vectorizer.transform) as transform:
+            vectors = external_vectors(self.models, saves)
+            self.assertEqual(transform.call_count, 1)
+            self.assertEqual(transform.call_args.args[0], [external_event_document(self.concert)])
+            # Cached per external id and version: other users saving it reuse the vector
+            single = external_vectors(self.models, saves[:1])
+            self.assertEqual(transform.call_count, 1)
+        # The same event saved twice counts once
+        self.assertEqual(len(vectors), 1)
+        np.testing.assert_array_equal(external_term_scores(self.models, vectors)[1],
+                                      external_term_scores(self.models, single)[1])
+
+    def test_batch_vectorises_each_external_event_once(self):
+        vectorizer = self.models.vectorizer
+        with mock.patch.object(vectorizer, 'transform', wraps=vectorizer.transform) as transform:
+            results = batch.precompute_recommendations(self.models, [user.id for user in self.users])
+        self.assertEqual(transform.call_count, 1)
+        for user in self.users:
+            self.assertEqual(results[user.id][0], self.jazz.id)
+            self.assertNotIn(self.food.id, results[user.id])
+
+    def test_external_saves_drive_recommendations(self):
+        ids = recommend_event_ids_for_user(self.users[0], self.models)
+        self.assertEqual(ids[0], self.jazz.id)
+        self.assertNotIn(self.food.id, ids)
@@ -6,7 +6,8 @@ from .views import (
     organizer_reviews, organizer_reply_to_review,
     organizer_dashboard_stats, translate_text,
     ticketmaster_events_proxy,
-    recommendations_api
+    recommendations_api, precompute_recommendations_api, trending_events_api, similar_events_api,
+    get_all_categories, event_facets
 )
 
 urlpatterns = [
@@ -14,7 +15,11 @@ urlpatterns = [
     path('translate/', translate_text, name='translate-text'),
     path('organizer/dashboard-stats/', organizer_dashboard_stats, name='organizer-dashboard-stats'),
     path('events/', EventListCreateView.as_view(), name='event-list-create'),
+    path('events/trending/', trending_events_api, name='event-trending'),
+    path('events/categories/', get_all_categories, name='event-categories'),
+    path('events/facets/', event_facets, name='event-facets'),
     path('events/<int:pk>/', EventRetrieveUpdateDestroyView.as_view(), name='event-detail'),
+    path('events/<int:pk>/similar/', similar_events_api, name='event-similar'),
     path('events/upload-image/', upload_event_image, name='event-upload-image'),
     path('events/<int:pk>/comments/', get_event_comments, name='event-get-comments'),
     path('events/<int:pk>/comments/add/', post_event_comment, name='event-add-comment'),
@@ -26,4 +31,5 @@ urlpatterns = [
     path('organizer/reviews/', organizer_reviews, name='organizer-reviews'),
     path('reviews/<str:comment_id>/reply/', organizer_reply_to_review, name='organizer-reply-to-review'),
     path('recommendations/', recommendations_api, name='recommendations-api'),
+    path('recommendations/precompute/', precompute_recommendations_api, name='recommendations-precompute'),
 ]
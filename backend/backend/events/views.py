@@ -1,6 +1,10 @@
 from rest_framework import generics
-from .models import Event
-from .serializers import EventSerializer, ImageUploadSerializer
+from .models import LIST_EXCLUDED_FIELDS, Event
+from .facets import facets_changed, get_event_facets
+from .filters import EventFilter, EventOrderingFilter
+from .pagination import EventCursorPagination
+from .search import EventSearchFilter
+from .serializers import EventListSerializer, EventSerializer, ImageUploadSerializer, requested_fields
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
@@ -11,75 +15,108 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
 import os
-import pickle
 import numpy as np
 from users.models import ClerkUser
 from saved.models import SavedEvent
 from notifications.models import AdminNotification
+from tickets.models import Ticket
+from django.conf import settings
+from .recommender.delta import record_event_deletion
+from .recommender.external import external_vectors, load_external_saves
+from .recommender.loader import RecommendationModelLoader, ann_options, recommender_engine
+from .recommender.engine import DEFAULT_RECOMMENDATIONS, content_scores, rank
+from .recommender.batch import DEFAULT_BATCH_MB, popular_event_ids, precompute_recommendations
+from .recommender.cache import (
+    PROCESS_LOCAL_MESSAGE, get_cached_recommendations, get_cached_similar_events, is_process_local,
+    set_cached_recommendations, set_cached_similar_events,
+)
+from .recommender.masks import eligibility_changed, eligibility_mask, eligible_events
+from .recommender.trending import DEFAULT_TRENDING, record_view, trending_event_ids
+from .recommender.collaborative import DEFAULT_CF_WEIGHT, SAVED_WEIGHT, TICKET_WEIGHT, blend, collaborative_scores
+
 
-# --- Recommendation System Model Loading ---
-RECOMMENDER_MODELS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'recommender_models')
-
-class RecommendationModelLoader:
-    _tfidf_vectorizer = None
-    _cosine_sim_matrix = None
-    _event_indices_map = None
-    _svd_model = None
-
-    @classmethod
-    def load_models(cls):
-        if cls._tfidf_vectorizer is None:
-            with open(os.path.join(RECOMMENDER_MODELS_PATH, 'tfidf_vectorizer.pkl'), 'rb') as f:
-                cls._tfidf_vectorizer = pickle.load(f)
-        if cls._cosine_sim_matrix is None:
-            with open(os.path.join(RECOMMENDER_MODELS_PATH, 'cosine_sim_matrix.pkl'), 'rb') as f:
-                cls._cosine_sim_matrix = pickle.load(f)
-        if cls._event_indices_map is None:
-            with open(os.path.join(RECOMMENDER_MODELS_PATH, 'event_indices_map.pkl'), 'rb') as f:
-                cls._event_indices_map = pickle.load(f)
-        if cls._svd_model is None:
-            with open(os.path.join(RECOMMENDER_MODELS_PATH, 'svd_model.pkl'), 'rb') as f:
-                cls._svd_model = pickle.load(f)
-        return (cls._tfidf_vectorizer, cls._cosine_sim_matrix, cls._event_indices_map, cls._svd_model)
-
-    @classmethod
-    def get_models(cls):
-        if any(x is None for x in (cls._tfidf_vectorizer, cls._cosine_sim_matrix, cls._event_indices_map, cls._svd_model)):
-            return cls.load_models()
-        return (cls._tfidf_vectorizer, cls._cosine_sim_matrix, cls._event_indices_map, cls._svd_model)
-
-
-def get_user_saved_event_indices(user, event_indices_map):
-    saved_event_ids = list(SavedEvent.objects.filter(user=user).values_list('event_id', flat=True))
-    indices = [event_indices_map.get(str(eid)) for eid in saved_event_ids if str(eid) in event_indices_map]
-    return [idx for idx in indices if idx is not None]
-
-
-def recommend_events_for_user(user):
-    tfidf_vectorizer, cosine_sim_matrix, event_indices_map, svd_model = RecommendationModelLoader.get_models()
-    # Content-Based Filtering: Recommend similar events to user's saved events
-    saved_indices = get_user_saved_event_indices(user, event_indices_map)
-    if not saved_indices:
+def get_user_interactions(user):
+    """Event ids the user has bought tickets for or saved, with their interaction weight."""
+    interactions = {}
+    for event_id in SavedEvent.objects.filter(user=user, event__isnull=False).values_list('event_id', flat=True):
+        interactions[event_id] = SAVED_WEIGHT
+    for event_id in Ticket.objects.filter(user=user).values_list('event_id', flat=True).distinct():
+        interactions[event_id] = TICKET_WEIGHT
+    return interactions
+
+
+def recommend_event_ids_for_user(user, models, categories=None):
+    interactions = get_user_interactions(user) if models is not None else {}
+    event_ids = list(interactions)
+    indices = models.indices_for(event_ids) if interactions else np.empty(0, dtype=np.int64)
+    weights = np.asarray([interactions[eid] for eid in event_ids], dtype=np.float32)[indices >= 0]
+    indices = indices[indices >= 0]
+    # Saved Ticketmaster/Skiddle events are vectorised with the model's vectorizer (cached per external id)
+    external = external_vectors(models, load_external_saves([user.id]).get(user.id)) if models is not None else []
+    # Content-Based Filtering: Recommend similar events to user's saved and purchased events
+    content = (content_scores(models, indices, recommender_engine(), external=external, **ann_options())
+               if len(indices) or external else None)
+    # Collaborative Filtering: SVD factors for the user, or folded in from their interactions
+    collaborative = collaborative_scores(models, user.id, indices, weights) if models is not None else None
+    if content is None and collaborative is None:
         # Fallback: recommend top-N events (e.g., most popular)
-        return Event.objects.order_by('-tickets_sold')[:10]
-    # Aggregate similarity scores for all saved events
-    sim_scores = np.sum([cosine_sim_matrix[idx] for idx in saved_indices], axis=0)
-    # Exclude already saved events
-    for idx in saved_indices:
-        sim_scores[idx] = -1
-    top_indices = np.argsort(sim_scores)[::-1][:10]
+        return popular_event_ids(categories=categories)
+    candidates, scores = blend(content, collaborative, getattr(settings, 'RECOMMENDER_CF_WEIGHT', DEFAULT_CF_WEIGHT))
+    # Past, sold-out, cancelled and off-category events are dropped in one vectorised step
+    eligible = eligibility_mask(models, categories=categories)
+    top_indices, _ = rank(candidates, scores, exclude=indices, eligible=eligible)
+    if not len(top_indices):
+        # Everything scored was seen, past or ineligible: same fallback as having no scores
+        return popular_event_ids(categories=categories)
     # Map indices back to event IDs
-    index_to_event_id = {v: k for k, v in event_indices_map.items()}
-    recommended_event_ids = [int(index_to_event_id[idx]) for idx in top_indices if sim_scores[idx] > 0]
-    # Collaborative Filtering (optional): can blend with SVD model predictions
-    # ... (Add collaborative logic here if you wish)
-    # Query events from DB
-    events = Event.objects.filter(id__in=recommended_event_ids)
+    return list(dict.fromkeys(int(eid) for eid in models.ids_for(top_indices)))
+
+
+def recommend_events_for_user(user, categories=None):
+    models = RecommendationModelLoader.get_models()
+    version = models.version if models is not None else None
+    if categories:
+        # Category-filtered lists are cheap to score and not worth a cache entry each
+        recommended_event_ids = recommend_event_ids_for_user(user, models, categories)
+    else:
+        recommended_event_ids = get_cached_recommendations(user.id, version)
+        if recommended_event_ids is None:
+            recommended_event_ids = recommend_event_ids_for_user(user, models)
+            set_cached_recommendations(user.id, version, recommended_event_ids)
+    # Query events from DB (cached lists may contain events that have started since)
+    events = eligible_events(Event.objects.with_serializer_data().for_list().filter(id__in=recommended_event_ids))
     # Preserve order
     events_dict = {e.id: e for e in events}
     ordered_events = [events_dict[eid] for eid in recommended_event_ids if eid in events_dict]
     return ordered_events
 
+MAX_SIMILAR = 50
+
+
+def similar_event_ids(event, models, n=MAX_SIMILAR):
+    """Upcoming events most similar to event, from the neighbour index (or embeddings); trending in its category otherwise."""
+    row = models.indices_for([event.id])[0] if models is not None else -1
+    if row >= 0:
+        candidates, scores = content_scores(models, np.asarray([row]), recommender_engine(), **ann_options())
+        top_indices, _ = rank(candidates, scores, exclude=[row], n=n, eligible=eligibility_mask(models))
+        if len(top_indices):
+            return [int(eid) for eid in models.ids_for(top_indices)]
+    categories = [event.category] if event.category else None
+    return [eid for eid in trending_event_ids(n + 1, categories) if eid != event.id][:n]
+
+
+def similar_events(event, limit):
+    models = RecommendationModelLoader.get_models()
+    version = models.version if models is not None else None
+    event_ids = get_cached_similar_events(event.id, version)
+    if event_ids is None:
+        event_ids = similar_event_ids(event, models)
+        set_cached_similar_events(event.id, version, event_ids)
+    event_ids = event_ids[:limit]
+    # Cached lists may contain events that have started or been cancelled since
+    events_dict = {e.id: e for e in eligible_events(Event.objects.with_serializer_data().for_list().filter(id__in=event_ids))}
+    return [events_dict[eid] for eid in event_ids if eid in events_dict]
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def recommendations_api(request):
@@ -91,18 +128,108 @@ def recommendations_api(request):
         user = ClerkUser.objects.get(clerk_id=clerk_id)
     except ClerkUser.DoesNotExist:
         return Response({'error': 'User not found'}, status=404)
-    recommended_events = recommend_events_for_user(user)
-    serializer = EventSerializer(recommended_events, many=True, context={'request': request})
+    categories = [c for c in request.query_params.get('category', '').split(',') if c]
+    recommended_events = recommend_events_for_user(user, categories or None)
+    serializer = EventListSerializer(recommended_events, many=True, context={'request': request})
     return Response({'recommendations': serializer.data})
 
+@api_view(['POST'])
+@permission_classes([IsSuperAdmin])
+def precompute_recommendations_api(request):
+    """
+    Batch-score users and warm the recommendation cache (e.g. before peak hours or
+    a digest send). Body: {"user_ids": [...] (optional, default every active user),
+    "include_results": bool}. Same job as `manage.py precompute_recommendations`.
+    With a per-process recommendation cache only this worker would be warmed, so
+    the request is refused unless it just wants the results back.
+    """
+    models = RecommendationModelLoader.get_models()
+    if models is None:
+        return Response({'error': 'Recommender models are not available'}, status=503)
+    process_local = is_process_local()
+    if process_local and not request.data.get('include_results'):
+        return Response({'error': PROCESS_LOCAL_MESSAGE}, status=409)
+    user_ids = request.data.get('user_ids')
+    if user_ids is not None:
+        try:
+            user_ids = [int(u) for u in user_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'user_ids must be a list of user ids'}, status=400)
+    started = timezone.now()
+    results = precompute_recommendations(
+        models, user_ids,
+        cf_weight=getattr(settings, 'RECOMMENDER_CF_WEIGHT', DEFAULT_CF_WEIGHT),
+        max_block_mb=getattr(settings, 'RECOMMENDER_BATCH_MB', DEFAULT_BATCH_MB),
+        engine=recommender_engine(),
+    )
+    response = {
+        'version': models.version,
+        'users': len(results),
+        'seconds': round((timezone.now() - started).total_seconds(), 3),
+    }
+    if process_local:
+        response['warning'] = PROCESS_LOCAL_MESSAGE
+    if request.data.get('include_results'):
+        response['recommendations'] = {str(user_id): event_ids for user_id, event_ids in results.items()}
+    return Response(response)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def trending_events_api(request):
+    """
+    Upcoming events ranked by time-decayed tickets, saves and views.
+    Optional ?category=a,b, ?location=..., ?limit=N (max 50). Served from a cached list.
+    """
+    categories = [c for c in request.query_params.get('category', '').split(',') if c]
+    location = request.query_params.get('location') or None
+    try:
+        limit = min(max(int(request.query_params.get('limit', DEFAULT_TRENDING)), 1), 50)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    event_ids = trending_event_ids(limit, categories or None, location)
+    events_dict = {e.id: e for e in Event.objects.with_serializer_data().for_list().filter(id__in=event_ids)}
+    events = [events_dict[eid] for eid in event_ids if eid in events_dict]
+    serializer = EventListSerializer(events, many=True, context={'request': request})
+    return Response({'trending': serializer.data})
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def similar_events_api(request, pk):
+    """
+    "More like this" for an event detail page: upcoming events most similar to
+    event pk, ?limit=N (max 50). Ranked once per event and model version, then cached.
+    """
+    try:
+        limit = min(max(int(request.query_params.get('limit', DEFAULT_RECOMMENDATIONS)), 1), MAX_SIMILAR)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+    event = Event.objects.filter(pk=pk).only('id', 'category').first()
+    if event is None:
+        return Response({'error': 'Event not found'}, status=404)
+    events = similar_events(event, limit)
+    serializer = EventListSerializer(events, many=True, context={'request': request})
+    return Response({'similar': serializer.data})
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_all_categories(request):
-    categories = Event.objects.values_list('category', flat=True).distinct()
+    # From the cached facet counts rather than a DISTINCT over every event
+    categories = [facet['value'] for facet in get_event_facets()['category']]
     # Always include 'All' at the top
     category_list = ['All'] + sorted(set([c for c in categories if c and c.lower() != 'all']))
     return Response({'categories': category_list})
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def event_facets(request):
+    """
+    Event counts per category, status and source for the discover sidebar. Takes
+    the events list's filter parameters (category, status, source, location,
+    date_from, near, price_max, search, ...); each facet's counts ignore its own
+    selection. Example: /api/events/facets/?this_weekend=true&category=music
+    """
+    return Response(get_event_facets(request.query_params, request))
+
 from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
 import requests
@@ -144,7 +271,11 @@ def organizer_dashboard_stats(request):
     total_events = events.count()
     total_tickets_sold = 0
     total_revenue = 0.0
-    active_attendees = set()
+    # Active attendees: unique ticket holders of upcoming events
+    active_attendees = (
+        Ticket.objects.filter(event__in=events.upcoming(), user__isnull=False)
+        .values('user_id').distinct().count()
+    )
     # Analytics: sales/revenue/attendance per month for last 6 months
     today = timezone.now().date()
     months = [(today - datetime.timedelta(days=30*i)).strftime('%b %Y') for i in reversed(range(6))]
@@ -171,16 +302,6 @@ def organizer_dashboard_stats(request):
                 continue
         total_revenue += event_revenue
         
-        # Active attendees (unique user IDs for future events)
-        if event.date:
-            try:
-                event_date = datetime.datetime.strptime(event.date, '%Y-%m-%d').date()
-                if event_date >= today:
-                    for ticket in event_tickets:
-                        if ticket.user_id:
-                            active_attendees.add(ticket.user_id)
-            except Exception:
-                pass
         # Analytics per month
         for ticket in event_tickets:
             if ticket.purchase_time:
@@ -231,7 +352,7 @@ def organizer_dashboard_stats(request):
         'totalEvents': total_events,
         'ticketsSold': total_tickets_sold,
         'totalRevenue': total_revenue,
-        'activeAttendees': len(active_attendees),
+        'activeAttendees': active_attendees,
         'analytics': analytics,
     })
 
@@ -295,6 +416,8 @@ def update_event_tickets(request, pk):
         # --- Sync ticketTypes with correct price and sold values after purchase ---
         from .serializers import EventSerializer
         EventSerializer.sync_ticket_types(event)
+        eligibility_changed(event)
+        facets_changed(refresh=False)
         return Response(EventSerializer(event).data)
     else:
         return Response({'detail': 'No tickets updated.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -400,15 +523,26 @@ def organizer_reply_to_review(request, comment_id):
     return Response({'error': 'Review not found or not authorized.'}, status=404)
 
 class EventListCreateView(generics.ListCreateAPIView):
-    queryset = Event.objects.all().order_by('-start_time')
+    queryset = Event.objects.with_serializer_data().order_by('-start_time')
     serializer_class = EventSerializer
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
-    filterset_fields = ['status', 'category', 'location']
+    filter_backends = [DjangoFilterBackend, EventOrderingFilter, EventSearchFilter]
+    filterset_class = EventFilter
     search_fields = ['title', 'description', 'location', 'organizer_name']
-    ordering_fields = ['date', 'start_time', 'created_at', 'attendees', 'title', 'status']
+    ordering_fields = ['date', 'start_time', 'created_at', 'attendees', 'title', 'status', 'price', 'distance_km']
     ordering = ['-date']
 
+    @property
+    def paginator(self):
+        # ?pagination=cursor (or following a cursor link): keyset pages, no COUNT(*) or OFFSET
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or EventCursorPagination.cursor_query_param in params:
+                self._paginator = EventCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     # Override permissions based on HTTP method
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -422,8 +556,21 @@ class EventListCreateView(generics.ListCreateAPIView):
         context['request'] = self.request
         return context
 
+    def is_compact(self):
+        # Lists leave out the comments thread and full description, unless ?compact=false or ?fields= names them
+        if self.request.method != 'GET' or self.request.query_params.get('compact', 'true').lower() == 'false':
+            return False
+        return not set(requested_fields(self.request) or ()) & set(LIST_EXCLUDED_FIELDS)
+
+    def get_serializer_class(self):
+        return EventListSerializer if self.is_compact() else EventSerializer
+
     def get_queryset(self):
         queryset = super().get_queryset()
+        # Don't read the large columns the response won't contain (compact lists or a ?fields= subset)
+        fields = requested_fields(self.request)
+        if self.request.method == 'GET' and (self.is_compact() or fields):
+            queryset = queryset.for_list(fields)
         # Get the current user from the request
         clerk_user_info = getattr(self.request, 'clerk_user', None)
         if clerk_user_info:
@@ -474,7 +621,7 @@ class EventListCreateView(generics.ListCreateAPIView):
         serializer.save(organizer=user, organizer_name=user.full_name, source='manual')
 
 class EventRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Event.objects.all()
+    queryset = Event.objects.with_serializer_data()
     serializer_class = EventSerializer
 
     # Override permissions based on HTTP method
@@ -520,6 +667,12 @@ class EventRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         context['request'] = self.request
         return context
 
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        # A detail view counts towards the event's trending score (buffered, see record_view)
+        record_view(kwargs['pk'])
+        return response
+
     def perform_update(self, serializer):
         instance = serializer.save()
         # --- Create Notification --- 
@@ -554,6 +707,9 @@ class EventRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             is_admin = True
 
         super().perform_destroy(instance) # Delete local record
+        eligibility_changed(event_id=event_id)
+        record_event_deletion(event_id)
+        facets_changed()
 
         # --- Create Notification --- 
         # Only create admin notification if it was an admin who deleted it
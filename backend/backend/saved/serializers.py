@@ -1,9 +1,9 @@
 from rest_framework import serializers
 from .models import SavedEvent
-from events.serializers import EventSerializer
+from events.serializers import EventListSerializer
 
 class SavedEventSerializer(serializers.ModelSerializer):
-    event_details = EventSerializer(source='event', read_only=True)
+    event_details = EventListSerializer(source='event', read_only=True)
     
     class Meta:
         model = SavedEvent
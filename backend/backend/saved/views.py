@@ -7,7 +7,10 @@ from users.models import ClerkUser
 from events.models import Event
 from .models import SavedEvent
 from .serializers import SavedEventSerializer
+from events.recommender.cache import invalidate_user_recommendations
+from events.recommender.trending import record_trending
 import re
+from django.db.models import Prefetch
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
@@ -28,7 +31,9 @@ def saved_events_api(request):
     
     if request.method == 'GET':
         # Get all saved events for this user
-        saved_events = SavedEvent.objects.filter(user=user).select_related('event')
+        saved_events = SavedEvent.objects.filter(user=user).prefetch_related(
+            Prefetch('event', queryset=Event.objects.with_serializer_data().for_list())
+        )
         serializer = SavedEventSerializer(saved_events, many=True)
         return Response(serializer.data)
     
@@ -66,6 +71,8 @@ def saved_events_api(request):
                         event=event,
                         source=source
                     )
+                    invalidate_user_recommendations(user.id)
+                    record_trending(event.id, 'save')
                     serializer = SavedEventSerializer(saved_event)
                     return Response(serializer.data, status=status.HTTP_201_CREATED)
                     
@@ -86,6 +93,7 @@ def saved_events_api(request):
                 source=source,
                 external_event_data=external_event_data
             )
+            invalidate_user_recommendations(user.id)
             serializer = SavedEventSerializer(saved_event)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -114,6 +122,7 @@ def unsave_event_api(request, event_id):
         try:
             saved_event = SavedEvent.objects.get(user=user, event_id=int(event_id))
             saved_event.delete()
+            invalidate_user_recommendations(user.id)
             return Response({'message': 'Event removed from saved list'}, status=status.HTTP_200_OK)
         except SavedEvent.DoesNotExist:
             pass  # Fall through to external ID check
@@ -122,6 +131,7 @@ def unsave_event_api(request, event_id):
     try:
         saved_event = SavedEvent.objects.get(user=user, external_event_id=event_id)
         saved_event.delete()
+        invalidate_user_recommendations(user.id)
         return Response({'message': 'External event removed from saved list'}, status=status.HTTP_200_OK)
     except SavedEvent.DoesNotExist:
         return Response({'error': 'Saved event not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from .models import EventTicketType, Ticket
-from events.serializers import EventSerializer
+from events.serializers import EventListSerializer
 
 class EventTicketTypeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,7 +8,7 @@ class EventTicketTypeSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class TicketSerializer(serializers.ModelSerializer):
-    event_details = EventSerializer(source='event', read_only=True)
+    event_details = EventListSerializer(source='event', read_only=True)
     ticket_type_details = serializers.SerializerMethodField()
     
     class Meta:
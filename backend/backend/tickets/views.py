@@ -7,12 +7,17 @@ import qrcode
 from io import BytesIO
 from django.core.files.base import ContentFile
 import uuid
+from django.db.models import Prefetch
 
 from users.models import ClerkUser
 from events.models import Event
 from .models import EventTicketType, Ticket
 from .serializers import EventTicketTypeSerializer, TicketSerializer
 from notifications.models import UserNotification
+from events.facets import facets_changed
+from events.recommender.cache import invalidate_user_recommendations
+from events.recommender.masks import eligibility_changed
+from events.recommender.trending import record_trending
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
@@ -33,7 +38,9 @@ def tickets_api(request):
     
     if request.method == 'GET':
         # Get all tickets for this user
-        tickets = Ticket.objects.filter(user=user).select_related('event', 'ticket_type')
+        tickets = Ticket.objects.filter(user=user).select_related('ticket_type').prefetch_related(
+            Prefetch('event', queryset=Event.objects.with_serializer_data().for_list())
+        )
         serializer = TicketSerializer(tickets, many=True)
         return Response(serializer.data)
     
@@ -139,6 +146,12 @@ def tickets_api(request):
         # Update tickets_sold for the event
         event.tickets_sold = Ticket.objects.filter(event=event).count()
         event.save(update_fields=['tickets_sold'])
+
+        # The purchase changes this user's recommendations, and may sell the event out
+        invalidate_user_recommendations(user.id)
+        eligibility_changed(event)
+        record_trending(event.id, 'ticket')
+        facets_changed(refresh=False)
         
         # Send notification to the event organizer
         if event.organizer:
@@ -118,6 +118,8 @@ export default function EventsPage() {
       const params = new URLSearchParams();
       params.append('page', page.toString());
       params.append('page_size', pageSize.toString());
+      // The edit dialog is filled from these rows, so they need the full description and comments
+      params.append('compact', 'false');
       if (search) params.append('search', search);
       if (status && status !== 'all') params.append('status', status);
       const response = await axios.get<PaginatedEventsResponse>("/api/events/", {
@@ -100,7 +100,8 @@ export async function deleteEvent(eventId: string, token: string): Promise<void>
 }
 
 export async function fetchEvents(token?: string, isDiscover: boolean = false): Promise<PaginatedResponse<Event>> {
-  const params = isDiscover ? { discover: 'true' } : {};
+  // Organizers edit their events from this list, so it needs the full description and comments
+  const params = isDiscover ? { discover: 'true' } : { compact: 'false' };
   const res = await axios.get('/api/events/', {
     params,
     headers: token ? { Authorization: `Bearer ${token}` } : {}